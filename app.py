@@ -1,21 +1,193 @@
 # 1. Import the Flask class
 from flask import Flask
 from flask import request
+from flask import Response
+from flask import abort
 from flask_cors import CORS
+import gc
+import hmac
 import json
-from draw_graph import generate_relationship_graph, get_subgraph_by_name, fuzzy_search, get_union_subgraph_by_names, get_connecting_paths_subgraph
+import os
+from dataset_store import DatasetStore
+from graph_attributes import validate_filters
+from graph_manager import GraphManager
+from graph_payload import (bind_payloads, get_full_graph_payload, get_graph_delta_payload, ndjson_lines,
+                           subgraph_records, collect_records, decode_cursor, page_subgraph)
+from query_cache import QueryCache
+from name_to_case import set_case_lookup
+from draw_graph import NameIndex, set_name_index, get_graph_index, get_subgraph_by_name, fuzzy_search, fuzzy_search_many, get_union_subgraph_by_names, get_connecting_paths_subgraph, iter_union_subgraph, get_edge_support
 
 # 2. Create an instance of the Flask class
 #    __name__ tells Flask where to look for resources like templates and static files.
 app = Flask(__name__)
 CORS(app)  # opens to any origin
 
-cases_path = 'cases.json'
-decisions_path = 'decisions.json'
-individuals_path = 'individuals.json'
-parties_path = 'parties.json'
+# SQLite dataset written by the crawlers (see dataset_store.py)
+dataset_path = os.environ.get('DATASET_PATH', 'dataset.sqlite')
 
-GRAPH = generate_relationship_graph(cases_path, decisions_path, individuals_path, parties_path)
+# 'pairwise' materializes every co-membership edge, 'bipartite' derives them lazily (less memory)
+graph_mode = os.environ.get('GRAPH_MODE', 'pairwise')
+
+# Prebuilt binary snapshot of the graph (see graph_snapshot.py); rebuilt only if the dataset changed
+snapshot_dir = os.environ.get('GRAPH_SNAPSHOT_DIR', 'graph_snapshot')
+
+def prepare_graph(graph):
+    # Fuzzy name matching runs over the graph's own node names; built before the graph
+    # is swapped in, so a request always resolves names against the graph it runs on
+    graph['name_index'] = NameIndex.from_graph(graph)
+
+# The current graph is GRAPH_MANAGER.graph. Endpoints read it once per request, so a
+# reload (POST /admin/reload_graph, or the watcher) never changes it under a running request.
+GRAPH_MANAGER = GraphManager(dataset_path, snapshot_dir=snapshot_dir, mode=graph_mode, prepare=prepare_graph)
+set_name_index(GRAPH_MANAGER.graph['name_index'])
+
+# Serialized responses of the query endpoints, keyed by endpoint, resolved node ids and k.
+# Tied to the graph, so replacing the graph empties it.
+QUERY_CACHE = QueryCache(max_entries=int(os.environ.get('QUERY_CACHE_SIZE', 1024)),
+                         ttl=float(os.environ.get('QUERY_CACHE_TTL', 600)))
+
+# Node budget of paginated queries that don't set max_nodes. The result is kept in
+# QUERY_CACHE while the pages are fetched, so it has to be bounded.
+page_max_nodes = int(os.environ.get('PAGE_MAX_NODES', 10000))
+
+def graph_swapped(graph):
+    """Reset everything derived from the previous graph or dataset."""
+    set_name_index(graph['name_index'])
+    set_case_lookup(None)  # Rebuilt from the updated dataset on next use
+    QUERY_CACHE.bind(graph)
+    bind_payloads(graph)
+
+GRAPH_MANAGER.on_swap(graph_swapped)
+
+# Seconds between checks for a new dataset or snapshot; 0 disables the watcher.
+# gunicorn.conf.py turns it on when it runs several workers.
+graph_watch_interval = float(os.environ.get('GRAPH_WATCH_INTERVAL', 0))
+
+# Required in the X-Admin-Token header of admin endpoints; unset disables them
+admin_token = os.environ.get('ADMIN_TOKEN')
+
+@app.before_request
+def start_graph_watcher():
+    # Started from the serving process: under a preloading server (see gunicorn.conf.py)
+    # the module is imported before the workers fork, and threads don't survive fork
+    if graph_watch_interval > 0:
+        GRAPH_MANAGER.watch(graph_watch_interval)
+
+def resolve_name(graph, query):
+    """Best fuzzy match for one query, memoized in the query cache."""
+    return QUERY_CACHE.get_or_compute(graph, ('name', query), lambda: fuzzy_search(query, graph['name_index']))
+
+def resolve_names(graph, queries):
+    """Best fuzzy match for each query (dropping queries with none), memoized in the query cache."""
+    return QUERY_CACHE.get_or_compute(
+        graph, ('names', tuple(queries)),
+        lambda: [matches[0][0] for matches in fuzzy_search_many(queries, index=graph['name_index']) if matches]
+    )
+
+def node_ids(graph, names):
+    """The node ids the traversals will start from, used as the cache key."""
+    index = get_graph_index(graph)
+    return tuple(index.find(name) for name in names)
+
+def request_filters():
+    """
+    Attribute filters from the request body, e.g. {"role": ["Arbitrator"], "institution": "ICSID",
+    "date_from": "2015"}, or None. See draw_graph.filtered_index for the supported attributes.
+    """
+    filters = request.get_json().get('filters') or None
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        abort(400, "filters must be an object")
+    try:
+        validate_filters(filters)
+    except ValueError as e:
+        abort(400, str(e))
+    return filters
+
+def filters_key(filters):
+    """Canonical form of the filters for the cache key."""
+    return json.dumps(filters, sort_keys=True)
+
+def positive_int(value, name):
+    """value (an int or a string of digits) as a positive int; raises ValueError otherwise."""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+def graph_response(graph, key, compute, iter_records=None, ranked=None):
+    """
+    Serve a graph query result in the shape the request body asks for:
+      "stream": true           NDJSON, one node / edge / meta record per line. With
+                               iter_records the lines are written while the traversal runs.
+      "cursor" / "page_size"   one page of nodes and the edges they complete, plus next_cursor;
+                               the pages cover at most max_nodes (default page_max_nodes) nodes
+      "max_nodes"              at most that many nodes, in any of the modes
+      "fanout"                 per-hop cap on the neighbors expanded from each node
+                               (an int, or a list with one cap per hop); only with ranked
+    With ranked(max_nodes, fanout), budgets keep the highest PageRank neighbors and report
+    pruned neighbor counts; otherwise max_nodes truncates the result and fanout is rejected.
+    Otherwise the whole result as indent=4 JSON. Serialized results are kept in QUERY_CACHE.
+    """
+    body = request.get_json()
+    max_nodes = body.get('max_nodes')
+    fanout = body.get('fanout')
+    try:
+        max_nodes = positive_int(max_nodes, 'max_nodes') if max_nodes is not None else None
+        if isinstance(fanout, list):
+            if not fanout:
+                raise ValueError("fanout must not be an empty list")
+            fanout = tuple(positive_int(cap, 'fanout') for cap in fanout)
+        elif fanout is not None:
+            fanout = positive_int(fanout, 'fanout')
+        page_size = positive_int(body.get('page_size', 500), 'page_size')
+        if fanout is not None and ranked is None:
+            raise ValueError("fanout is not supported by this endpoint")
+    except ValueError as e:
+        return json.dumps({'error': str(e)}), 400
+    paginated = not body.get('stream') and ('cursor' in body or 'page_size' in body)
+    if paginated and max_nodes is None:
+        max_nodes = page_max_nodes
+    bounded = max_nodes is not None or fanout is not None
+
+    def limited():
+        if not bounded:
+            return compute()
+        if ranked is not None:
+            return ranked(max_nodes, fanout)
+        return collect_records(subgraph_records(compute(), max_nodes))
+
+    if body.get('stream'):
+        if iter_records is not None and not bounded:
+            records = iter_records(None)
+        else:
+            records = subgraph_records(limited())
+        return Response(ndjson_lines(records), mimetype='application/x-ndjson')
+
+    if paginated:
+        offset = 0
+        if body.get('cursor'):
+            try:
+                version, offset = decode_cursor(body['cursor'])
+            except ValueError as e:
+                return json.dumps({'error': str(e)}), 400
+            if version != graph.get('version'):
+                return json.dumps({'error': "The graph changed since this cursor was issued, start over"}), 409
+        result = QUERY_CACHE.get_or_compute(graph, ('result', max_nodes, fanout) + key, limited)
+        return json.dumps(page_subgraph(result, offset, page_size, graph.get('version')))
+
+    return QUERY_CACHE.get_or_compute(graph, ('json', max_nodes, fanout) + key, lambda: json.dumps(limited(), indent=4))
+
+# Opened on first use, so each worker process gets its own connection
+_DATASET = None
+
+def get_dataset():
+    global _DATASET
+    if _DATASET is None:
+        _DATASET = DatasetStore(dataset_path)
+    return _DATASET
 
 # 3. Define a route and the function to handle requests for that route
 #    The @app.route('/') decorator binds the URL '/' (the root) to the hello_world function.
@@ -35,45 +207,137 @@ def query_to_graph():
     """This function echoes back the request data."""
     query = request.get_json().get('query', '')
 
-    name_search = fuzzy_search(query)  # Perform fuzzy search to find the best match for the query
+    filters = request_filters()
+
+    graph = GRAPH_MANAGER.graph  # This request's graph, even if a reload swaps in a new one meanwhile
+
+    name_search = resolve_name(graph, query)  # Perform fuzzy search to find the best match for the query
+    if name_search is None:
+        return json.dumps({'error': f"No node matches {query!r}"}), 404
 
     k = 2  # Adjust k as needed
-    
-    subgraph = get_subgraph_by_name(GRAPH, name_search, k)
-    return json.dumps(subgraph, indent=4)
+
+    key = ('query_to_graph', node_ids(graph, [name_search]), k, filters_key(filters))
+    return graph_response(graph, key, lambda: get_subgraph_by_name(graph, name_search, k, filters=filters),
+                          lambda max_nodes: iter_union_subgraph(graph, [name_search], k, max_nodes, filters),
+                          lambda max_nodes, fanout: get_subgraph_by_name(graph, name_search, k, max_nodes, fanout,
+                                                                         filters))
 
 @app.route('/queries_to_graph', methods=['POST'])
 def queries_to_graph():
     """This function echoes back the request data."""
     queries = request.get_json().get('query', '')
 
-    names = []
-    for query in queries:
-        names.append(fuzzy_search(query))
+    filters = request_filters()
+
+    graph = GRAPH_MANAGER.graph
+
+    # Score all query names in one batch and keep the best candidate for each
+    names = resolve_names(graph, queries)
 
     k = 2  # Adjust k as needed
-    
-    subgraph = get_union_subgraph_by_names(GRAPH, names, k)
-    return json.dumps(subgraph, indent=4)
+
+    key = ('queries_to_graph', node_ids(graph, names), k, filters_key(filters))
+    return graph_response(graph, key, lambda: get_union_subgraph_by_names(graph, names, k, filters=filters),
+                          lambda max_nodes: iter_union_subgraph(graph, names, k, max_nodes, filters),
+                          lambda max_nodes, fanout: get_union_subgraph_by_names(graph, names, k, max_nodes, fanout,
+                                                                                filters))
 
 @app.route('/queries_to_graph_v2', methods=['POST'])
 def queries_to_graph_v2():
     """This function echoes back the request data."""
     queries = request.get_json().get('query', '')
     queries = json.loads(queries) if isinstance(queries, str) else queries  # Ensure queries is a list
+    all_paths = bool(request.get_json().get('all_paths', False))  # Every shortest path per pair, not just one
+    filters = request_filters()
+
+    graph = GRAPH_MANAGER.graph
 
-    names = []
-    for query in queries:
-        names.append(fuzzy_search(query))
+    # Score all query names in one batch and keep the best candidate for each
+    names = resolve_names(graph, queries)
 
     k = 2  # Adjust k as needed
-    
-    subgraph = get_connecting_paths_subgraph(GRAPH, names, k)
-    return json.dumps(subgraph, indent=4)
+
+    key = ('queries_to_graph_v2', node_ids(graph, names), k, all_paths, filters_key(filters))
+    return graph_response(graph, key, lambda: get_connecting_paths_subgraph(graph, names, k, all_paths=all_paths,
+                                                                            filters=filters))
 
 @app.route('/full_graph', methods=['GET'])
 def full_graph():
-    return json.dumps(GRAPH, indent=4)
+    """
+    The whole graph as compact JSON, serialized and compressed once per graph version and
+    served with a strong ETag per encoding. ?since=<version> returns only what changed since then.
+    """
+    graph = GRAPH_MANAGER.graph
+    since = request.args.get('since', type=int)
+    if since is not None:
+        delta = get_graph_delta_payload(graph, since, snapshot_dir)
+        if delta is None:
+            return json.dumps({'error': f"Version {since} is no longer available, fetch the full graph"}), 410
+        return Response(delta, mimetype='application/json')
+
+    payload = get_full_graph_payload(graph)
+    coding, body, etag = payload.select(request.headers.get('Accept-Encoding'))
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if payload.matches(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    if coding is not None:
+        headers['Content-Encoding'] = coding
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/query_cache', methods=['GET'])
+def query_cache_stats():
+    """Hit/miss counters and size of the query response cache."""
+    return json.dumps(QUERY_CACHE.info())
+
+@app.route('/decision_text/<decision_id>', methods=['GET'])
+def decision_text(decision_id):
+    """Full text of one decision, read from the dataset's text blob on demand."""
+    content = get_dataset().get_decision_text(decision_id)
+    if content is None:
+        return json.dumps({'error': f"No text for decision {decision_id}"}), 404
+    return json.dumps({'decision_id': decision_id, 'content': content})
+
+@app.route('/edge_support/<edge_id>', methods=['GET'])
+def edge_support(edge_id):
+    """Relationship type, weight and supporting case / decision ids of an edge ("<source>_<target>")."""
+    graph = GRAPH_MANAGER.graph
+    source, _, target = edge_id.partition('_')
+    support = None
+    if source.isdigit() and target.isdigit() and max(int(source), int(target)) < len(graph['nodes']):
+        support = get_edge_support(graph, int(source), int(target))
+    if support is None:
+        return json.dumps({'error': f"No edge {edge_id}"}), 404
+    return json.dumps({'edge_id': edge_id, **support})
+
+def admin_authorized():
+    supplied = request.headers.get('X-Admin-Token', '')
+    return admin_token is not None and hmac.compare_digest(supplied.encode('utf-8'), admin_token.encode('utf-8'))
+
+@app.route('/admin/reload_graph', methods=['POST'])
+def reload_graph():
+    """
+    Load the latest snapshot (rebuilding it if the dataset changed) in the background and
+    swap it in. ?wait=1 waits for the swap. Other worker processes pick the new snapshot
+    up through their watcher (GRAPH_WATCH_INTERVAL).
+    """
+    if not admin_authorized():
+        return json.dumps({'error': "Forbidden"}), 403
+    wait = request.args.get('wait') == '1'
+    started = GRAPH_MANAGER.reload(wait=wait)
+    return json.dumps({'started': started, **GRAPH_MANAGER.status()}), (200 if wait else 202)
+
+@app.route('/admin/graph', methods=['GET'])
+def graph_status():
+    """Version and reload state of the served graph."""
+    if not admin_authorized():
+        return json.dumps({'error': "Forbidden"}), 403
+    return json.dumps(GRAPH_MANAGER.status())
+
+# The graph itself is memory-mapped (see graph_snapshot.load_snapshot). Move the Python
+# objects created during startup out of the collector's reach, so that when a preloading
+# server forks its workers, garbage collection doesn't write to (and copy) their pages.
+gc.freeze()
 
 # 5. Run the application
 if __name__ == '__main__':
@@ -1,21 +1,41 @@
 import requests
-import json, pickle
+import argparse
 import os
 from dotenv import load_dotenv
+from crawl_checkpoint import CrawlJournal, DEFAULT_CHECKPOINT_DIR, TABLES
+from dataset_store import DatasetStore, DEFAULT_DATASET_PATH
+from http_cache import get_cache
 
 load_dotenv()  # Load environment variables from .env file if present
 
-def list_cases(page):
-    url = f"https://api.jusmundi.com/stanford/cases?page={page}&count=10"
+API_BASE = os.environ.get("JUSMUNDI_API_BASE", "https://api.jusmundi.com/stanford")  # Override to point at a mock server
 
+# (connect, read) seconds for every API request, so a stalled connection fails (and is retried) instead of hanging a worker
+REQUEST_TIMEOUT = (10, 60)
+
+def api_headers():
     headers = {
         "accept": "application/json",
         "X-API-Key": os.environ.get("JUSMUNDI_API_KEY")  # Make sure to set this in your .env file or environment
     }
+    return {key: value for key, value in headers.items() if value is not None}
+
+def cases_url(page):
+    return f"{API_BASE}/cases?page={page}&count=10"
+
+def resource_url(kind, id):
+    """URL of a single resource; kind is one of 'decisions', 'individuals', 'parties'."""
+    return f"{API_BASE}/{kind}/{id}"
 
-    response = requests.get(url, headers=headers)
+def fetch_json(url, session=None):
+    """GET an API URL and parse the JSON, going through the on-disk response cache if enabled."""
+    cache = get_cache()
+    if cache is None:
+        return (session or requests).get(url, headers=api_headers(), timeout=REQUEST_TIMEOUT).json()
+    return cache.get_json(url, headers=api_headers(), session=session, timeout=REQUEST_TIMEOUT)
 
-    return response.json()  # Parse the JSON response and return it
+def list_cases(page, session=None):
+    return fetch_json(cases_url(page), session)  # Parse the JSON response and return it
 
 def parse_case(case_data):
     # Dictionary to store case-specific decisions and parties
@@ -52,17 +72,10 @@ def parse_case(case_data):
 
     return case_details  # Return the parsed case details for further processing
 
-def get_decision(id):
-    url = f"https://api.jusmundi.com/stanford/decisions/{id}"
+def get_decision(id, session=None):
+    return parse_decision(fetch_json(resource_url("decisions", id), session))  # Parse the JSON response and return it
 
-    headers = {
-        "accept": "application/json",
-        "X-API-Key": os.environ.get("JUSMUNDI_API_KEY")  # Make sure to set this in your .env file or environment
-    }
-
-    response = requests.get(url, headers=headers)
-
-    data = response.json()  # Parse the JSON response and return it
+def parse_decision(data):
     decision = data["data"]
 
     # Extract attributes
@@ -90,17 +103,10 @@ def get_decision(id):
     }
     return decisition_data  # Return the decision data for further processing
 
-def get_individual(id):
-    url = f"https://api.jusmundi.com/stanford/individuals/{id}"
+def get_individual(id, session=None):
+    return parse_individual(fetch_json(resource_url("individuals", id), session))  # Parse the JSON response and return it
 
-    headers = {
-        "accept": "application/json",
-        "X-API-Key": os.environ.get("JUSMUNDI_API_KEY")  # Make sure to set this in your .env file or environment
-    }
-
-    response = requests.get(url, headers=headers)
-
-    data = response.json()  # Parse the JSON response and return it
+def parse_individual(data):
     individual = data["data"]
 
     # Extract attributes
@@ -122,17 +128,10 @@ def get_individual(id):
     }
     return individual_data  # Return the individual data for further processing
 
-def get_party(id):
-    url = f"https://api.jusmundi.com/stanford/parties/{id}"
-
-    headers = {
-        "accept": "application/json",
-        "X-API-Key": os.environ.get("JUSMUNDI_API_KEY")  # Make sure to set this in your .env file or environment
-    }
-
-    response = requests.get(url, headers=headers)
+def get_party(id, session=None):
+    return parse_party(fetch_json(resource_url("parties", id), session))  # Parse the JSON response and return it
 
-    data = response.json()  # Parse the JSON response and return it
+def parse_party(data):
     party = data["data"]
 
     # Extract attributes
@@ -152,71 +151,105 @@ def get_party(id):
     }
     return party_data  # Return the party data for further processing
 
-cases = {}
-decisions = {}
-individuals = {}
-parties = {}
-for i in range(10):
-    print(f"Processing page {i + 1}...")  # Print the current page being processed for debugging
-    case = parse_case(list_cases(i))  # Loop through the first 5 pages to get cases
-    cases.update(case)  # Merge the parsed cases into the main cases dictionary
-
-    case_ids = list(case.keys())  # Get the case IDs for this batch of cases
-    for case_id in case_ids:
-        print(f"Processing case: {case_id}")
-        # For each decision ID in the case, fetch the decision details
-        decision_ids = case[case_id]["decision_ids"]
-        for decision_id in decision_ids:
-            decision_data = get_decision(decision_id)  # Fetch and print decision details
-            decision_data["case_id"] = case_id  # Link the decision to its case
-            decisions[decision_id] = decision_data
-            individual_ids = decision_data.get("individual_ids", [])
-            for individual_id in individual_ids:
-                individual_data = get_individual(individual_id)  # Fetch and print individual details
-                individual_data["decision_id"] = decision_id  # Link the individual to its decision
-                individuals[individual_id] = individual_data    
-
-        # For each party ID in the case, fetch the party details
-        party_ids = case[case_id]["party_ids"]
-        for party_id in party_ids:
-            party_data = get_party(party_id)  # Fetch and print party details
-            party_data["case_id"] = case_id
-            parties[party_id] = party_data
-
-names = []
-for person in individuals.values():
-    if 'name' in person:
-        names.append(person['name'])
-
-# Extract names from parties
-for party in parties.values():
-    if 'name' in party:
-        names.append(party['name'])
-
-# Save as JSON files
-with open('cases.json', 'w', encoding='utf-8') as f:
-    json.dump(cases, f, indent=4)
-
-# with open('cases.pkl', 'wb') as f:
-#     pickle.dump(cases, f)
-
-with open('decisions.json', 'w', encoding='utf-8') as f:
-    json.dump(decisions, f, indent=4)
-
-# with open('decisions.pkl', 'wb') as f:
-#     pickle.dump(decisions, f)
-
-with open('individuals.json', 'w', encoding='utf-8') as f:
-    json.dump(individuals, f, indent=4)
-
-# with open('individuals.pkl', 'wb') as f:
-#     pickle.dump(individuals, f)
-
-with open('parties.json', 'w', encoding='utf-8') as f:
-    json.dump(parties, f, indent=4)
-
-# with open('parties.pkl', 'wb') as f:
-#     pickle.dump(parties, f)
-
-with open('names.json', 'w', encoding='utf-8') as f:
-    json.dump(names, f, indent=4)
\ No newline at end of file
+def add_link(record, field, link_id):
+    """
+    Record another decision/case a fetched individual/party appears in.
+    record[field] lists every link; the singular decision_id/case_id keeps the first one.
+    Returns True if the link is new.
+    """
+    links = record.setdefault(field, [])
+    if link_id in links:
+        return False
+    links.append(link_id)
+    return True
+
+def save_results(cases, decisions, individuals, parties, dataset_path=DEFAULT_DATASET_PATH):
+    """Bulk-write the crawled records and their links to the dataset store."""
+    with DatasetStore(dataset_path) as store:
+        store.write(cases, decisions, individuals, parties)
+
+def main(num_pages=10, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, resume=False, incremental=False):
+    """
+    Crawl num_pages pages of cases, journaling every record to checkpoint_dir as it is fetched.
+
+    resume=True restores an interrupted crawl and skips its completed pages; incremental=True
+    restores it and stops at the first page with no new cases. Otherwise the journal starts over.
+    """
+    journal = CrawlJournal(checkpoint_dir)
+    if resume or incremental:
+        tables, completed_pages = journal.load()
+    else:
+        tables, completed_pages = {table: {} for table in TABLES}, set()
+    cases = tables["cases"]
+    decisions = tables["decisions"]
+    individuals = tables["individuals"]
+    parties = tables["parties"]
+
+    with journal.open(reset=not (resume or incremental)):
+        for i in range(num_pages):
+            if resume and i in completed_pages:
+                continue  # Fully crawled before the interruption
+            print(f"Processing page {i + 1}...")  # Print the current page being processed for debugging
+            case = parse_case(list_cases(i))  # Loop through the first 5 pages to get cases
+            if incremental:
+                case = {case_id: info for case_id, info in case.items() if case_id not in cases}
+                if not case:
+                    print(f"Page {i + 1} has no new cases, incremental sync done")
+                    break
+            cases.update(case)  # Merge the parsed cases into the main cases dictionary
+            for case_id, info in case.items():
+                journal.record("cases", case_id, info)
+
+            case_ids = list(case.keys())  # Get the case IDs for this batch of cases
+            for case_id in case_ids:
+                print(f"Processing case: {case_id}")
+                # For each decision ID in the case, fetch the decision details
+                decision_ids = case[case_id]["decision_ids"]
+                for decision_id in decision_ids:
+                    decision_data = decisions.get(decision_id)
+                    if decision_data is None:
+                        decision_data = get_decision(decision_id)  # Fetch and print decision details
+                        decision_data["case_id"] = case_id  # Link the decision to its case
+                        decisions[decision_id] = decision_data
+                        journal.record("decisions", decision_id, decision_data)
+                    individual_ids = decision_data.get("individual_ids", [])
+                    for individual_id in individual_ids:
+                        if individual_id in individuals:
+                            # Already fetched for another decision, only record the extra link
+                            if add_link(individuals[individual_id], "decision_ids", decision_id):
+                                journal.record("individuals", individual_id, individuals[individual_id])
+                            continue
+                        individual_data = get_individual(individual_id)  # Fetch and print individual details
+                        individual_data["decision_id"] = decision_id  # Link the individual to its decision
+                        individual_data["decision_ids"] = [decision_id]
+                        individuals[individual_id] = individual_data
+                        journal.record("individuals", individual_id, individual_data)
+
+                # For each party ID in the case, fetch the party details
+                party_ids = case[case_id]["party_ids"]
+                for party_id in party_ids:
+                    if party_id in parties:
+                        # Already fetched for another case, only record the extra link
+                        if add_link(parties[party_id], "case_ids", case_id):
+                            journal.record("parties", party_id, parties[party_id])
+                        continue
+                    party_data = get_party(party_id)  # Fetch and print party details
+                    party_data["case_id"] = case_id
+                    party_data["case_ids"] = [case_id]
+                    parties[party_id] = party_data
+                    journal.record("parties", party_id, party_data)
+
+            journal.complete_page(i, case_ids)
+
+    save_results(cases, decisions, individuals, parties)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential JusMundi crawler")
+    parser.add_argument("--pages", type=int, default=10, help="Number of case pages to crawl")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR, help="Where the crawl journal is kept")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="Continue an interrupted crawl from its journal")
+    mode.add_argument("--incremental", action="store_true",
+                      help="Only crawl cases newer than the journal, stopping at the first known page")
+    args = parser.parse_args()
+    main(args.pages, checkpoint_dir=args.checkpoint_dir, resume=args.resume, incremental=args.incremental)
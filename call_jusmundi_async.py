@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+# Reuse the URL building and response parsing of the sequential crawler
+from call_jusmundi import (
+    api_headers,
+    cases_url,
+    resource_url,
+    parse_case,
+    parse_decision,
+    parse_individual,
+    parse_party,
+    add_link,
+    save_results
+)
+from crawl_checkpoint import CrawlJournal, DEFAULT_CHECKPOINT_DIR
+from http_cache import get_cache
+
+# Maximum number of requests in flight per resource type
+DEFAULT_LIMITS = {
+    "cases": 4,
+    "decisions": 8,
+    "individuals": 16,
+    "parties": 16,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class JusMundiClient:
+    """
+    Async JusMundi API client over a single pooled aiohttp session.
+
+    Each resource type has its own concurrency limit. Failed requests (connection
+    errors, timeouts, 429 and 5xx) are retried with exponential backoff and jitter,
+    honouring the server's Retry-After header when present. With a ResponseCache, fresh
+    cached responses are served without a request and stale ones are revalidated.
+    """
+
+    def __init__(self, session, limits=None, max_retries=5, backoff=1.0, max_backoff=60.0, cache=None):
+        self.session = session
+        self.cache = cache
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in self.limits.items()}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = api_headers()
+        self.request_counts = {kind: 0 for kind in self.limits}
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)  # Jitter so retries don't arrive in lockstep
+
+    async def fetch_json(self, kind, url):
+        """
+        GET a URL under the concurrency limit for `kind`, retrying transient failures.
+        Cache reads and writes (SQLite) run in worker threads so they don't block the event loop.
+        """
+        entry = None
+        headers = self.headers
+        if self.cache is not None:
+            entry = await asyncio.to_thread(self.cache.lookup, url)
+            cached = await asyncio.to_thread(self.cache.cached_json, url, entry)
+            if cached is not None:
+                return cached
+            headers = {**headers, **self.cache.conditional_headers(entry)}
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self.semaphores[kind]:
+                self.request_counts[kind] += 1
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        if response.status == 304 and entry is not None:
+                            self.cache.stats["revalidated"] += 1
+                            await asyncio.to_thread(self.cache.touch, url)
+                            return json.loads(entry["body"])
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            body = await response.read()
+                            if self.cache is not None:
+                                self.cache.stats["fetched"] += 1
+                                await asyncio.to_thread(self.cache.store, url, body, response.headers.get("ETag"),
+                                                        response.headers.get("Last-Modified"))
+                            return json.loads(body)
+                        retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+
+            if attempt == self.max_retries:
+                raise RuntimeError(f"Giving up on {url} after {attempt + 1} attempts: {error}")
+            # Sleep outside the semaphore so a backing-off request doesn't block others
+            delay = self._delay(attempt, retry_after)
+            print(f"Retrying {url} in {delay:.1f}s ({error})")
+            await asyncio.sleep(delay)
+
+    async def list_cases(self, page):
+        return parse_case(await self.fetch_json("cases", cases_url(page)))
+
+    async def get_decision(self, id):
+        return parse_decision(await self.fetch_json("decisions", resource_url("decisions", id)))
+
+    async def get_individual(self, id):
+        return parse_individual(await self.fetch_json("individuals", resource_url("individuals", id)))
+
+    async def get_party(self, id):
+        return parse_party(await self.fetch_json("parties", resource_url("parties", id)))
+
+class Crawler:
+    """
+    Crawls pages of cases and everything they reference, concurrently.
+
+    With a journal, every record is persisted as soon as it is fetched and each page is
+    marked complete once every fetch on it succeeded. Records restored from a previous
+    run (`tables`) are never fetched again; new references to them only add links.
+    """
+
+    def __init__(self, client, journal=None, tables=None):
+        self.client = client
+        tables = tables or {}
+        self.cases = tables.get("cases", {})
+        self.decisions = tables.get("decisions", {})
+        self.individuals = tables.get("individuals", {})
+        self.parties = tables.get("parties", {})
+        self.journal = journal
+        # (resource type, id) -> fetch task, in flight or completed. Every request for an
+        # id shares the first task, so each individual/party is fetched at most once.
+        self.fetches = {}
+        self.coalesced = {"individuals": 0, "parties": 0}
+
+    def persist(self, table, id, data):
+        if self.journal is not None:
+            self.journal.record(table, id, data)
+
+    def fetch_once(self, kind, id, fetch):
+        task = self.fetches.get((kind, id))
+        if task is None:
+            known = getattr(self, kind).get(id)
+            if known is not None:
+                # Restored from the checkpoint: resolve immediately without a request
+                task = asyncio.get_running_loop().create_future()
+                task.set_result(known)
+            else:
+                task = asyncio.ensure_future(fetch(id))
+            self.fetches[(kind, id)] = task
+        else:
+            self.coalesced[kind] += 1
+        return task
+
+    async def crawl_individual(self, individual_id, decision_id):
+        """Fetch (once) and link an individual; returns False if the fetch failed."""
+        try:
+            individual_data = await self.fetch_once("individuals", individual_id, self.client.get_individual)
+        except Exception as e:
+            print(f"Error processing individual {individual_id}: {e}")
+            return False
+        # Only the first decision sets decision_id; every decision is listed in decision_ids
+        individual_data.setdefault("decision_id", decision_id)  # Link the individual to its decision
+        if add_link(individual_data, "decision_ids", decision_id):
+            self.individuals[individual_id] = individual_data
+            self.persist("individuals", individual_id, individual_data)
+        return True
+
+    async def crawl_decision(self, decision_id, case_id):
+        """Fetch a decision and its individuals; returns False if any fetch failed."""
+        decision_data = self.decisions.get(decision_id)
+        if decision_data is None:
+            try:
+                decision_data = await self.client.get_decision(decision_id)
+            except Exception as e:
+                print(f"Error processing decision {decision_id}: {e}")
+                return False
+            decision_data["case_id"] = case_id  # Link the decision to its case
+            self.decisions[decision_id] = decision_data
+            self.persist("decisions", decision_id, decision_data)
+        return all(await asyncio.gather(*(
+            self.crawl_individual(individual_id, decision_id)
+            for individual_id in decision_data.get("individual_ids", [])
+        )))
+
+    async def crawl_party(self, party_id, case_id):
+        """Fetch (once) and link a party; returns False if the fetch failed."""
+        try:
+            party_data = await self.fetch_once("parties", party_id, self.client.get_party)
+        except Exception as e:
+            print(f"Error processing party {party_id}: {e}")
+            return False
+        party_data.setdefault("case_id", case_id)
+        if add_link(party_data, "case_ids", case_id):
+            self.parties[party_id] = party_data
+            self.persist("parties", party_id, party_data)
+        return True
+
+    async def crawl_case(self, case_id, case_info):
+        return all(await asyncio.gather(
+            *(self.crawl_decision(decision_id, case_id) for decision_id in case_info["decision_ids"]),
+            *(self.crawl_party(party_id, case_id) for party_id in case_info["party_ids"])
+        ))
+
+    async def list_page(self, page):
+        try:
+            return await self.client.list_cases(page)
+        except Exception as e:
+            print(f"Error processing page {page + 1}: {e}")
+            return None
+
+    async def crawl_cases(self, page, cases_batch):
+        for case_id, case_info in cases_batch.items():
+            self.cases[case_id] = case_info
+            self.persist("cases", case_id, case_info)
+        print(f"Page {page + 1}: {len(cases_batch)} cases")
+        results = await asyncio.gather(*(self.crawl_case(case_id, info) for case_id, info in cases_batch.items()))
+        if not all(results):
+            print(f"Page {page + 1} left incomplete, --resume will retry it")
+        elif self.journal is not None:
+            self.journal.complete_page(page, cases_batch)
+
+    async def crawl_page(self, page):
+        cases_batch = await self.list_page(page)
+        if cases_batch is not None:
+            await self.crawl_cases(page, cases_batch)
+
+    async def crawl(self, num_pages, skip_pages=()):
+        pages = [page for page in range(num_pages) if page not in skip_pages]
+        if skip_pages:
+            print(f"Resuming: {num_pages - len(pages)} pages already complete, {len(pages)} to crawl")
+        await asyncio.gather(*(self.crawl_page(page) for page in pages))
+
+    async def crawl_incremental(self, max_pages):
+        """
+        Page from the start and stop at the first page whose cases are all already
+        known, crawling only the new cases along the way.
+        """
+        for page in range(max_pages):
+            cases_batch = await self.list_page(page)
+            if cases_batch is None:
+                continue
+            new_cases = {case_id: info for case_id, info in cases_batch.items() if case_id not in self.cases}
+            if not new_cases:
+                print(f"Page {page + 1} has no new cases, incremental sync done")
+                break
+            await self.crawl_cases(page, new_cases)
+
+async def crawl(num_pages, limits=None, timeout=30, checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+                resume=False, incremental=False):
+    """
+    Crawl num_pages pages of cases; returns (cases, decisions, individuals, parties).
+
+    Progress is journaled to checkpoint_dir. resume=True restores a previous (interrupted)
+    crawl and skips its completed pages; incremental=True restores it and only pages
+    until it reaches already-known cases. Otherwise the journal starts over.
+    """
+    journal = CrawlJournal(checkpoint_dir)
+    tables, completed_pages = journal.load() if (resume or incremental) else (None, set())
+    journal.open(reset=not (resume or incremental))
+
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    # One keep-alive connection pool, sized for every resource type running at its limit
+    connector = aiohttp.TCPConnector(limit=sum(limits.values()), keepalive_timeout=60)
+    with journal:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            cache = get_cache()
+            client = JusMundiClient(session, limits, cache=cache)
+            crawler = Crawler(client, journal, tables)
+            if incremental:
+                await crawler.crawl_incremental(num_pages)
+            else:
+                await crawler.crawl(num_pages, completed_pages if resume else ())
+            print(f"Requests sent: {client.request_counts}, duplicate fetches avoided: {crawler.coalesced}")
+            if cache is not None:
+                print(f"Response cache: {cache.stats}")
+    return crawler.cases, crawler.decisions, crawler.individuals, crawler.parties
+
+def main(num_pages=200, limits=None, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, resume=False, incremental=False):
+    start_time = time.time()
+    cases, decisions, individuals, parties = asyncio.run(
+        crawl(num_pages, limits, checkpoint_dir=checkpoint_dir, resume=resume, incremental=incremental))
+    print(f"Crawled {len(cases)} cases, {len(decisions)} decisions, {len(individuals)} individuals, "
+          f"{len(parties)} parties in {time.time() - start_time:.2f} seconds")
+    save_results(cases, decisions, individuals, parties)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asynchronous JusMundi crawler")
+    parser.add_argument("--pages", type=int, default=200, help="Number of case pages to crawl")
+    for kind, limit in DEFAULT_LIMITS.items():
+        parser.add_argument(f"--{kind}-concurrency", type=int, default=limit,
+                            help=f"Maximum concurrent {kind} requests")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR, help="Where the crawl journal is kept")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="Continue an interrupted crawl from its journal")
+    mode.add_argument("--incremental", action="store_true",
+                      help="Only crawl cases newer than the journal, stopping at the first known page")
+    args = parser.parse_args()
+    main(args.pages, {kind: getattr(args, f"{kind}_concurrency") for kind in DEFAULT_LIMITS},
+         checkpoint_dir=args.checkpoint_dir, resume=args.resume, incremental=args.incremental)
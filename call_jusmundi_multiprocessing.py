@@ -1,159 +1,290 @@
-import json
-import pickle
+import argparse
 import os
+import queue
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor
-from multiprocessing import Manager
-from functools import partial
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Import functions from original script
 from call_jusmundi import (
     list_cases,
-    parse_case, 
+    parse_case,
     get_decision,
     get_individual,
-    get_party
+    get_party,
+    save_results
 )
+from crawl_checkpoint import CrawlJournal, DEFAULT_CHECKPOINT_DIR
 
-# Worker functions for parallel processing
+# Fetching is I/O bound, so a single flat pool of threads keeps many requests in flight
+# without the fork and IPC overhead of nested process pools.
+NUM_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+BATCH_SIZE = 50  # Results each worker buffers before merging them into the shared store
 
-def process_individual(individual_id, decision_id, shared_individuals):
-    """Process an individual and store in shared dictionary"""
-    try:
-        individual_data = get_individual(individual_id)
+STAGES = ("page", "decision", "individual", "party")
+
+class StageStats:
+    """Counts and busy time for one pipeline stage."""
+
+    def __init__(self):
+        self.done = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+class Pipeline:
+    """
+    Flat work-queue crawler.
+
+    Every unit of work (a page of cases, a decision, an individual, a party) is a task
+    on one queue served by a fixed pool of worker threads. Handlers enqueue the tasks
+    they discover instead of spawning their own executors. Workers buffer their results
+    and merge them into the shared dictionaries in batches under a single lock.
+
+    With a journal, each record is also persisted as soon as it is fetched, and a page is
+    marked complete once every task it spawned has finished. Records restored from a
+    previous run (`tables`) are not fetched again.
+    """
+
+    def __init__(self, num_workers=NUM_WORKERS, batch_size=BATCH_SIZE, journal=None, tables=None):
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.journal = journal
+        self.tasks = queue.Queue()
+        tables = tables or {}
+        self.results = {table: tables.get(table, {}) for table in ("cases", "decisions", "individuals", "parties")}
+        self.results_lock = threading.Lock()
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self.stats_lock = threading.Lock()
+        # (resource type, id) -> every decision/case that referenced it. Only the first
+        # reference queues a fetch; later ones just record their link.
+        self.links = {}
+        self.links_lock = threading.Lock()
+        self.coalesced = 0
+        # page -> number of its tasks not finished yet, and the case ids it listed
+        self.pending = {}
+        self.page_cases = {}
+        self.pending_lock = threading.Lock()
+        self.local = threading.local()
+        self.handlers = {
+            "page": self.process_page,
+            "decision": self.process_decision,
+            "individual": self.process_individual,
+            "party": self.process_party,
+        }
+
+    def submit(self, stage, page, *args):
+        with self.pending_lock:
+            self.pending[page] = self.pending.get(page, 0) + 1
+        self.tasks.put((stage, page, args))
+
+    def finish(self, page):
+        """Count one task of `page` as done; journal the page once nothing of it is left."""
+        with self.pending_lock:
+            self.pending[page] -= 1
+            if self.pending[page]:
+                return
+            del self.pending[page]
+            case_ids = self.page_cases.pop(page, [])
+        if self.journal is not None:
+            self.journal.complete_page(page, case_ids)
+
+    def submit_once(self, stage, page, id, link_id):
+        """Queue a fetch for this id unless one was already queued; always record the link."""
+        table, field = ("individuals", "decision_ids") if stage == "individual" else ("parties", "case_ids")
+        with self.links_lock:
+            links = self.links.get((stage, id))
+            if links is None:
+                known = self.results[table].get(id)
+                if known is None:
+                    self.links[(stage, id)] = [link_id]
+                    self.submit(stage, page, id, link_id)
+                    return
+                # Restored from the checkpoint: only links can change
+                links = self.links[(stage, id)] = list(known.get(field, []))
+            if link_id not in links:
+                links.append(link_id)
+            self.coalesced += 1
+
+    def apply_links(self):
+        """Attach the full list of referencing decisions/cases to each fetched record."""
+        for (stage, id), links in self.links.items():
+            table, field = ("individuals", "decision_ids") if stage == "individual" else ("parties", "case_ids")
+            record = self.results[table].get(id)
+            if record is not None and record.get(field) != links:
+                record[field] = links
+                if self.journal is not None:
+                    self.journal.record(table, id, record)
+
+    def session(self):
+        """Per-thread requests.Session, so each worker reuses its keep-alive connections."""
+        if not hasattr(self.local, "session"):
+            session = requests.Session()
+            # Retry throttled and transient failures with backoff, honouring Retry-After
+            retry = Retry(total=5, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504))
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            session.mount("http://", HTTPAdapter(max_retries=retry))
+            self.local.session = session
+        return self.local.session
+
+    def emit(self, table, key, value):
+        """Persist a result and buffer it; flushed to the shared store every batch_size results."""
+        if self.journal is not None:
+            self.journal.record(table, key, value)
+        buffer = self.local.buffer
+        buffer.append((table, key, value))
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        buffer = self.local.buffer
+        if not buffer:
+            return
+        with self.results_lock:
+            for table, key, value in buffer:
+                self.results[table][key] = value
+        buffer.clear()
+
+    def process_page(self, page):
+        self.enqueue_cases(page, parse_case(list_cases(page, session=self.session())))
+
+    def enqueue_cases(self, page, cases_batch):
+        with self.pending_lock:
+            self.page_cases[page] = list(cases_batch)
+        for case_id, case_info in cases_batch.items():
+            self.emit("cases", case_id, case_info)
+            for decision_id in case_info["decision_ids"]:
+                self.submit("decision", page, decision_id, case_id)
+            for party_id in case_info["party_ids"]:
+                self.submit_once("party", page, party_id, case_id)
+
+    def process_decision(self, page, decision_id, case_id):
+        decision_data = self.results["decisions"].get(decision_id)
+        if decision_data is None:
+            decision_data = get_decision(decision_id, session=self.session())
+            decision_data["case_id"] = case_id
+            self.emit("decisions", decision_id, decision_data)
+        for individual_id in decision_data.get("individual_ids", []):
+            self.submit_once("individual", page, individual_id, decision_id)
+
+    def process_individual(self, page, individual_id, decision_id):
+        individual_data = get_individual(individual_id, session=self.session())
         individual_data["decision_id"] = decision_id
-        shared_individuals[individual_id] = individual_data
-        return True
-    except Exception as e:
-        print(f"Error processing individual {individual_id}: {e}")
-        return False
-
-def process_decision(decision_id, case_id, shared_decisions, shared_individuals):
-    """Process a decision and its individuals, store in shared dictionaries"""
-    try:
-        decision_data = get_decision(decision_id)
-        decision_data["case_id"] = case_id
-        shared_decisions[decision_id] = decision_data
-        
-        individual_ids = decision_data.get("individual_ids", [])
-        
-        # Process individuals in parallel within this worker
-        with ProcessPoolExecutor(max_workers=3) as executor:
-            func = partial(process_individual, decision_id=decision_id, shared_individuals=shared_individuals)
-            results = list(executor.map(func, individual_ids))
-            
-        return True
-    except Exception as e:
-        print(f"Error processing decision {decision_id}: {e}")
-        return False
-
-def process_party(party_id, case_id, shared_parties):
-    """Process a party and store in shared dictionary"""
-    try:
-        party_data = get_party(party_id)
+        self.emit("individuals", individual_id, individual_data)
+
+    def process_party(self, page, party_id, case_id):
+        party_data = get_party(party_id, session=self.session())
         party_data["case_id"] = case_id
-        shared_parties[party_id] = party_data
-        return True
-    except Exception as e:
-        print(f"Error processing party {party_id}: {e}")
-        return False
-
-def process_case(case_id, case_info, shared_decisions, shared_individuals, shared_parties):
-    """Process a case and its related data"""
-    try:
-        # Process decisions and their individuals
-        decision_ids = case_info["decision_ids"]
-        with ProcessPoolExecutor(max_workers=3) as executor:
-            func = partial(
-                process_decision,
-                case_id=case_id,
-                shared_decisions=shared_decisions,
-                shared_individuals=shared_individuals
-            )
-            decision_results = list(executor.map(func, decision_ids))
-        
-        # Process parties
-        party_ids = case_info["party_ids"]
-        with ProcessPoolExecutor(max_workers=3) as executor:
-            func = partial(
-                process_party,
-                case_id=case_id,
-                shared_parties=shared_parties
-            )
-            party_results = list(executor.map(func, party_ids))
-            
-        return True
-    except Exception as e:
-        print(f"Error processing case {case_id}: {e}")
-        return False
-
-def main():
-    # Create manager for shared dictionaries between processes
-    with Manager() as manager:
-        # Shared dictionaries to store data
-        shared_cases = manager.dict()
-        shared_decisions = manager.dict()
-        shared_individuals = manager.dict()
-        shared_parties = manager.dict()
-        
-        start_time = time.time()
-        
-        # Number of pages to process (set to 1 for testing, can be increased)
-        num_pages = 200
-        
-        # Get cases from API
-        for page in range(num_pages):
-            print(f"Processing page {page+1}/{num_pages}...")
-            
-            # Get and parse cases
-            case_data = list_cases(page)
-            cases_batch = parse_case(case_data)
-            shared_cases.update(cases_batch)
-            
-            case_ids = list(cases_batch.keys())
-            
-            # Process all cases in parallel
-            with ProcessPoolExecutor(max_workers=3) as executor:
-                func = partial(
-                    process_case,
-                    shared_decisions=shared_decisions,
-                    shared_individuals=shared_individuals,
-                    shared_parties=shared_parties
-                )
-                
-                # Map each case_id and its info to the process_case function
-                case_args = [(case_id, cases_batch[case_id]) for case_id in case_ids]
-                results = list(executor.map(lambda args: func(*args), case_args))
-        
-        # Convert shared dictionaries to regular dictionaries for saving
-        cases_dict = dict(shared_cases)
-        decisions_dict = dict(shared_decisions)
-        individuals_dict = dict(shared_individuals)
-        parties_dict = dict(shared_parties)
-        
-        end_time = time.time()
-        print(f"Total processing time: {end_time - start_time:.2f} seconds")
-        
-        # Save results to files
-        print("Saving results to files...")
-        
-        # Save as pickle files
-        with open('cases_mp.pkl', 'wb') as f:
-            pickle.dump(cases_dict, f)
-        
-        with open('decisions_mp.pkl', 'wb') as f:
-            pickle.dump(decisions_dict, f)
-        
-        with open('individuals_mp.pkl', 'wb') as f:
-            pickle.dump(individuals_dict, f)
-        
-        with open('parties_mp.pkl', 'wb') as f:
-            pickle.dump(parties_dict, f)
-        
-        print("Done!")
+        self.emit("parties", party_id, party_data)
+
+    def worker(self):
+        self.local.buffer = []
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.flush()
+                self.tasks.task_done()
+                return
+            stage, page, args = task
+            start_time = time.time()
+            ok = True
+            try:
+                self.handlers[stage](page, *args)
+            except Exception as e:
+                ok = False
+                print(f"Error processing {stage} {args[0] if args else page}: {e}")
+            elapsed = time.time() - start_time
+            with self.stats_lock:
+                stats = self.stats[stage]
+                stats.busy_seconds += elapsed
+                if ok:
+                    stats.done += 1
+                else:
+                    stats.failed += 1
+            if ok:
+                self.finish(page)  # A failed task leaves its page incomplete, so --resume retries it
+            # Child tasks were queued before this task_done, so join() can't return early
+            self.tasks.task_done()
+
+    def run(self, num_pages, skip_pages=(), incremental=False):
+        """
+        Crawl pages [0, num_pages), skipping skip_pages. In incremental mode pages are
+        listed one at a time from this thread, stopping at the first page with no new cases.
+        """
+        threads = [threading.Thread(target=self.worker, daemon=True) for _ in range(self.num_workers)]
+        for thread in threads:
+            thread.start()
+        if incremental:
+            self.list_incremental(num_pages)
+        else:
+            for page in range(num_pages):
+                if page not in skip_pages:
+                    self.submit("page", page)
+
+        self.tasks.join()  # Wait until every discovered task has been processed
+        for _ in threads:
+            self.tasks.put(None)
+        for thread in threads:
+            thread.join()
+        self.apply_links()
+        return self.results
+
+    def list_incremental(self, max_pages):
+        self.local.buffer = []
+        for page in range(max_pages):
+            cases_batch = parse_case(list_cases(page, session=self.session()))
+            new_cases = {case_id: info for case_id, info in cases_batch.items()
+                         if case_id not in self.results["cases"]}
+            if not new_cases:
+                print(f"Page {page + 1} has no new cases, incremental sync done")
+                break
+            # Hold the page open while its cases are queued so it can't complete early
+            with self.pending_lock:
+                self.pending[page] = self.pending.get(page, 0) + 1
+            self.enqueue_cases(page, new_cases)
+            self.flush()  # Cases must be visible before the next page is checked
+            self.finish(page)
+
+    def report(self, wall_seconds):
+        print(f"{'stage':<12}{'done':>8}{'failed':>8}{'items/s':>10}{'avg latency':>14}")
+        for stage in STAGES:
+            stats = self.stats[stage]
+            total = stats.done + stats.failed
+            rate = stats.done / wall_seconds if wall_seconds else 0.0
+            latency = stats.busy_seconds / total if total else 0.0
+            print(f"{stage:<12}{stats.done:>8}{stats.failed:>8}{rate:>10.1f}{latency:>13.3f}s")
+        print(f"Duplicate individual/party fetches avoided: {self.coalesced}")
+
+def main(num_pages=200, num_workers=NUM_WORKERS, checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+         resume=False, incremental=False):
+    start_time = time.time()
+
+    journal = CrawlJournal(checkpoint_dir)
+    tables, completed_pages = journal.load() if (resume or incremental) else (None, set())
+    with journal.open(reset=not (resume or incremental)):
+        pipeline = Pipeline(num_workers=num_workers, journal=journal, tables=tables)
+        results = pipeline.run(num_pages, skip_pages=completed_pages if resume else (), incremental=incremental)
+
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds")
+    pipeline.report(end_time - start_time)
+
+    # Save results to the dataset store
+    print("Saving results to the dataset store...")
+    save_results(results["cases"], results["decisions"], results["individuals"], results["parties"])
+
+    print("Done!")
 
 if __name__ == "__main__":
-    # Set the number of processes to use
-    num_cpu = min(4, os.cpu_count())
-    print(f"Using {num_cpu} CPU cores for processing")
-    main()
+    parser = argparse.ArgumentParser(description="Threaded JusMundi crawler")
+    parser.add_argument("--pages", type=int, default=200, help="Number of case pages to crawl")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Number of fetch threads")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR, help="Where the crawl journal is kept")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="Continue an interrupted crawl from its journal")
+    mode.add_argument("--incremental", action="store_true",
+                      help="Only crawl cases newer than the journal, stopping at the first known page")
+    args = parser.parse_args()
+    print(f"Using {args.workers} worker threads for fetching")
+    main(args.pages, args.workers, checkpoint_dir=args.checkpoint_dir, resume=args.resume, incremental=args.incremental)
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+
+DEFAULT_CHECKPOINT_DIR = 'crawl_checkpoint'
+
+TABLES = ("cases", "decisions", "individuals", "parties")
+
+class CrawlJournal:
+    """
+    Append-only checkpoint of a crawl.
+
+    Every fetched record is appended to records.jsonl as soon as it is parsed, and every
+    fully crawled page (its cases, decisions, individuals and parties) is appended to
+    pages.jsonl. Replaying the files restores the crawl state after a crash; when a record
+    was written more than once, the last line wins.
+    """
+
+    def __init__(self, checkpoint_dir=DEFAULT_CHECKPOINT_DIR):
+        self.checkpoint_dir = checkpoint_dir
+        self.records_path = os.path.join(checkpoint_dir, 'records.jsonl')
+        self.pages_path = os.path.join(checkpoint_dir, 'pages.jsonl')
+        self.lock = threading.Lock()
+        self.records_file = None
+        self.pages_file = None
+
+    def load(self):
+        """
+        Replay the journal. Returns (tables, completed_pages) where tables maps each of
+        TABLES to an {id: record} dict and completed_pages is a set of page numbers.
+        """
+        tables = {table: {} for table in TABLES}
+        completed_pages = set()
+        for entry in self._read_lines(self.records_path):
+            tables[entry["table"]][entry["id"]] = entry["data"]
+        for entry in self._read_lines(self.pages_path):
+            completed_pages.add(entry["page"])
+        return tables, completed_pages
+
+    @staticmethod
+    def _read_lines(path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; everything before it is intact
+                    print(f"Skipping truncated line in {path}")
+
+    @staticmethod
+    def _drop_torn_line(path, block_size=65536):
+        """
+        Truncate a line cut short by a crash, so appending doesn't glue the next record
+        onto it (load() already skipped it).
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - block_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+
+    def open(self, reset=False):
+        """Open the journal for appending. reset=True discards any previous crawl."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        mode = 'w' if reset else 'a'
+        if not reset:
+            for path in (self.records_path, self.pages_path):
+                self._drop_torn_line(path)
+        self.records_file = open(self.records_path, mode, encoding='utf-8')
+        self.pages_file = open(self.pages_path, mode, encoding='utf-8')
+        return self
+
+    def record(self, table, id, data):
+        """Persist a fetched (or re-linked) record immediately."""
+        line = json.dumps({"table": table, "id": id, "data": data}) + "\n"
+        with self.lock:
+            self.records_file.write(line)
+            self.records_file.flush()
+
+    def complete_page(self, page, case_ids):
+        """Mark a page as fully crawled."""
+        line = json.dumps({"page": page, "case_ids": list(case_ids)}) + "\n"
+        with self.lock:
+            self.pages_file.write(line)
+            self.pages_file.flush()
+
+    def close(self):
+        for f in (self.records_file, self.pages_file):
+            if f is not None:
+                f.close()
+        self.records_file = None
+        self.pages_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
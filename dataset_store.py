@@ -0,0 +1,450 @@
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+
+DEFAULT_DATASET_PATH = 'dataset.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    commencement_date TEXT,
+    arbitral_institution TEXT,
+    outcome TEXT
+);
+CREATE TABLE IF NOT EXISTS decisions (
+    id TEXT PRIMARY KEY,
+    decision_date TEXT,
+    organization TEXT,
+    reference TEXT,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS decision_text (
+    decision_id TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS individuals (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    nationality TEXT,
+    firm TEXT,
+    role TEXT,
+    type TEXT
+);
+CREATE TABLE IF NOT EXISTS parties (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    nationality TEXT,
+    role TEXT,
+    type TEXT
+);
+CREATE TABLE IF NOT EXISTS case_parties (
+    case_id TEXT NOT NULL,
+    party_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (case_id, party_id)
+);
+CREATE TABLE IF NOT EXISTS case_decisions (
+    case_id TEXT NOT NULL,
+    decision_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (case_id, decision_id)
+);
+CREATE TABLE IF NOT EXISTS decision_individuals (
+    decision_id TEXT NOT NULL,
+    individual_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (decision_id, individual_id)
+);
+CREATE INDEX IF NOT EXISTS individuals_name ON individuals (name);
+CREATE INDEX IF NOT EXISTS parties_name ON parties (name);
+CREATE INDEX IF NOT EXISTS case_parties_party ON case_parties (party_id);
+CREATE INDEX IF NOT EXISTS case_decisions_decision ON case_decisions (decision_id);
+CREATE INDEX IF NOT EXISTS decision_individuals_individual ON decision_individuals (individual_id);
+"""
+
+def default_text_path(dataset_path):
+    """Blob file holding the decision texts of a dataset, e.g. dataset_text.bin."""
+    return f"{os.path.splitext(dataset_path)[0]}_text.bin"
+
+def _group(rows):
+    """[(key, value), ...] ordered by key/position -> {key: [values]}"""
+    grouped = {}
+    for key, value in rows:
+        grouped.setdefault(key, []).append(value)
+    return grouped
+
+class DatasetStore:
+    """
+    SQLite store for the crawled dataset.
+
+    One table per record type (cases, decisions, individuals, parties) plus link tables
+    for case <-> party, case <-> decision and decision <-> individual, indexed on ids and
+    names. Crawlers write through write() in bulk; readers either load records back in
+    the shape the crawlers produce (load_*) or fetch only the columns they need.
+
+    Decision full texts are kept out of the database: each is zlib-compressed and appended
+    to a separate blob file, and decision_text maps decision ids to (offset, length) in it.
+    Nothing but get_decision_text() reads the blob, through a read-only memory map, so
+    building the graph or serving queries never pages any text in. compact_texts() writes
+    a new generation of the blob (dataset_text.<n>.bin) and switches to it in the same
+    transaction as the new offsets; store_meta.text_file names the current one.
+    """
+
+    def __init__(self, path=DEFAULT_DATASET_PATH, text_path=None):
+        self.path = path
+        self.text_path = text_path or default_text_path(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+        self._text_map = None
+        self._text_mapped = None  # (path, inode) of the mapped blob
+
+    def _text_file(self):
+        """Path of the current text blob generation (default_text_path until the first compaction)."""
+        row = self.db.execute("SELECT value FROM store_meta WHERE key = 'text_file'").fetchone()
+        if row is None:
+            return self.text_path
+        return os.path.join(os.path.dirname(self.text_path), row[0])
+
+    def close(self):
+        with self.lock:
+            if self._text_map is not None:
+                self._text_map.close()
+                self._text_map = None
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Writing ---
+
+    def write(self, cases=None, decisions=None, individuals=None, parties=None):
+        """
+        Upsert records (dicts keyed by id, as produced by the crawlers) in a single transaction.
+        The links of every written case / decision are replaced by the ones in the record.
+        """
+        with self.lock, self.db:
+            # Take the write lock up front: decision texts go to the blob generation current
+            # in this transaction, which compact_texts can't switch until it commits
+            self.db.execute("BEGIN IMMEDIATE")
+            if cases:
+                self.db.executemany(
+                    "INSERT INTO cases (id, title, commencement_date, arbitral_institution, outcome) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET title = excluded.title, commencement_date = excluded.commencement_date, "
+                    "arbitral_institution = excluded.arbitral_institution, outcome = excluded.outcome",
+                    [(case_id, case.get("title"), case.get("commencement_date"), case.get("arbitral_institution"),
+                      case.get("outcome")) for case_id, case in cases.items()]
+                )
+                ids = [(case_id,) for case_id in cases]
+                self.db.executemany("DELETE FROM case_parties WHERE case_id = ?", ids)
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO case_parties (case_id, party_id, position) VALUES (?, ?, ?)",
+                    [(case_id, party_id, position) for case_id, case in cases.items()
+                     for position, party_id in enumerate(case.get("party_ids", []))]
+                )
+                # Rows at position -1 come from the decisions' own case_id and stay
+                self.db.executemany("DELETE FROM case_decisions WHERE case_id = ? AND position >= 0", ids)
+                # A listing replaces the -1 row of a decision written before its case; a decision
+                # listed twice keeps its first position
+                self.db.executemany(
+                    "INSERT INTO case_decisions (case_id, decision_id, position) VALUES (?, ?, ?) "
+                    "ON CONFLICT(case_id, decision_id) DO UPDATE SET position = excluded.position "
+                    "WHERE case_decisions.position < 0",
+                    [(case_id, decision_id, position) for case_id, case in cases.items()
+                     for position, decision_id in enumerate(case.get("decision_ids", []))]
+                )
+            if decisions:
+                self.db.executemany(
+                    "INSERT INTO decisions (id, decision_date, organization, reference, title) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET decision_date = excluded.decision_date, organization = excluded.organization, "
+                    "reference = excluded.reference, title = excluded.title",
+                    [(decision_id, decision.get("decision_date"), decision.get("organization"), decision.get("reference"),
+                      decision.get("title")) for decision_id, decision in decisions.items()]
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO decision_text (decision_id, offset, length) VALUES (?, ?, ?)",
+                    self._append_texts(decisions)
+                )
+                ids = [(decision_id,) for decision_id in decisions]
+                self.db.executemany("DELETE FROM decision_individuals WHERE decision_id = ?", ids)
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO decision_individuals (decision_id, individual_id, position) VALUES (?, ?, ?)",
+                    [(decision_id, individual_id, position) for decision_id, decision in decisions.items()
+                     for position, individual_id in enumerate(decision.get("individual_ids", []))]
+                )
+                # The decision's own case_id, in case the case listing didn't include it
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO case_decisions (case_id, decision_id, position) VALUES (?, ?, -1)",
+                    [(decision["case_id"], decision_id) for decision_id, decision in decisions.items()
+                     if decision.get("case_id")]
+                )
+            if individuals:
+                self.db.executemany(
+                    "INSERT INTO individuals (id, name, nationality, firm, role, type) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, nationality = excluded.nationality, "
+                    "firm = excluded.firm, role = excluded.role, type = excluded.type",
+                    [(individual_id, individual.get("name"), individual.get("nationality"), individual.get("firm"),
+                      individual.get("role"), individual.get("type")) for individual_id, individual in individuals.items()]
+                )
+            if parties:
+                self.db.executemany(
+                    "INSERT INTO parties (id, name, nationality, role, type) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, nationality = excluded.nationality, "
+                    "role = excluded.role, type = excluded.type",
+                    [(party_id, party.get("name"), party.get("nationality"), party.get("role"), party.get("type"))
+                     for party_id, party in parties.items()]
+                )
+
+    def _append_texts(self, decisions):
+        """
+        Append the content of each decision to the current blob generation; returns
+        (id, offset, length) rows. Called inside write()'s transaction, so the generation
+        resolved here is the one the rows are committed against.
+        The blob is synced before the index rows are committed, so a crash can only leave
+        unreferenced bytes at its end. A rewritten text is appended again; the old copy is
+        left in place (run compact_texts() to reclaim it).
+        """
+        rows = []
+        with open(self._text_file(), 'ab') as f:
+            offset = f.tell()
+            for decision_id, decision in decisions.items():
+                content = decision.get("content")
+                if content is None:
+                    continue
+                data = zlib.compress(content.encode('utf-8'))
+                f.write(data)
+                rows.append((decision_id, offset, len(data)))
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return rows
+
+    def compact_texts(self):
+        """
+        Copy the texts still referenced into a new blob generation, dropping overwritten copies.
+
+        The new file is synced before the transaction that records both its name and the new
+        offsets, so a crash leaves either the old blob and offsets or the new ones in use.
+        Readers in other processes notice the switch through store_meta (see get_decision_text).
+        """
+        with self.lock, self.db:
+            # Hold the write lock throughout, so no writer appends to the old blob while it is copied
+            self.db.execute("BEGIN IMMEDIATE")
+            old_path = self._text_file()
+            if not os.path.exists(old_path):
+                return
+            row = self.db.execute("SELECT value FROM store_meta WHERE key = 'text_generation'").fetchone()
+            generation = int(row[0]) + 1 if row else 1
+            base, ext = os.path.splitext(self.text_path)
+            new_path = f"{base}.{generation}{ext}"
+            rows = self.db.execute("SELECT decision_id, offset, length FROM decision_text ORDER BY offset").fetchall()
+            updated = []
+            with open(old_path, 'rb') as src, open(new_path, 'wb') as dst:
+                for decision_id, offset, length in rows:
+                    src.seek(offset)
+                    updated.append((decision_id, dst.tell(), length))
+                    dst.write(src.read(length))
+                dst.flush()
+                os.fsync(dst.fileno())
+            self.db.executemany("UPDATE decision_text SET offset = ?, length = ? WHERE decision_id = ?",
+                                [(offset, length, decision_id) for decision_id, offset, length in updated])
+            self.db.executemany("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                                [('text_file', os.path.basename(new_path)), ('text_generation', str(generation))])
+        with self.lock:
+            # Processes that still map the old file keep reading it until they see the switch
+            if self._text_mapped is not None and self._text_mapped[0] == old_path:
+                self._text_map.close()
+                self._text_map = self._text_mapped = None
+            os.remove(old_path)
+
+    # --- Reading ---
+
+    def get_decision_text(self, decision_id):
+        """The full text of one decision, or None if it has none."""
+        with self.lock:
+            for attempt in range(2):
+                # Offsets and the blob they refer to are read in one statement, so they always match
+                row = self.db.execute(
+                    "SELECT offset, length, (SELECT value FROM store_meta WHERE key = 'text_file') "
+                    "FROM decision_text WHERE decision_id = ?", (decision_id,)).fetchone()
+                if row is None:
+                    return None
+                offset, length, text_file = row
+                path = self.text_path if text_file is None else os.path.join(os.path.dirname(self.text_path), text_file)
+                try:
+                    inode = os.stat(path).st_ino
+                    break
+                except FileNotFoundError:
+                    if attempt:
+                        raise  # Compacted away between the query and the stat: read the new offsets
+            if (self._text_map is None or self._text_mapped != (path, inode)
+                    or offset + length > len(self._text_map)):
+                # First read, a new blob generation (compaction), or the blob grew since it was mapped
+                if self._text_map is not None:
+                    self._text_map.close()
+                with open(path, 'rb') as f:
+                    self._text_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._text_mapped = (path, inode)
+            data = self._text_map[offset:offset + length]
+        return zlib.decompress(data).decode('utf-8')
+
+    def _rows(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def _links(self, sql):
+        return _group(self._rows(sql))
+
+    def case_decision_links(self):
+        """decision id -> [case ids], listing order first."""
+        return self._links("SELECT decision_id, case_id FROM case_decisions ORDER BY decision_id, position < 0, rowid")
+
+    def load_cases(self):
+        party_ids = self._links("SELECT case_id, party_id FROM case_parties ORDER BY case_id, position")
+        decision_ids = self._links("SELECT case_id, decision_id FROM case_decisions WHERE position >= 0 "
+                                   "ORDER BY case_id, position")
+        return {
+            case_id: {
+                "title": title,
+                "commencement_date": commencement_date,
+                "arbitral_institution": arbitral_institution,
+                "outcome": outcome,
+                "decision_ids": decision_ids.get(case_id, []),
+                "party_ids": party_ids.get(case_id, [])
+            }
+            for case_id, title, commencement_date, arbitral_institution, outcome in self._rows(
+                "SELECT id, title, commencement_date, arbitral_institution, outcome FROM cases ORDER BY rowid")
+        }
+
+    def load_decisions(self, include_content=False):
+        """Decisions in crawler shape. The full text is only read if include_content is set."""
+        individual_ids = self._links("SELECT decision_id, individual_id FROM decision_individuals "
+                                     "ORDER BY decision_id, position")
+        case_ids = self.case_decision_links()
+        decisions = {}
+        for decision_id, decision_date, organization, reference, title in self._rows(
+                "SELECT id, decision_date, organization, reference, title FROM decisions ORDER BY rowid"):
+            decisions[decision_id] = {
+                "decision_id": decision_id,
+                "decision_date": decision_date,
+                "organization": organization,
+                "reference": reference,
+                "title": title,
+                "individual_ids": individual_ids.get(decision_id, []),
+                "case_id": case_ids.get(decision_id, [None])[0]
+            }
+            if include_content:
+                decisions[decision_id]["content"] = self.get_decision_text(decision_id)
+        return decisions
+
+    def load_individuals(self):
+        decision_ids = self._links("SELECT individual_id, decision_id FROM decision_individuals "
+                                   "ORDER BY individual_id, rowid")
+        individuals = {}
+        for individual_id, name, nationality, firm, role, type_ in self._rows(
+                "SELECT id, name, nationality, firm, role, type FROM individuals ORDER BY rowid"):
+            links = decision_ids.get(individual_id, [])
+            individuals[individual_id] = {
+                "id": individual_id, "name": name, "nationality": nationality, "firm": firm, "role": role,
+                "type": type_, "decision_id": links[0] if links else None, "decision_ids": links
+            }
+        return individuals
+
+    def load_parties(self):
+        case_ids = self._links("SELECT party_id, case_id FROM case_parties ORDER BY party_id, rowid")
+        parties = {}
+        for party_id, name, nationality, role, type_ in self._rows(
+                "SELECT id, name, nationality, role, type FROM parties ORDER BY rowid"):
+            links = case_ids.get(party_id, [])
+            parties[party_id] = {
+                "id": party_id, "name": name, "nationality": nationality, "role": role, "type": type_,
+                "case_id": links[0] if links else None, "case_ids": links
+            }
+        return parties
+
+    def load_all(self, include_content=False):
+        """(cases, decisions, individuals, parties) in crawler shape."""
+        return self.load_cases(), self.load_decisions(include_content), self.load_individuals(), self.load_parties()
+
+    def graph_inputs(self):
+        """
+        The records generate_relationship_graph needs: party ids per case, individual ids
+        and case per decision, names and the attributes kept on nodes and cases. No decision text.
+        """
+        party_ids = self._links("SELECT case_id, party_id FROM case_parties ORDER BY case_id, position")
+        cases = {case_id: {"party_ids": party_ids.get(case_id, []), "commencement_date": commencement_date,
+                           "arbitral_institution": arbitral_institution, "outcome": outcome}
+                 for case_id, commencement_date, arbitral_institution, outcome in self._rows(
+                     "SELECT id, commencement_date, arbitral_institution, outcome FROM cases ORDER BY rowid")}
+        individual_ids = self._links("SELECT decision_id, individual_id FROM decision_individuals "
+                                     "ORDER BY decision_id, position")
+        case_ids = self.case_decision_links()
+        decisions = {decision_id: {"individual_ids": individual_ids.get(decision_id, []),
+                                   "case_id": case_ids.get(decision_id, [None])[0]}
+                     for (decision_id,) in self._rows("SELECT id FROM decisions ORDER BY rowid")}
+        individuals = {individual_id: {"name": name, "role": role, "nationality": nationality, "firm": firm}
+                       for individual_id, name, role, nationality, firm in self._rows(
+                           "SELECT id, name, role, nationality, firm FROM individuals ORDER BY rowid")}
+        parties = {party_id: {"name": name, "type": type_, "role": role, "nationality": nationality}
+                   for party_id, name, type_, role, nationality in self._rows(
+                       "SELECT id, name, type, role, nationality FROM parties ORDER BY rowid")}
+        return cases, decisions, individuals, parties
+
+    def names(self):
+        """All individual names followed by all party names (the former names.json)."""
+        return [name for table in ("individuals", "parties")
+                for (name,) in self._rows(f"SELECT name FROM {table} WHERE name IS NOT NULL ORDER BY rowid")]
+
+    def find_by_name(self, name):
+        """Ids of the individuals and parties with exactly this name: (individual ids, party ids)."""
+        individual_ids = [row[0] for row in self._rows("SELECT id FROM individuals WHERE name = ? ORDER BY rowid", (name,))]
+        party_ids = [row[0] for row in self._rows("SELECT id FROM parties WHERE name = ? ORDER BY rowid", (name,))]
+        return individual_ids, party_ids
+
+def import_json(store, cases_file='cases.json', decisions_file='decisions.json',
+                individuals_file='individuals.json', parties_file='parties.json'):
+    """Load an existing JSON dataset into the store."""
+    loaded = []
+    for path in (cases_file, decisions_file, individuals_file, parties_file):
+        with open(path, 'r') as f:
+            loaded.append(json.load(f))
+    store.write(*loaded)
+
+def export_json(store, include_content=True):
+    """Write the store back out as compact JSON files (for tools that still expect them)."""
+    cases, decisions, individuals, parties = store.load_all(include_content)
+    for path, records in (('cases.json', cases), ('decisions.json', decisions),
+                          ('individuals.json', individuals), ('parties.json', parties), ('names.json', store.names())):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+
+if __name__ == '__main__':
+    # python dataset_store.py import|export|compact [dataset path]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'import'
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DATASET_PATH
+    with DatasetStore(path) as dataset:
+        if command == 'import':
+            import_json(dataset)
+            print(f"Imported JSON dataset into {path}")
+        elif command == 'export':
+            export_json(dataset)
+            print(f"Exported {path} to JSON")
+        elif command == 'compact':
+            dataset.compact_texts()
+            print(f"Compacted decision texts into {dataset._text_file()}")
+        else:
+            print(f"Unknown command: {command}")
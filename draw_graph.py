@@ -1,16 +1,192 @@
 import json
+import os
+import threading
+import unicodedata
 from collections import deque
+import numpy as np
+from dataset_store import DatasetStore, DEFAULT_DATASET_PATH
+from graph_attributes import GraphAttributes, FilteredIndex, validate_filters
+from graph_index import (GraphIndex, BipartiteGraphIndex, Csr, compute_centrality, co_occurrence_edges, NodeTable,
+                         RELATIONSHIP_TYPES, SUPPORT_KINDS)
 from rapidfuzz import process, fuzz
 from itertools import combinations # Needed for pairwise iteration
 
-def fuzzy_search(name_search):
-    with open('names.json', 'r') as f:
-        names = json.load(f)  # Load the list of names from the JSON file
+def normalize_name(name):
+    """Casefold and strip accents so that e.g. "Hüseyin" and "Huseyin" compare equal."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
 
-    matches = process.extract(name_search, names, scorer=fuzz.token_set_ratio, limit=5)
+class NameIndex:
+    """
+    Long-lived fuzzy search index over entity names.
+
+    Names are normalized (see normalize_name) and deduplicated once when the index
+    is built, so each search only has to score the query against the prepared choices.
+    When built from a names file, the index reloads itself only if the file's
+    modification time changes.
+    """
+
+    def __init__(self, names=None, names_file=None):
+        self.names_file = names_file
+        self._mtime = None
+        self._lock = threading.Lock()
+        # (normalized choices, original name for each choice), swapped as a whole on reload
+        self._state = ([], [])
+        if names is not None:
+            self._state = self._prepare(names)
+        elif names_file is not None:
+            self.reload_if_changed()
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Build the index from the names of the graph's nodes."""
+        nodes = graph['nodes']
+        if isinstance(nodes, NodeTable):
+            return cls(names=nodes.names)  # Snapshot: read the string table without creating node dicts
+        return cls(names=[node['data']['name'] for node in nodes])
+
+    @classmethod
+    def from_store(cls, dataset_path=DEFAULT_DATASET_PATH):
+        """Build the index from the individual and party names in the dataset store."""
+        with DatasetStore(dataset_path) as store:
+            return cls(names=store.names())
+
+    @classmethod
+    def from_file(cls, names_file='names.json'):
+        """Build the index from a JSON list of names, reloading when the file changes."""
+        return cls(names_file=names_file)
+
+    @staticmethod
+    def _prepare(names):
+        choices = []
+        originals = []
+        seen = set()
+        for name in names:
+            if not name:
+                continue
+            key = normalize_name(name)
+            if key in seen:
+                continue  # Keep the first spelling of a duplicated name
+            seen.add(key)
+            choices.append(key)
+            originals.append(name)
+        return choices, originals
+
+    def reload_if_changed(self):
+        """Re-read the names file if it changed since the last load. Returns True on reload."""
+        if self.names_file is None:
+            return False
+        mtime = os.stat(self.names_file).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            with open(self.names_file, 'r') as f:
+                names = json.load(f)
+            self._state = self._prepare(names)
+            self._mtime = mtime
+        return True
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def search(self, query, limit=5):
+        """Return up to `limit` (name, score) pairs for the query, best match first."""
+        self.reload_if_changed()
+        choices, originals = self._state
+        matches = process.extract(normalize_name(query), choices, scorer=fuzz.token_set_ratio,
+                                  processor=None, limit=limit)
+        return [(originals[i], score) for _, score, i in matches]
+
+    def search_many(self, queries, limit=5, score_cutoff=0):
+        """
+        Score every query against every name in a single vectorized call.
+
+        Returns one list per query of up to `limit` (name, score) pairs, best match
+        first. Candidates scoring below score_cutoff are dropped.
+        """
+        self.reload_if_changed()
+        choices, originals = self._state
+        if not queries:
+            return []
+        if not choices:
+            return [[] for _ in queries]
+
+        normalized = [normalize_name(query) for query in queries]
+        scores = process.cdist(normalized, choices, scorer=fuzz.token_set_ratio, processor=None,
+                               score_cutoff=score_cutoff, workers=-1)
+
+        limit = min(limit, len(choices))
+        # Partial sort to get the top `limit` columns per row, then order just those
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # Stable sort keeps the original name order between equal scores, like process.extract
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        results = []
+        for row_ids, row_scores in zip(top.tolist(), top_scores.tolist()):
+            results.append([(originals[i], score) for i, score in zip(row_ids, row_scores)
+                            if score >= score_cutoff])
+        return results
+
+# Shared index used by fuzzy_search when no explicit index is given
+_NAME_INDEX = None
+_NAME_INDEX_LOCK = threading.Lock()
+
+def get_name_index(names_file='names.json', dataset_path=DEFAULT_DATASET_PATH):
+    """
+    Return the process-wide NameIndex, creating it on first use from names_file if
+    that exists, else from the dataset store.
+    """
+    global _NAME_INDEX
+    if _NAME_INDEX is None:
+        with _NAME_INDEX_LOCK:
+            if _NAME_INDEX is None:
+                if os.path.exists(names_file):
+                    _NAME_INDEX = NameIndex.from_file(names_file)
+                else:
+                    _NAME_INDEX = NameIndex.from_store(dataset_path)
+    return _NAME_INDEX
+
+def set_name_index(index):
+    """Replace the process-wide NameIndex (e.g. with one built from the graph's nodes)."""
+    global _NAME_INDEX
+    _NAME_INDEX = index
+
+def fuzzy_search(name_search, index=None):
+    if index is None:
+        index = get_name_index()
+    matches = index.search(name_search, limit=5)
+    if not matches:
+        return None
     return matches[0][0]
 
-def generate_relationship_graph(cases_file, decisions_file, individuals_file, parties_file):
+def fuzzy_search_many(queries, limit=5, score_cutoff=0, index=None):
+    """
+    Batch version of fuzzy_search: returns the top `limit` (name, score) candidates
+    for each query, scoring all queries against all names in one call.
+    """
+    if index is None:
+        index = get_name_index()
+    return index.search_many(queries, limit=limit, score_cutoff=score_cutoff)
+
+def generate_relationship_graph(cases_file, decisions_file, individuals_file, parties_file, mode='pairwise'):
+    """
+    Builds the relationship graph between individuals and parties.
+
+    mode='pairwise' materializes every co-membership edge up front (graph['edges']).
+    mode='bipartite' keeps only entity -> case / decision memberships in a
+    BipartiteGraphIndex and derives the same pairwise edges lazily; graph['edges']
+    is then None (use graph_edges() to materialize them all).
+
+    Edges carry data.weight, the number of cases (party-party) or decisions
+    (individual-individual, individual-party) behind them, and data.relationship;
+    get_edge_support lists those cases / decisions.
+    """
     # Load JSON files
     with open(cases_file, 'r') as f:
         cases = json.load(f)
@@ -20,12 +196,26 @@ def generate_relationship_graph(cases_file, decisions_file, individuals_file, pa
         individuals = json.load(f)
     with open(parties_file, 'r') as f:
         parties = json.load(f)
-    
+    return build_relationship_graph(cases, decisions, individuals, parties, mode=mode)
+
+def generate_relationship_graph_from_store(dataset_path=DEFAULT_DATASET_PATH, mode='pairwise'):
+    """
+    Same as generate_relationship_graph, reading from the SQLite dataset store.
+    Only ids, links, names and party types are loaded, never decision text.
+    """
+    with DatasetStore(dataset_path) as store:
+        cases, decisions, individuals, parties = store.graph_inputs()
+    return build_relationship_graph(cases, decisions, individuals, parties, mode=mode)
+
+def build_relationship_graph(cases, decisions, individuals, parties, mode='pairwise'):
+    """Build the graph from already loaded records (dicts keyed by id, as written by the crawlers)."""
+    if mode not in ('pairwise', 'bipartite'):
+        raise ValueError(f"Unknown graph mode: {mode}")
+
     # Create a mapping for nodes (unique numeric id) and lists for nodes and edges.
     # We use a key prefix ("individual_" or "party_") to avoid id collisions.
     node_map = {}  # key: "individual_{id}" or "party_{id}" -> numeric node id
     nodes = []
-    edges = []
     next_id = 0
 
     # Add nodes for individuals (always use type 'person')
@@ -56,128 +246,331 @@ def generate_relationship_graph(cases_file, decisions_file, individuals_file, pa
         })
         next_id += 1
 
-    # Helper set to avoid duplicate edges (treated as undirected)
-    edge_set = set()
-    def add_edge(source, target):
-        key = tuple(sorted((source, target)))
-        if key not in edge_set:
-            edge_set.add(key)
-            edges.append({'source': str(key[0]), 
-                          'target': str(key[1]),
-                          'id': str(key[0]) + '_' + str(key[1])})
-    
-    # 1. Party ↔ Party via Case (entity A -> case_id -> entity B)
-    for case in cases.values():
-        party_ids = case.get("party_ids", [])
-        for i in range(len(party_ids)):
-            for j in range(i + 1, len(party_ids)):
-                key1 = f"party_{party_ids[i]}"
-                key2 = f"party_{party_ids[j]}"
-                if key1 in node_map and key2 in node_map:
-                    add_edge(node_map[key1], node_map[key2])
-    
-    # 2. Individual ↔ Individual via Decision (entity A -> decision_id -> entity B)
-    for decision in decisions.values():
-        individual_ids = decision.get("individual_ids", [])
-        for i in range(len(individual_ids)):
-            for j in range(i + 1, len(individual_ids)):
-                key1 = f"individual_{individual_ids[i]}"
-                key2 = f"individual_{individual_ids[j]}"
-                if key1 in node_map and key2 in node_map:
-                    add_edge(node_map[key1], node_map[key2])
-    
-    # 3 & 4. Party ↔ Individual via Case–Decision Chain:
-    # For each decision, use its associated case to connect each individual (from decision)
-    # with each party (from the case)
-    for decision in decisions.values():
-        case_id = decision.get("case_id")
-        individual_ids = decision.get("individual_ids", [])
-        if case_id in cases:
-            party_ids = cases[case_id].get("party_ids", [])
-            for ind in individual_ids:
-                for party in party_ids:
-                    key1 = f"individual_{ind}"
-                    key2 = f"party_{party}"
-                    if key1 in node_map and key2 in node_map:
-                        add_edge(node_map[key1], node_map[key2])
-    
-    # Return the final graph
+    # Role, nationality, institution, dates... as columns for filtered traversals
+    attributes = GraphAttributes.build(nodes, node_map, cases, decisions, individuals, parties)
+    case_parties, decision_individuals, decision_cases = _memberships(node_map, cases, decisions)
     graph = {
         'nodes': nodes,
-        'edges': edges
+        'case_ids': list(cases),
+        'decision_ids': list(decisions),
+        'attributes': attributes
     }
+
+    if mode == 'bipartite':
+        graph['edges'] = None
+        graph['index'] = BipartiteGraphIndex(nodes, case_parties, decision_individuals, decision_cases, len(cases))
+        return graph
+
+    # Every co-occurrence as (node, node, relationship type, supporting case / decision),
+    # collapsed into weighted edges by one sort instead of deduplicating pair by pair
+    case_parties = np.asarray(case_parties, dtype=np.int64).reshape(-1, 2)
+    decision_individuals = np.asarray(decision_individuals, dtype=np.int64).reshape(-1, 2)
+    source, target, weight, types, support = co_occurrence_edges(
+        len(nodes), case_parties[:, 0], case_parties[:, 1], decision_individuals[:, 0], decision_individuals[:, 1],
+        decision_cases, Csr(len(cases), case_parties[:, 0], case_parties[:, 1]))
+
+    # Return the final graph, plus a read-only index shared by all traversal functions.
+    # Edge dicts are created on access from the index's arrays.
+    index = GraphIndex.from_edge_arrays(nodes, source, target, weight, types, support)
+    graph['edges'] = index.edges
+    graph['index'] = index
     return graph
 
-def get_subgraph_by_name(graph, target_name, k):
+def _memberships(node_map, cases, decisions):
+    """
+    Entity -> case / decision memberships by position: (case, party node) pairs,
+    (decision, individual node) pairs, and the case of each decision (-1 if unknown).
+    """
+    case_positions = {case_id: i for i, case_id in enumerate(cases)}
+
+    case_parties = []
+    for case_id, case in cases.items():
+        for party_id in case.get("party_ids", []):
+            node_id = node_map.get(f"party_{party_id}")
+            if node_id is not None:
+                case_parties.append((case_positions[case_id], node_id))
+
+    decision_individuals = []
+    decision_cases = []
+    for position, decision in enumerate(decisions.values()):
+        decision_cases.append(case_positions.get(decision.get("case_id"), -1))
+        for individual_id in decision.get("individual_ids", []):
+            node_id = node_map.get(f"individual_{individual_id}")
+            if node_id is not None:
+                decision_individuals.append((position, node_id))
+
+    return case_parties, decision_individuals, decision_cases
+
+def graph_edges(graph):
+    """Return the graph's edge list, materializing it first for bipartite or snapshot-loaded graphs."""
+    edges = graph['edges']
+    if edges is None:
+        return list(graph['index'].iter_edges())
+    if not isinstance(edges, list):
+        return list(edges)  # Lazy EdgeTable from a snapshot
+    return edges
+
+def _bipartite_edge_arrays(graph):
+    """(source, target, weight) of a bipartite graph's edges, derived once and kept in the graph dict."""
+    arrays = graph.get('edge_arrays')
+    if arrays is None:
+        arrays = graph['edge_arrays'] = graph['index'].edge_arrays()
+    return arrays
+
+def edge_arrays(graph):
+    """Source and target positions of every edge, deriving bipartite edges if needed."""
+    index = graph['index']
+    if graph['edges'] is None:
+        return _bipartite_edge_arrays(graph)[:2]
+    if hasattr(index, 'edge_source'):
+        return np.asarray(index.edge_source), np.asarray(index.edge_target)
+    edges = graph_edges(graph)
+    return (np.fromiter((int(edge['source']) for edge in edges), dtype=np.int64, count=len(edges)),
+            np.fromiter((int(edge['target']) for edge in edges), dtype=np.int64, count=len(edges)))
+
+def edge_weights(graph):
+    """Weight of every edge, aligned with edge_arrays."""
+    index = graph['index']
+    if graph['edges'] is None:
+        return _bipartite_edge_arrays(graph)[2]
+    if getattr(index, 'edge_weight', None) is not None:
+        return np.asarray(index.edge_weight)
+    edges = graph_edges(graph)
+    return np.fromiter((edge.get('data', {}).get('weight', 1) for edge in edges), dtype=np.int32, count=len(edges))
+
+def get_centrality(graph):
+    """
+    (degree, pagerank) arrays indexed by node position. Snapshots store them; for other
+    graphs they are computed on first use and kept in the graph dict.
+    """
+    if 'pagerank' not in graph:
+        source, target = edge_arrays(graph)
+        graph['degree'], graph['pagerank'] = compute_centrality(len(graph['nodes']), source, target)
+    return graph['degree'], graph['pagerank']
+
+def get_graph_index(graph):
+    """Return the graph's GraphIndex, building (and caching) it for graphs that lack one."""
+    index = graph.get('index')
+    if index is None:
+        index = GraphIndex(graph['nodes'], graph['edges'])
+        graph['index'] = index
+    return index
+
+def filtered_index(graph, filters=None):
+    """
+    The graph's index, or with filters a FilteredIndex over it whose neighbors() skips
+    nodes and edges that don't match, so traversals prune as they go. Filters are
+    attribute -> value(s) for the node attributes (type, role, nationality, firm) and
+    the case attributes (institution, outcome, date_from, date_to) of graph_attributes.
+    """
+    index = get_graph_index(graph)
+    if not filters:
+        return index
+    validate_filters(filters)
+    attributes = graph.get('attributes')
+    if attributes is None:
+        raise ValueError("This graph has no attribute columns to filter on")
+    return FilteredIndex(index, attributes, filters)
+
+def get_subgraph_by_name(graph, target_name, k, max_nodes=None, fanout=None, filters=None):
     """
     Returns a subgraph containing all nodes within k degrees of separation from the node
     with the specified name (target_name). Uses a breadth-first search (BFS) from the target node.
     Only includes edges that were actually traversed during the BFS.
+    With max_nodes or fanout the traversal is ranked and bounded (see ranked_multi_source_bfs).
+    With filters only matching neighbors are expanded (see filtered_index).
     """
-    # Find the node id(s) for the given name.
-    target_ids = [node['id'] for node in graph['nodes'] if node['data']['name'] == target_name]
-    if not target_ids:
+    index = filtered_index(graph, filters)
+
+    # Find the node id for the given name (first match if there are multiple)
+    target_id = index.find(target_name)
+    if target_id is None:
         print(f"No node found with name: {target_name}")
         return None
-    
-    target_id = target_ids[0]  # Use the first match if there are multiple
-    
-    # Build an adjacency list from the graph's edges with edge references
-    edge_map = {}  # (node1, node2) -> edge object
-    for edge in graph['edges']:
-        source, target = edge['source'], edge['target']
-        edge_map[(source, target)] = edge
-        edge_map[(target, source)] = edge  # Add both directions for undirected graph
-    
-    adj = {node['id']: set() for node in graph['nodes']}
-    for edge in graph['edges']:
-        source = edge['source']
-        target = edge['target']
-        adj[source].add(target)
-        adj[target].add(source)
-    
+
+    if max_nodes is not None or fanout is not None:
+        _, pagerank = get_centrality(graph)
+        masks, tree_edges, pruned, truncated = ranked_multi_source_bfs(index, [target_id], k, pagerank,
+                                                                       max_nodes, fanout)
+        subgraph = index.subgraph(masks, tree_edges)
+        subgraph['pruned'] = pruned
+        subgraph['truncated'] = truncated
+        return subgraph
+
     # BFS to find nodes within k degrees
     visited = {target_id: 0}
     queue = deque([target_id])
-    # Track parent nodes to reconstruct the traversal path
-    parents = {target_id: None}
-    
+    # Track the edge each node was reached through; these are the traversed edges
+    parent_edges = {}
+
     while queue:
         current = queue.popleft()
         current_depth = visited[current]
         if current_depth < k:
-            for neighbor in adj[current]:
+            neighbors, edge_ids = index.neighbors(current)
+            for neighbor, edge_id in zip(neighbors, edge_ids):
                 if neighbor not in visited:
                     visited[neighbor] = current_depth + 1
-                    parents[neighbor] = current
+                    parent_edges[neighbor] = edge_id
                     queue.append(neighbor)
-    
-    # Collect nodes in the visited set
-    sub_nodes = [node for node in graph['nodes'] if node['id'] in visited]
-    
-    # Only include edges that were traversed during BFS
-    sub_edges = []
-    traversed_edges = set()
-    
-    # For each node (except the start node), add the edge from its parent
-    for node_id, parent_id in parents.items():
-        if parent_id is not None:  # Skip the start node
-            # Create a unique key for this edge
-            edge_key = tuple(sorted([parent_id, node_id]))
-            if edge_key not in traversed_edges:
-                traversed_edges.add(edge_key)
-                # Find the actual edge object
-                edge = edge_map.get((parent_id, node_id)) or edge_map.get((node_id, parent_id))
-                if edge:
-                    sub_edges.append(edge)
-    
-    subgraph = {'nodes': sub_nodes, 'edges': sub_edges}
-    return subgraph
 
-def get_union_subgraph_by_names(graph, target_names, k):
+    return index.subgraph(visited, parent_edges.values())
+
+def get_edge_support(graph, source, target):
+    """
+    The relationship behind the edge between two node ids: its type, its weight and the
+    ids of the cases (party-party) or decisions it rests on. None if there is no such edge.
+    """
+    index = get_graph_index(graph)
+    neighbors, edge_ids = index.neighbors(source)
+    if target not in neighbors:
+        return None
+    support = index.support(edge_ids[neighbors.index(target)])
+    if support is None:
+        return None  # Graph built without supporting ids
+    relationship, positions = support
+    kind = SUPPORT_KINDS[RELATIONSHIP_TYPES.index(relationship)]
+    ids = graph[f"{kind}_ids"]
+    return {'relationship': relationship, 'weight': len(positions), f"{kind}_ids": [ids[p] for p in positions]}
+
+def get_strongest_ties(graph, target_name, limit=10):
+    """The neighbors of the named node with the heaviest edges first, as node / weight / relationship dicts."""
+    index = get_graph_index(graph)
+    node_id = index.find(target_name)
+    if node_id is None:
+        print(f"No node found with name: {target_name}")
+        return None
+    ties = []
+    for neighbor, edge_id in zip(*index.neighbors(node_id)):
+        data = index.edge(edge_id).get('data', {})
+        ties.append({'node': index.nodes[neighbor], 'weight': data.get('weight', 1),
+                     'relationship': data.get('relationship')})
+    ties.sort(key=lambda tie: (-tie['weight'], int(tie['node']['id'])))
+    return ties[:limit]
+
+def multi_source_bfs(index, seeds, k):
+    """
+    Runs one k-hop BFS from all seed nodes at once.
+
+    Each seed is assigned one bit; a node's mask records which seeds reach it within
+    k hops. The traversal is level-synchronous and only pushes the bits a node newly
+    acquired at the previous level, so it is equivalent to a separate BFS per seed
+    but visits each (node, level) at most once.
+
+    Returns:
+      masks: dict of integer node id -> bitmask of the seeds (by position) that reached it
+      tree_edges: set of edge ids through which some seed first reached a node
+    """
+    masks = {}
+    tree_edges = set()
+    for _, edge_ids in iter_multi_source_bfs(index, seeds, k, masks):
+        tree_edges.update(edge_ids)
+    return masks, tree_edges
+
+def iter_multi_source_bfs(index, seeds, k, masks=None):
+    """
+    multi_source_bfs one level at a time, for callers that consume results as they go.
+
+    Yields (nodes, edge_ids) for the seeds (with no edges), then for each level: the nodes
+    first reached at that level and the tree edges found while expanding it, both in
+    discovery order. A level is only expanded once the caller asks for it. `masks`, if
+    given, is filled in place with every node's seed bitmask.
+    """
+    if masks is None:
+        masks = {}
+    frontier = {}
+    for bit, seed in enumerate(seeds):
+        masks[seed] = masks.get(seed, 0) | (1 << bit)
+        frontier[seed] = masks[seed]
+    yield list(frontier), []
+
+    for _ in range(k):
+        if not frontier:
+            return
+        next_frontier = {}
+        level_nodes = []
+        level_edges = {}  # Insertion-ordered set
+        for node, bits in frontier.items():
+            neighbors, edge_ids = index.neighbors(node)
+            for neighbor, edge_id in zip(neighbors, edge_ids):
+                new_bits = bits & ~masks.get(neighbor, 0)
+                if new_bits:
+                    if neighbor not in masks:
+                        level_nodes.append(neighbor)
+                    masks[neighbor] = masks.get(neighbor, 0) | new_bits
+                    next_frontier[neighbor] = next_frontier.get(neighbor, 0) | new_bits
+                    level_edges[edge_id] = None
+        frontier = next_frontier
+        yield level_nodes, list(level_edges)
+
+def _fanout_at(fanout, depth):
+    """The fan-out cap for nodes expanded at this depth: an int for all hops, or one per hop."""
+    if fanout is None or isinstance(fanout, int):
+        return fanout
+    return fanout[min(depth, len(fanout) - 1)] if fanout else None
+
+def ranked_multi_source_bfs(index, seeds, k, rank, max_nodes=None, fanout=None):
+    """
+    multi_source_bfs with a node budget and per-hop fan-out caps.
+
+    Each level expands its nodes in descending rank, and each node passes its seed bits
+    to at most fanout (for that hop) of its neighbors, highest ranked first. No new node
+    is added once max_nodes are reached.
+
+    Returns (masks, tree_edges, pruned, truncated): pruned maps the id of every expanded
+    node that has neighbors left out of the result to how many, for an "expand" action;
+    truncated is True if the node budget cut the traversal short.
+    """
+    rank = np.asarray(rank)
+    masks = {}
+    frontier = {}
+    for bit, seed in enumerate(seeds):
+        masks[seed] = masks.get(seed, 0) | (1 << bit)
+        frontier[seed] = masks[seed]
+    tree_edges = set()
+    expanded = []
+    truncated = False
+
+    for depth in range(k):
+        cap = _fanout_at(fanout, depth)
+        next_frontier = {}
+        ordered = sorted(frontier, key=lambda node: -rank[node])
+        for node in ordered:
+            bits = frontier[node]
+            expanded.append(node)
+            neighbors, edge_ids = index.neighbors(node)
+            candidates = [(neighbor, edge_id) for neighbor, edge_id in zip(neighbors, edge_ids)
+                          if bits & ~masks.get(neighbor, 0)]
+            if not candidates:
+                continue
+            order = np.argsort(-rank[[neighbor for neighbor, _ in candidates]], kind='stable')
+            if cap is not None:
+                order = order[:cap]
+            for i in order.tolist():
+                neighbor, edge_id = candidates[i]
+                if neighbor not in masks and max_nodes is not None and len(masks) >= max_nodes:
+                    truncated = True
+                    continue
+                new_bits = bits & ~masks.get(neighbor, 0)
+                masks[neighbor] = masks.get(neighbor, 0) | new_bits
+                next_frontier[neighbor] = next_frontier.get(neighbor, 0) | new_bits
+                tree_edges.add(edge_id)
+        frontier = next_frontier
+        if not frontier:
+            break
+
+    pruned = {}
+    for node in expanded:
+        left_out = sum(1 for neighbor in index.neighbors(node)[0] if neighbor not in masks)
+        if left_out:
+            pruned[index.nodes[node]['id']] = left_out
+    return masks, tree_edges, pruned, truncated
+
+def get_union_subgraph_by_names(graph, target_names, k, max_nodes=None, fanout=None, filters=None):
     """
     Returns a subgraph containing the union of nodes and edges found within 
     k degrees of separation from any node with a name in target_names.
+    All names are expanded together in a single multi-source BFS.
     
     Parameters:
       graph: dict with keys 'nodes' and 'edges'
@@ -185,60 +578,206 @@ def get_union_subgraph_by_names(graph, target_names, k):
       k: degrees of separation
       
     Returns:
-      A dictionary representing the union subgraph with keys 'nodes' and 'edges'.
+      A dictionary representing the union subgraph with keys 'nodes' and 'edges',
+      plus 'reached_from' mapping each node id to the target names within k of it.
       If no starting node is found for any name, those names are skipped.
+      With max_nodes or fanout the traversal is ranked and bounded, and 'pruned' /
+      'truncated' are added (see ranked_multi_source_bfs).
+      With filters only matching neighbors are expanded (see filtered_index).
     """
-    # Initialize empty union subgraph
-    union_subgraph = {'nodes': [], 'edges': []}
-    node_ids_in_union = set()
-    edge_ids_in_union = set()
-    
-    # For each target name, get its subgraph and add to the union
-    for name in target_names:
-        subgraph = get_subgraph_by_name(graph, name, k)
-        if subgraph:
-            # Add new nodes
-            for node in subgraph['nodes']:
-                if node['id'] not in node_ids_in_union:
-                    node_ids_in_union.add(node['id'])
-                    union_subgraph['nodes'].append(node)
-            
-            # Add new edges
-            for edge in subgraph['edges']:
-                edge_id = edge['id']
-                if edge_id not in edge_ids_in_union:
-                    edge_ids_in_union.add(edge_id)
-                    union_subgraph['edges'].append(edge)
-    
-    if not union_subgraph['nodes']:
+    index = filtered_index(graph, filters)
+    seed_names, seeds = _resolve_seeds(index, target_names)
+
+    if not seeds:
         print("No valid nodes found for any of the given names.")
         return None
-        
+
+    if max_nodes is not None or fanout is not None:
+        _, pagerank = get_centrality(graph)
+        masks, tree_edges, pruned, truncated = ranked_multi_source_bfs(index, seeds, k, pagerank, max_nodes, fanout)
+    else:
+        masks, tree_edges = multi_source_bfs(index, seeds, k)
+
+    union_subgraph = index.subgraph(masks, tree_edges)
+    if max_nodes is not None or fanout is not None:
+        union_subgraph['pruned'] = pruned
+        union_subgraph['truncated'] = truncated
+    union_subgraph['reached_from'] = _reached_from(index, seed_names, masks)
     return union_subgraph
 
-def get_connecting_paths_subgraph(graph, target_names, k):
+def _resolve_seeds(index, target_names):
+    """(names, node ids) of the target names found in the index, without repeats, in order."""
+    seed_names = []
+    seeds = []
+    for name in dict.fromkeys(target_names):  # Drop repeated names, keep order
+        node_id = index.find(name)
+        if node_id is None:
+            print(f"No node found with name: {name}")
+            continue
+        seed_names.append(name)
+        seeds.append(node_id)
+    return seed_names, seeds
+
+def _reached_from(index, seed_names, masks, kept=None):
+    """node id -> the seed names whose bits are set in its mask, for the nodes in kept (default all)."""
+    return {
+        index.nodes[node]['id']: [name for bit, name in enumerate(seed_names) if mask >> bit & 1]
+        for node, mask in sorted(masks.items()) if kept is None or node in kept
+    }
+
+def iter_union_subgraph(graph, target_names, k, max_nodes=None, filters=None):
+    """
+    Streaming version of get_union_subgraph_by_names.
+
+    Runs the same multi-source BFS (iter_multi_source_bfs), but after each level yields the
+    records it completed instead of building the subgraph: {'type': 'node', 'node': ...}
+    for each newly reached node, then {'type': 'edge', 'edge': ...} for each new tree
+    edge, and finally one {'type': 'meta', ...} record with the totals and reached_from.
+    Every edge is yielded after both of its nodes. With max_nodes, the traversal stops
+    once that many nodes were yielded and the meta record says truncated.
+    """
+    index = filtered_index(graph, filters)
+    seed_names, seeds = _resolve_seeds(index, target_names)
+
+    masks = {}
+    emitted = set()
+    emitted_edges = set()  # An edge can be a tree edge at two levels, for different seeds
+    truncated = False
+    for level_nodes, level_edges in iter_multi_source_bfs(index, seeds, k, masks):
+        for node in level_nodes:
+            if max_nodes is not None and len(emitted) >= max_nodes:
+                truncated = True
+                break
+            emitted.add(node)
+            yield {'type': 'node', 'node': index.nodes[node]}
+        for edge_id in level_edges:
+            if edge_id in emitted_edges:
+                continue
+            edge = index.edge(edge_id)
+            if int(edge['source']) in emitted and int(edge['target']) in emitted:
+                emitted_edges.add(edge_id)
+                yield {'type': 'edge', 'edge': edge}
+        if truncated:
+            break
+
+    yield {
+        'type': 'meta',
+        'num_nodes': len(emitted),
+        'num_edges': len(emitted_edges),
+        'truncated': truncated,
+        'reached_from': _reached_from(index, seed_names, masks, emitted),
+    }
+
+def bfs_tree(index, source, radius):
+    """
+    BFS from source up to `radius` hops, recording parent pointers instead of paths.
+
+    Returns:
+      dist: dict of integer node id -> hop distance from source
+      parents: dict of integer node id -> list of (parent node, edge id) pairs, one per
+               shortest-path predecessor (empty for the source)
+    """
+    dist = {source: 0}
+    parents = {source: []}
+    frontier = [source]
+    for depth in range(1, radius + 1):
+        next_frontier = []
+        for node in frontier:
+            neighbors, edge_ids = index.neighbors(node)
+            for neighbor, edge_id in zip(neighbors, edge_ids):
+                neighbor_depth = dist.get(neighbor)
+                if neighbor_depth is None:
+                    dist[neighbor] = depth
+                    parents[neighbor] = [(node, edge_id)]
+                    next_frontier.append(neighbor)
+                elif neighbor_depth == depth:
+                    parents[neighbor].append((node, edge_id))
+        frontier = next_frontier
+        if not frontier:
+            break
+    return dist, parents
+
+def _walk_back(parents, start, nodes, edges, all_paths):
+    """Add the nodes and edges on the path(s) from start back to the tree's source."""
+    stack = [start]
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue  # Already expanded through another shortest path
+        seen.add(node)
+        nodes.add(node)
+        links = parents[node] if all_paths else parents[node][:1]
+        for parent, edge_id in links:
+            edges.add(edge_id)
+            stack.append(parent)
+
+def find_connecting_paths(index, target_ids, k, all_paths=False):
+    """
+    Finds shortest paths (up to length k) between every pair of target nodes.
+
+    Every target gets a single BFS tree of radius ceil(k / 2); each pair is then
+    resolved by meeting in the middle of the two trees, i.e. at the nodes v that
+    minimise dist_s(v) + dist_t(v). Any shortest path of length L <= k has a middle
+    node within ceil(L / 2) of both ends, so this finds the same distances as a full
+    BFS per pair, with T half-depth traversals instead of T^2 full ones.
+
+    With all_paths=True, every shortest path of every pair is included rather than
+    one arbitrary path.
+
+    Returns (node ids, edge ids) lying on the paths, including all targets.
+    """
+    target_ids = sorted(set(target_ids))
+    radius = (k + 1) // 2
+    trees = {target: bfs_tree(index, target, radius) for target in target_ids}
+
+    nodes_on_paths = set(target_ids)
+    edges_on_paths = set()
+    for start_node_id, end_node_id in combinations(target_ids, 2):
+        dist_s, parents_s = trees[start_node_id]
+        dist_t, parents_t = trees[end_node_id]
+        # Scan the smaller tree and probe the larger one
+        small, large = (dist_s, dist_t) if len(dist_s) <= len(dist_t) else (dist_t, dist_s)
+
+        best = None
+        meeting_nodes = []
+        for node, depth in small.items():
+            other_depth = large.get(node)
+            if other_depth is None:
+                continue
+            total = depth + other_depth
+            if total > k:
+                continue
+            if best is None or total < best:
+                best = total
+                meeting_nodes = [node]
+            elif total == best:
+                meeting_nodes.append(node)
+
+        if best is None:
+            continue  # No path of length <= k between this pair
+        if not all_paths:
+            meeting_nodes = meeting_nodes[:1]
+
+        for middle in meeting_nodes:
+            _walk_back(parents_s, middle, nodes_on_paths, edges_on_paths, all_paths)
+            _walk_back(parents_t, middle, nodes_on_paths, edges_on_paths, all_paths)
+
+    return nodes_on_paths, edges_on_paths
+
+def get_connecting_paths_subgraph(graph, target_names, k, all_paths=False, filters=None):
     """
     Identifies shortest paths (up to length k) between all pairs of nodes
     corresponding to target_names. Returns a subgraph containing only the nodes
     and edges lying on these paths. Performs fuzzy matching on names.
+    Set all_paths to include every shortest path per pair instead of just one.
+    With filters, paths only run through matching nodes (see filtered_index).
     """
-    # --- Preprocessing ---
-    # Build adjacency list
-    adj = {node['id']: set() for node in graph['nodes']}
-    for edge in graph['edges']:
-        adj[edge['source']].add(edge['target'])
-        adj[edge['target']].add(edge['source'])
-
-    # Build efficient lookup for edge objects based on pairs of nodes
-    edge_lookup = {}
-    for edge in graph['edges']:
-        key = tuple(sorted((edge['source'], edge['target'])))
-        edge_lookup[key] = edge
+    index = filtered_index(graph, filters)
 
     # Find node IDs for target names, performing fuzzy matching
     target_node_ids = set()
-    # Use precomputed map if available, otherwise create it
-    name_to_id_map = graph.get('name_to_id', {node['data']['name']: node['id'] for node in graph['nodes']})
+    name_to_id_map = index.name_to_node
 
     valid_target_names_found = [] # Store the names corresponding to the found IDs
 
@@ -250,7 +789,7 @@ def get_connecting_paths_subgraph(graph, target_names, k):
 
         # 1. Try exact match first
         exact_node_id = name_to_id_map.get(name)
-        if exact_node_id:
+        if exact_node_id is not None:
             node_id = exact_node_id
             name_that_worked = name
             print(f" - Found exact match for '{name}' -> ID: {node_id}")
@@ -261,7 +800,7 @@ def get_connecting_paths_subgraph(graph, target_names, k):
             # Check if fuzzy search found something different AND it's in the map
             if potential_fuzzy_name != name:
                 fuzzy_node_id = name_to_id_map.get(potential_fuzzy_name)
-                if fuzzy_node_id:
+                if fuzzy_node_id is not None:
                     node_id = fuzzy_node_id
                     name_that_worked = potential_fuzzy_name
                     print(f"   - Found fuzzy match: '{name}' -> '{name_that_worked}' -> ID: {node_id}")
@@ -269,7 +808,7 @@ def get_connecting_paths_subgraph(graph, target_names, k):
                 #    print(f"   - Fuzzy match '{potential_fuzzy_name}' found, but not present in graph nodes.")
 
         # 3. Process the result for this name
-        if node_id:
+        if node_id is not None:
             target_node_ids.add(node_id)
             if name_that_worked not in valid_target_names_found: # Avoid duplicates in the list message
                 valid_target_names_found.append(name_that_worked)
@@ -283,76 +822,18 @@ def get_connecting_paths_subgraph(graph, target_names, k):
     if len(target_node_ids) < 2:
         print("Need at least two valid target nodes to find connecting paths.")
         # Return only the found target nodes, if any, with no edges
-        final_nodes = [node for node in graph['nodes'] if node['id'] in target_node_ids]
-        return {'nodes': final_nodes, 'edges': []}
-
-    # --- Path Finding (BFS for each pair) ---
-    nodes_on_paths = set(target_node_ids) # Start with target nodes
-    edges_on_paths = set() # Store edge IDs (or unique edge keys)
-
-    # Iterate through all unique pairs of target node IDs
-    for start_node_id, end_node_id in combinations(target_node_ids, 2):
-        # Perform BFS from start_node_id to find end_node_id within k steps
-        queue = deque([(start_node_id, [start_node_id])]) # (current_node, path_list)
-        # Visited optimization: Keep track of nodes visited *per BFS pair* and their distance
-        visited_bfs = {start_node_id: 0} # node_id -> distance from start_node_id
-
-        shortest_path_found = None
-
-        while queue:
-            current_id, path = queue.popleft()
-            current_depth = len(path) - 1 # = distance from start_node_id
-
-            # Check if we reached the target
-            if current_id == end_node_id:
-                 # Found a path. Since BFS guarantees shortest path first, store it and break.
-                 shortest_path_found = path
-                 break
-
-            # Stop exploring if path length exceeds k
-            if current_depth >= k:
-                continue
+        return index.subgraph(target_node_ids, [])
 
-            # Explore neighbors
-            for neighbor_id in adj.get(current_id, set()):
-                # Add neighbor only if it's unvisited in this BFS or offers a shorter path (unlikely in basic BFS but good practice)
-                # and the new path length does not exceed k
-                if neighbor_id not in visited_bfs or visited_bfs[neighbor_id] > current_depth + 1:
-                    if current_depth + 1 <= k:
-                        visited_bfs[neighbor_id] = current_depth + 1
-                        new_path = list(path)
-                        new_path.append(neighbor_id)
-                        queue.append((neighbor_id, new_path))
-
-        # If a path was found for this pair, add its nodes and edges
-        if shortest_path_found:
-            # print(f"  - Found path (k={len(shortest_path_found)-1}) between {start_node_id} and {end_node_id}: {' -> '.join(shortest_path_found)}") # Debugging paths
-            nodes_on_paths.update(shortest_path_found)
-            for i in range(len(shortest_path_found) - 1):
-                u, v = shortest_path_found[i], shortest_path_found[i+1]
-                edge_key = tuple(sorted((u, v)))
-                edge_object = edge_lookup.get(edge_key)
-                if edge_object:
-                    # Ensure the edge object has an ID before adding
-                    edge_id = edge_object.get('id')
-                    if not edge_id: # Fallback if somehow ID was missing
-                         edge_id = f"e_{edge_key[0]}_{edge_key[1]}"
-                         edge_object['id'] = edge_id # Assign ID back for consistency
-                    edges_on_paths.add(edge_id)
-                else:
-                     # This indicates an inconsistency between adj list and edge_lookup
-                     print(f"Warning: Edge between {u} and {v} expected from BFS path but not found in edge_lookup.")
+    # --- Path Finding (one half-depth BFS tree per target, shared by all its pairs) ---
+    nodes_on_paths, edges_on_paths = find_connecting_paths(index, target_node_ids, k, all_paths=all_paths)
 
     # --- Construct Final Subgraph ---
-    final_nodes = [node for node in graph['nodes'] if node['id'] in nodes_on_paths]
-    final_edges = [edge for edge in graph['edges'] if edge.get('id') in edges_on_paths] # Use .get() for safety
-
-    return {'nodes': final_nodes, 'edges': final_edges}
+    return index.subgraph(nodes_on_paths, edges_on_paths)
 
 if __name__ == '__main__':
     
     # Example usage of the functions in this module.
-    graph = generate_relationship_graph('cases.json', 'decisions.json', 'individuals.json', 'parties.json')
+    graph = generate_relationship_graph_from_store(DEFAULT_DATASET_PATH)
     
     # Test single name subgraph
     # subgraph = get_subgraph_by_name(graph, 'Egypt', 2)
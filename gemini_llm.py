@@ -1,16 +1,204 @@
+import hashlib
+import json
 import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env file if present
 
-def search(prompt: str) -> str:
-    client = genai.Client(
+SEARCH_MODEL = "gemini-2.0-flash"
+GENERATE_MODEL = "gemini-2.0-flash-thinking-exp-01-21"
+
+# Request configs as plain dicts, so they can be hashed into the cache key
+SEARCH_CONFIG = {"tools": ["google_search"], "response_mime_type": "text/plain"}
+GENERATE_CONFIG = {"response_mime_type": "text/plain"}
+
+POOL_SIZE = 4
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 5
+
+def build_config(config):
+    """Turn a config dict into the SDK's GenerateContentConfig."""
+    tools = [types.Tool(google_search=types.GoogleSearch()) for tool in config.get("tools", []) if tool == "google_search"]
+    return types.GenerateContentConfig(
+        tools=tools or None,
+        response_mime_type=config.get("response_mime_type"),
+    )
+
+def default_client_factory():
+    return genai.Client(
         api_key=os.environ.get("GEMINI_API_KEY"),
     )
 
-    model = "gemini-2.0-flash"
+class ClientPool:
+    """
+    Fixed set of clients shared by all threads, created on first use.
+
+    A caller borrows a client for the duration of one request, so up to `size` requests
+    reuse their clients' connections concurrently instead of building a client per call.
+    """
+
+    def __init__(self, size=POOL_SIZE, factory=default_client_factory):
+        self.size = size
+        self.factory = factory
+        self.idle = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def client(self):
+        while True:
+            try:
+                client = self.idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    client = self.factory()
+                except BaseException:
+                    with self.lock:
+                        self.created -= 1  # Give the slot back so a later caller can retry
+                    raise
+                break
+            try:
+                # Wake up now and then: a slot freed by a failed factory() puts no client back
+                client = self.idle.get(timeout=1.0)
+                break
+            except queue.Empty:
+                pass
+        try:
+            yield client
+        finally:
+            self.idle.put(client)
+
+class ResponseCache:
+    """
+    Persistent cache of model responses in a SQLite file.
+
+    Keyed by the sha256 of (model, prompt, config). Entries older than `ttl` seconds are
+    ignored, and once more than `max_entries` are stored the least recently used ones
+    are evicted.
+    """
+
+    def __init__(self, path='gemini_cache.sqlite', ttl=30 * 86400, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                text TEXT NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        self.db.commit()
+
+    @staticmethod
+    def key(model, prompt, config):
+        payload = json.dumps([model, prompt, config], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT created_at, text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[0] >= self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self.db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.stats["hits"] += 1
+            return row[1]
+
+    def put(self, key, model, text):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created_at, used_at, text) VALUES (?, ?, ?, ?, ?)",
+                (key, model, now, now, text)
+            )
+            self.db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+            count = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+_POOL = None
+_CACHE = None
+_SHARED_LOCK = threading.Lock()
+
+def get_pool():
+    """The process-wide ClientPool."""
+    global _POOL
+    if _POOL is None:
+        with _SHARED_LOCK:
+            if _POOL is None:
+                _POOL = ClientPool()
+    return _POOL
+
+def set_client_factory(factory, size=POOL_SIZE):
+    """Replace the client pool, e.g. with a factory returning a fake client for local tests."""
+    global _POOL
+    _POOL = ClientPool(size, factory)
+
+def get_cache():
+    """
+    The process-wide response cache. GEMINI_CACHE sets its path (default gemini_cache.sqlite);
+    an empty value disables caching and None is returned.
+    """
+    global _CACHE
+    path = os.environ.get("GEMINI_CACHE", "gemini_cache.sqlite")
+    if not path:
+        return None
+    if _CACHE is None:
+        with _SHARED_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache(path)
+    return _CACHE
+
+def is_retryable(error):
+    """Quota exhaustion (429) and transient server errors are worth retrying."""
+    return isinstance(error, errors.APIError) and (error.code == 429 or error.code >= 500)
+
+def complete(prompt, model, config, max_retries=MAX_RETRIES, backoff=2.0, max_backoff=60.0):
+    """
+    Run one prompt through the model, serving repeated (model, prompt, config) from the
+    response cache and retrying with exponential backoff when the quota is exhausted.
+    """
+    cache = get_cache()
+    key = ResponseCache.key(model, prompt, config)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     contents = [
         types.Content(
             role="user",
@@ -19,43 +207,56 @@ def search(prompt: str) -> str:
             ],
         ),
     ]
-    tools = [
-        types.Tool(google_search=types.GoogleSearch())
-    ]
-    generate_content_config = types.GenerateContentConfig(
-        tools=tools,
-        response_mime_type="text/plain",
-    )
+    for attempt in range(max_retries + 1):
+        try:
+            with get_pool().client() as client:
+                text = client.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=build_config(config),
+                ).candidates[0].content.parts[0].text
+            break
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Gemini request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
 
-    return client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ).candidates[0].content.parts[0].text
+    if cache is not None and text is not None:
+        cache.put(key, model, text)
+    return text
+
+def complete_many(prompts, model, config, max_concurrency=MAX_CONCURRENCY):
+    """
+    Run many prompts with at most max_concurrency requests in flight. Returns the
+    responses in prompt order; a prompt that fails after its retries gives None.
+    """
+    def run(prompt):
+        try:
+            return complete(prompt, model, config)
+        except Exception as e:
+            print(f"Gemini request failed for prompt {prompt[:60]!r}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return list(executor.map(run, prompts))
+
+def search(prompt: str) -> str:
+    """Answer a prompt with Google Search grounding."""
+    return complete(prompt, SEARCH_MODEL, SEARCH_CONFIG)
 
 def generate(prompt: str):
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+    """Answer a prompt with the thinking model, without grounding."""
+    return complete(prompt, GENERATE_MODEL, GENERATE_CONFIG)
 
-    model = "gemini-2.0-flash-thinking-exp-01-21"
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt),
-            ],
-        ),
-    ]
-    generate_content_config = types.GenerateContentConfig(
-        response_mime_type="text/plain",
-    )
+def search_many(prompts, max_concurrency=MAX_CONCURRENCY):
+    """Batch variant of search."""
+    return complete_many(prompts, SEARCH_MODEL, SEARCH_CONFIG, max_concurrency)
 
-    return client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ).candidates[0].content.parts[0].text
+def generate_many(prompts, max_concurrency=MAX_CONCURRENCY):
+    """Batch variant of generate."""
+    return complete_many(prompts, GENERATE_MODEL, GENERATE_CONFIG, max_concurrency)
 
 if __name__ == "__main__":
     print(search("Who is Hüseyin Avni Kiper?"))
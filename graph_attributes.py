@@ -0,0 +1,231 @@
+import numpy as np
+
+from graph_index import Csr, RELATIONSHIP_TYPES, SUPPORT_KINDS
+
+# Node attributes kept as columns: individuals have role, nationality and firm, parties
+# role and nationality; 'type' is the node type shown in the graph (person, state, ...)
+NODE_ATTRIBUTES = ('type', 'role', 'nationality', 'firm')
+CASE_ATTRIBUTES = ('institution', 'outcome')
+DATE_FILTERS = ('date_from', 'date_to')
+
+def date_number(value):
+    """'2015-03-01...' / '2015-03' / '2015' -> 20150301 / 20150300 / 20150000, or 0 if unknown."""
+    if not value:
+        return 0
+    digits = str(value)[:10].replace('-', '')
+    if not digits.isdigit() or len(digits) not in (4, 6, 8):
+        return 0
+    return int(digits.ljust(8, '0'))
+
+def date_upper_bound(value):
+    """Last YYYYMMDD covered by a possibly partial date: '2020' -> 20209999, '2020-03' -> 20200399."""
+    digits = len(str(value)[:10].replace('-', ''))
+    return date_number(value) + {4: 9999, 6: 99}.get(digits, 0)
+
+def validate_filters(filters):
+    """
+    Check a filters dict before it reaches the columns: only NODE_ATTRIBUTES, CASE_ATTRIBUTES
+    and DATE_FILTERS keys, each with a string or a list of strings, and dates that date_number
+    can read. Raises ValueError naming the offending filter.
+    """
+    for name, value in filters.items():
+        if name not in NODE_ATTRIBUTES + CASE_ATTRIBUTES + DATE_FILTERS:
+            raise ValueError(f"Unknown filter {name!r}")
+        if name in DATE_FILTERS:
+            if not (isinstance(value, str) and _valid_date(value)):
+                raise ValueError(f"Filter {name!r} must be a date (YYYY, YYYY-MM or YYYY-MM-DD)")
+        elif not (isinstance(value, str)
+                  or (isinstance(value, list) and all(isinstance(item, str) for item in value))):
+            raise ValueError(f"Filter {name!r} must be a string or a list of strings")
+
+def _valid_date(value):
+    number = date_number(value)
+    if not number or len(value) not in (4, 7, 10):
+        return False
+    month, day = number // 100 % 100, number % 100
+    return month <= 12 and day <= 31 and (len(value) == 4 or month >= 1) and (len(value) < 10 or day >= 1)
+
+class Column:
+    """
+    One categorical attribute stored as an int32 code per row plus the distinct values,
+    with an inverted index (value -> sorted row ids) kept in CSR form.
+    """
+
+    def __init__(self, codes, values, rows=None):
+        self.codes = codes
+        self.values = list(values)
+        self._lookup = {}
+        for code, value in enumerate(self.values):
+            self._lookup.setdefault(str(value).casefold(), []).append(code)
+        if rows is None:
+            known = codes >= 0
+            rows = Csr(len(self.values), codes[known], np.flatnonzero(known))
+        self.rows = rows
+
+    @classmethod
+    def from_values(cls, values):
+        distinct = {}
+        codes = np.array([-1 if value is None else distinct.setdefault(value, len(distinct)) for value in values],
+                         dtype=np.int32)
+        return cls(codes, distinct)
+
+    def row_ids(self, value):
+        """Rows with this value (case-insensitive), as a sorted array."""
+        codes = self._lookup.get(str(value).casefold(), [])
+        return np.concatenate([self.rows.indices[self.rows.indptr[c]:self.rows.indptr[c + 1]] for c in codes]
+                              or [np.zeros(0, dtype=np.int32)])
+
+    def mask(self, values):
+        """Boolean array over rows: True where the attribute is any of `values` (a list or a single value)."""
+        if isinstance(values, str):
+            values = [values]
+        mask = np.zeros(len(self.codes), dtype=bool)
+        for value in values:
+            mask[self.row_ids(value)] = True
+        return mask
+
+class GraphAttributes:
+    """
+    Columnar node and case attributes of a relationship graph.
+
+    Nodes get one Column per NODE_ATTRIBUTES; cases (by position) a Column per
+    CASE_ATTRIBUTES and their commencement dates as YYYYMMDD ints. decision_cases holds
+    the case position of every decision (-1 if unknown), so edges supported by decisions
+    can be checked against case filters.
+    """
+
+    def __init__(self, node_columns, case_columns, case_dates, decision_cases):
+        self.node_columns = node_columns
+        self.case_columns = case_columns
+        self.case_dates = case_dates
+        self.decision_cases = decision_cases
+
+    @classmethod
+    def build(cls, nodes, node_map, cases, decisions, individuals, parties):
+        """Collect the attributes of the records generate_relationship_graph turned into nodes."""
+        case_positions = {case_id: i for i, case_id in enumerate(cases)}
+        columns = {name: [None] * len(nodes) for name in NODE_ATTRIBUTES}
+        for i, node in enumerate(nodes):
+            columns['type'][i] = node['data']['type']
+        for kind, records, fields in (('individual', individuals, ('role', 'nationality', 'firm')),
+                                      ('party', parties, ('role', 'nationality'))):
+            for record_id, record in records.items():
+                node_id = node_map.get(f"{kind}_{record_id}")
+                if node_id is None:
+                    continue
+                for field in fields:
+                    columns[field][node_id] = record.get(field)
+
+        return cls(
+            {name: Column.from_values(values) for name, values in columns.items()},
+            {
+                'institution': Column.from_values([case.get("arbitral_institution") for case in cases.values()]),
+                'outcome': Column.from_values([case.get("outcome") for case in cases.values()]),
+            },
+            np.array([date_number(case.get("commencement_date")) for case in cases.values()], dtype=np.int32),
+            np.array([case_positions.get(decision.get("case_id"), -1) for decision in decisions.values()],
+                     dtype=np.int32),
+        )
+
+    # --- Persistence (used by graph_snapshot) ---
+
+    def save(self, directory, save):
+        """Write the arrays with save(directory, name, array); returns the value lists for meta.json."""
+        values = {}
+        for prefix, columns in (('node', self.node_columns), ('case', self.case_columns)):
+            for name, column in columns.items():
+                save(directory, f"attr_{prefix}_{name}", column.codes)
+                save(directory, f"attr_{prefix}_{name}_indptr", column.rows.indptr)
+                save(directory, f"attr_{prefix}_{name}_indices", column.rows.indices)
+                values[f"{prefix}_{name}"] = column.values
+        save(directory, 'attr_case_dates', self.case_dates)
+        save(directory, 'attr_decision_cases', self.decision_cases)
+        return values
+
+    @classmethod
+    def load(cls, directory, load, values):
+        """Inverse of save: load(directory, name) returns an array, values is what save returned."""
+        def column(prefix, name):
+            rows = Csr.from_arrays(load(directory, f"attr_{prefix}_{name}_indptr"),
+                                   load(directory, f"attr_{prefix}_{name}_indices"))
+            return Column(load(directory, f"attr_{prefix}_{name}"), values[f"{prefix}_{name}"], rows)
+        return cls(
+            {name: column('node', name) for name in NODE_ATTRIBUTES},
+            {name: column('case', name) for name in CASE_ATTRIBUTES},
+            load(directory, 'attr_case_dates'),
+            load(directory, 'attr_decision_cases'),
+        )
+
+    # --- Filters ---
+
+    def node_mask(self, filters):
+        """Nodes matching every node attribute filter (value lists), or None if there are none."""
+        mask = None
+        for name in NODE_ATTRIBUTES:
+            if filters.get(name):
+                column_mask = self.node_columns[name].mask(filters[name])
+                mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def case_mask(self, filters):
+        """Cases matching the institution / outcome / date_from / date_to filters, or None if there are none."""
+        mask = None
+        for name in CASE_ATTRIBUTES:
+            if filters.get(name):
+                column_mask = self.case_columns[name].mask(filters[name])
+                mask = column_mask if mask is None else mask & column_mask
+        if filters.get('date_from') or filters.get('date_to'):
+            dates = np.asarray(self.case_dates)
+            date_mask = dates > 0
+            if filters.get('date_from'):
+                date_mask &= dates >= date_number(filters['date_from'])
+            if filters.get('date_to'):
+                date_mask &= dates <= date_upper_bound(filters['date_to'])
+            mask = date_mask if mask is None else mask & date_mask
+        return mask
+
+class FilteredIndex:
+    """
+    A graph index whose neighbors() only returns neighbors that pass the filters, so the
+    existing traversals prune while they expand instead of filtering afterwards.
+
+    A neighbor is kept if it matches the node filters and, when there are case filters,
+    the edge to it rests on at least one matching case: one of its supporting cases, or
+    the case of one of its supporting decisions. Everything else is delegated to the
+    wrapped index.
+    """
+
+    def __init__(self, index, attributes, filters):
+        self.index = index
+        self.attributes = attributes
+        self.allowed_nodes = attributes.node_mask(filters)
+        self.allowed_cases = attributes.case_mask(filters)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _allowed_edge(self, edge_id):
+        relationship, positions = self.index.support(edge_id)
+        positions = np.asarray(positions, dtype=np.int64)
+        if SUPPORT_KINDS[RELATIONSHIP_TYPES.index(relationship)] == 'decision':
+            positions = np.asarray(self.attributes.decision_cases)[positions]
+            positions = positions[positions >= 0]
+        return bool(self.allowed_cases[positions].any())
+
+    def neighbors(self, u):
+        neighbors, edge_ids = self.index.neighbors(u)
+        if self.allowed_nodes is not None:
+            kept = [i for i, v in enumerate(neighbors) if self.allowed_nodes[v]]
+            neighbors = [neighbors[i] for i in kept]
+            edge_ids = [edge_ids[i] for i in kept]
+        if self.allowed_cases is not None:
+            kept = [i for i, edge_id in enumerate(edge_ids) if self._allowed_edge(edge_id)]
+            neighbors = [neighbors[i] for i in kept]
+            edge_ids = [edge_ids[i] for i in kept]
+        return neighbors, edge_ids
+
+    def degree(self, u):
+        return len(self.neighbors(u)[0])
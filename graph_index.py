@@ -0,0 +1,554 @@
+import hashlib
+
+import numpy as np
+
+def build_csr(num_rows, rows, cols):
+    """
+    Group cols by rows into CSR arrays (indptr, indices, order). `order` maps each CSR slot
+    back to its position in the input, so parallel arrays can be permuted the same way.
+    """
+    rows = np.asarray(rows, dtype=np.int32)
+    cols = np.asarray(cols, dtype=np.int32)
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return indptr, cols[order], order
+
+def compute_centrality(num_nodes, source, target, damping=0.85, tol=1e-9, max_iter=100):
+    """
+    Degree and PageRank of every node of an undirected graph given as edge arrays.
+
+    PageRank is computed by power iteration over the edge list: each step scatters
+    rank / degree along both directions of every edge with one bincount. Rank held by
+    isolated nodes is spread uniformly.
+    Returns (degree int32 array, pagerank float64 array summing to 1).
+    """
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    tails = np.concatenate([source, target])
+    heads = np.concatenate([target, source])
+    degree = np.bincount(tails, minlength=num_nodes).astype(np.int32)
+    if num_nodes == 0:
+        return degree, np.zeros(0)
+
+    isolated = degree == 0
+    divisor = np.where(isolated, 1, degree)
+    rank = np.full(num_nodes, 1.0 / num_nodes)
+    for _ in range(max_iter):
+        share = rank / divisor
+        spread = np.bincount(heads, weights=share[tails], minlength=num_nodes)
+        new_rank = (1.0 - damping) / num_nodes + damping * (spread + rank[isolated].sum() / num_nodes)
+        converged = np.abs(new_rank - rank).sum() < tol
+        rank = new_rank
+        if converged:
+            break
+    return degree, rank
+
+# Relationship type of an edge, given by the kinds of its two nodes, and what supports it:
+# parties share cases, individuals share decisions, an individual sits on a decision of a party's case
+RELATIONSHIP_TYPES = ('party-party', 'individual-individual', 'individual-party')
+SUPPORT_KINDS = ('case', 'decision', 'decision')
+
+def group_pairs(groups, members):
+    """
+    Every pair of members of the same group, as (first, second, group) arrays.
+    Rows keep their order within a group and each row is paired with the later ones,
+    like the nested i < j loops this replaces.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    members = np.asarray(members, dtype=np.int64)
+    order = np.argsort(groups, kind='stable')
+    groups = groups[order]
+    members = members[order]
+    num_rows = len(groups)
+    # Row i is paired with rows i + 1 .. end of its group - 1
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(groups)) + 1, [num_rows]])
+    ends = np.repeat(bounds[1:], np.diff(bounds))
+    counts = ends - np.arange(num_rows) - 1
+    first = np.repeat(np.arange(num_rows), counts)
+    second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return members[first], members[second], groups[first]
+
+def join_pairs(groups, members, csr):
+    """
+    (member, other, row) for every member and every entry of csr's row for its group;
+    `row` is the member's position in the input.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    members = np.asarray(members, dtype=np.int64)
+    starts = np.asarray(csr.indptr)[groups]
+    counts = np.asarray(csr.indptr)[groups + 1] - starts
+    rows = np.repeat(np.arange(len(groups)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    others = np.asarray(csr.indices)[np.repeat(starts, counts) + offsets].astype(np.int64)
+    return members[rows], others, rows
+
+def aggregate_edges(num_nodes, source, target, types, support):
+    """
+    Collapse co-occurrences (one per shared case or decision, possibly repeated) into
+    undirected edges with one sort over their integer keys.
+
+    Returns (source, target, weight, type, support Csr): edges in order of first
+    occurrence with source <= target, weight the number of distinct supporting ids,
+    type the code of the first co-occurrence, and the sorted supporting ids per edge.
+    """
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    support = np.asarray(support, dtype=np.int64)
+    low = np.minimum(source, target)
+    high = np.maximum(source, target)
+    keys = low * num_nodes + high
+    positions = np.arange(len(keys))
+    order = np.lexsort((positions, support, keys))
+    sorted_keys = keys[order]
+    sorted_support = support[order]
+
+    new_edge = np.ones(len(order), dtype=bool)
+    new_edge[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    new_support = new_edge.copy()
+    new_support[1:] |= sorted_support[1:] != sorted_support[:-1]
+
+    # Number edges by the position of their first co-occurrence
+    edge_starts = np.flatnonzero(new_edge)
+    first_seen = np.minimum.reduceat(order, edge_starts) if len(order) else order
+    rank = np.empty(len(edge_starts), dtype=np.int64)
+    rank[np.argsort(first_seen, kind='stable')] = np.arange(len(edge_starts))
+    edge_of = rank[np.cumsum(new_edge) - 1]
+
+    num_edges = len(edge_starts)
+    by_rank = np.empty(num_edges, dtype=np.int64)
+    by_rank[rank] = first_seen
+    weight = np.bincount(edge_of[new_support], minlength=num_edges).astype(np.int32)
+    return (low[by_rank].astype(np.int32), high[by_rank].astype(np.int32), weight,
+            np.asarray(types, dtype=np.uint8)[by_rank],
+            Csr(num_edges, edge_of[new_support], sorted_support[new_support]))
+
+def co_occurrence_edges(num_nodes, case_rows, case_members, decision_rows, decision_members, decision_cases,
+                        case_parties):
+    """
+    Weighted, typed edges (as returned by aggregate_edges) from memberships: (case, party node)
+    rows, (decision, individual node) rows, the case of each decision (-1 if unknown) and
+    case_parties, the case -> party nodes Csr.
+    """
+    case_rows = np.asarray(case_rows, dtype=np.int64)
+    decision_rows = np.asarray(decision_rows, dtype=np.int64)
+    decision_members = np.asarray(decision_members, dtype=np.int64)
+    decision_cases = np.asarray(decision_cases, dtype=np.int64)
+
+    # 1. Party ↔ Party via Case (entity A -> case_id -> entity B)
+    party_a, party_b, party_cases = group_pairs(case_rows, case_members)
+    # 2. Individual ↔ Individual via Decision (entity A -> decision_id -> entity B)
+    individual_a, individual_b, individual_decisions = group_pairs(decision_rows, decision_members)
+    # 3 & 4. Party ↔ Individual via Case–Decision Chain: each individual of a decision
+    # with each party of the decision's case
+    member_cases = decision_cases[decision_rows]
+    linked = member_cases >= 0
+    chain_individuals, chain_parties, rows = join_pairs(member_cases[linked], decision_members[linked], case_parties)
+    chain_decisions = decision_rows[linked][rows]
+
+    return aggregate_edges(
+        num_nodes,
+        np.concatenate([party_a, individual_a, chain_individuals]),
+        np.concatenate([party_b, individual_b, chain_parties]),
+        np.repeat([0, 1, 2], [len(party_a), len(individual_a), len(chain_individuals)]),
+        np.concatenate([party_cases, individual_decisions, chain_decisions]),
+    )
+
+def edge_dict(source, target, weight=None, relationship=None):
+    """An edge in the format the graph endpoints return."""
+    edge = {'source': str(source), 'target': str(target), 'id': f"{source}_{target}"}
+    if weight is not None:
+        edge['data'] = {'weight': weight, 'relationship': relationship}
+    return edge
+
+class Csr:
+    """Read-only row -> list of ints mapping stored as CSR arrays."""
+
+    def __init__(self, num_rows, rows, cols):
+        self.indptr, self.indices, _ = build_csr(num_rows, rows, cols)
+        self.indptr.flags.writeable = False
+        self.indices.flags.writeable = False
+
+    @classmethod
+    def from_arrays(cls, indptr, indices):
+        """Wrap existing (e.g. memory-mapped) CSR arrays without copying them."""
+        csr = cls.__new__(cls)
+        csr.indptr = indptr
+        csr.indices = indices
+        return csr
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+    def rows(self):
+        """Row of every entry, aligned with indices."""
+        return np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+
+class EdgeTable:
+    """
+    Read-only sequence of edge dicts backed by parallel source/target (and optionally
+    weight/type) arrays. Edge dicts are created on access, in the format of edge_dict.
+    """
+
+    def __init__(self, source, target, weight=None, types=None):
+        self.source = source
+        self.target = target
+        self.weight = weight
+        self.types = types
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, e):
+        if self.weight is None:
+            return edge_dict(int(self.source[e]), int(self.target[e]))
+        return edge_dict(int(self.source[e]), int(self.target[e]), int(self.weight[e]),
+                         RELATIONSHIP_TYPES[self.types[e]])
+
+    def __iter__(self):
+        if self.weight is None:
+            for source, target in zip(self.source.tolist(), self.target.tolist()):
+                yield edge_dict(source, target)
+            return
+        for source, target, weight, code in zip(self.source.tolist(), self.target.tolist(),
+                                                self.weight.tolist(), self.types.tolist()):
+            yield edge_dict(source, target, weight, RELATIONSHIP_TYPES[code])
+
+def name_hash(name):
+    """64-bit hash of a node name, for NameLookup."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class StringTable:
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offsets array; decoded on access."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class NodeTable:
+    """
+    Read-only sequence of node dicts backed by a StringTable of names and an array of
+    type codes. Node dicts are created on access, in the format generate_relationship_graph uses.
+    """
+
+    def __init__(self, names, type_codes, types):
+        self.names = names
+        self.type_codes = type_codes
+        self.types = types
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return {'id': str(i), 'type': 'profileNode',
+                'data': {'name': self.names[i], 'type': self.types[self.type_codes[i]]}}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class NameLookup:
+    """
+    name -> first node id with that name, from name hashes sorted once (hashes, node ids
+    in that order); a drop-in for the name_to_node dict that can stay memory-mapped.
+    """
+
+    def __init__(self, names, hashes, order):
+        self.names = names
+        self.hashes = hashes
+        self.order = order
+
+    @staticmethod
+    def build(names):
+        """(sorted hashes, node ids) arrays for names; equal hashes keep node order."""
+        hashes = np.fromiter((name_hash(name) for name in names), dtype=np.uint64, count=len(names))
+        order = np.argsort(hashes, kind='stable').astype(np.int32)
+        return hashes[order], order
+
+    def get(self, name, default=None):
+        if name is None:
+            return default  # e.g. a fuzzy search that matched nothing, like dict.get(None)
+        key = np.uint64(name_hash(name))
+        start = np.searchsorted(self.hashes, key, side='left')
+        end = np.searchsorted(self.hashes, key, side='right')
+        for node_id in self.order[start:end].tolist():
+            if self.names[node_id] == name:
+                return node_id
+        return default
+
+def _index_nodes(index, nodes, name_lookup=None):
+    """
+    Set the nodes and the id/name lookups shared by both index types. A NodeTable with a
+    NameLookup is used as is, so a memory-mapped snapshot needs no per-node Python objects.
+    """
+    if name_lookup is not None:
+        index.nodes = nodes
+        index.name_to_node = name_lookup
+        return
+    index.nodes = tuple(nodes)
+    index.id_to_int = {}   # node['id'] -> integer node id
+    index.id_to_node = {}  # node['id'] -> node dict
+    index.name_to_node = {}  # name -> integer node id (first node with that name)
+    for i, node in enumerate(index.nodes):
+        index.id_to_int[node['id']] = i
+        index.id_to_node[node['id']] = node
+        index.name_to_node.setdefault(node['data']['name'], i)
+
+class GraphIndex:
+    """
+    Compact, read-only index over a relationship graph ({'nodes': [...], 'edges': [...]}).
+
+    Nodes are addressed by their integer position in graph['nodes']. Adjacency is
+    stored in CSR form: the neighbors of node u are indices[indptr[u]:indptr[u + 1]],
+    and edge_ids holds, for each of those slots, the position of the edge in graph['edges'].
+    Building the index is O(V + E) and happens once per graph; every traversal reuses it.
+
+    Graphs built by generate_relationship_graph also carry, per edge, its weight, its
+    relationship type and the cases / decisions supporting it (see aggregate_edges).
+    """
+
+    def __init__(self, nodes, edges):
+        _index_nodes(self, nodes)
+        self.edges = tuple(edges)
+        self.edge_weight = self.edge_type = self.edge_support = None
+
+        num_nodes = len(self.nodes)
+        num_edges = len(self.edges)
+        source = np.fromiter((self.id_to_int[edge['source']] for edge in self.edges), dtype=np.int32, count=num_edges)
+        target = np.fromiter((self.id_to_int[edge['target']] for edge in self.edges), dtype=np.int32, count=num_edges)
+        source.flags.writeable = False
+        target.flags.writeable = False
+        self.edge_source = source
+        self.edge_target = target
+        self.indptr, self.indices, self.edge_ids = self._build_csr(num_nodes, source, target)
+
+    @classmethod
+    def from_edge_arrays(cls, nodes, edge_source, edge_target, edge_weight, edge_type, edge_support):
+        """Build an index over edges given as arrays (as returned by aggregate_edges)."""
+        for array in (edge_source, edge_target, edge_weight, edge_type):
+            array.flags.writeable = False
+        indptr, indices, edge_ids = cls._build_csr(len(nodes), edge_source, edge_target)
+        return cls.from_arrays(nodes, edge_source, edge_target, indptr, indices, edge_ids,
+                               edge_weight, edge_type, edge_support)
+
+    @classmethod
+    def from_arrays(cls, nodes, edge_source, edge_target, indptr, indices, edge_ids,
+                    edge_weight=None, edge_type=None, edge_support=None, name_lookup=None):
+        """
+        Rebuild an index from previously built arrays (e.g. a memory-mapped snapshot)
+        without recomputing the CSR. Edge dicts are created lazily from the edge arrays.
+        """
+        index = cls.__new__(cls)
+        _index_nodes(index, nodes, name_lookup)
+        index.edges = EdgeTable(edge_source, edge_target, edge_weight, edge_type)
+        index.edge_source = edge_source
+        index.edge_target = edge_target
+        index.indptr = indptr
+        index.indices = indices
+        index.edge_ids = edge_ids
+        index.edge_weight = edge_weight
+        index.edge_type = edge_type
+        index.edge_support = edge_support
+        return index
+
+    @staticmethod
+    def _build_csr(num_nodes, source, target):
+        # Store every undirected edge in both directions
+        edge_range = np.arange(len(source), dtype=np.int32)
+        rows = np.concatenate([source, target])
+        cols = np.concatenate([target, source])
+        indptr, indices, order = build_csr(num_nodes, rows, cols)
+        edge_ids = np.concatenate([edge_range, edge_range])[order]
+
+        for array in (indptr, indices, edge_ids):
+            array.flags.writeable = False
+        return indptr, indices, edge_ids
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def degree(self, u):
+        return int(self.indptr[u + 1] - self.indptr[u])
+
+    def neighbors(self, u):
+        """Return (neighbor ids, edge ids) of node u as Python lists."""
+        start, end = self.indptr[u], self.indptr[u + 1]
+        return self.indices[start:end].tolist(), self.edge_ids[start:end].tolist()
+
+    def find(self, name):
+        """Return the integer id of the first node with this exact name, or None."""
+        return self.name_to_node.get(name)
+
+    def edge(self, edge_id):
+        """The edge dict for an edge id."""
+        return self.edges[edge_id]
+
+    def weight(self, edge_id):
+        """Number of cases / decisions behind the edge (1 for graphs without weights)."""
+        return 1 if self.edge_weight is None else int(self.edge_weight[edge_id])
+
+    def support(self, edge_id):
+        """(relationship type, sorted case or decision positions supporting the edge), or None."""
+        if self.edge_support is None:
+            return None
+        return RELATIONSHIP_TYPES[self.edge_type[edge_id]], self.edge_support.row(edge_id)
+
+    def subgraph(self, node_ids, edge_ids):
+        """Assemble a {'nodes', 'edges'} dict in graph order from integer node and edge ids."""
+        return {
+            'nodes': [self.nodes[i] for i in sorted(node_ids)],
+            'edges': [self.edges[e] for e in sorted(edge_ids)],
+        }
+
+class BipartiteGraphIndex:
+    """
+    Clique-free alternative to GraphIndex.
+
+    Instead of materializing an edge for every pair of co-members, only membership is
+    stored: party -> case, individual -> decision and decision -> case. The pairwise
+    relationships of the classic graph (party-party via a case, individual-individual
+    via a decision, individual-party via the decision's case) are derived on the fly
+    in neighbors(), and edge dicts are only created for the subgraphs that are returned.
+
+    Exposes the same interface as GraphIndex, so the traversal functions work on either.
+    Edge ids are the integer encoding min(u, v) * num_nodes + max(u, v). Weights, types and
+    supporting cases / decisions are likewise derived per edge from the memberships.
+    """
+
+    def __init__(self, nodes, case_parties, decision_individuals, decision_cases, num_cases):
+        """
+        nodes: node dicts, addressed by position
+        case_parties: (case index, party node id) membership pairs
+        decision_individuals: (decision index, individual node id) membership pairs
+        decision_cases: case index of each decision, or -1 if its case is unknown
+        num_cases: number of cases
+        """
+        _index_nodes(self, nodes)
+
+        num_nodes = len(self.nodes)
+        num_decisions = len(decision_cases)
+        case_rows, party_cols = _pairs_to_arrays(case_parties)
+        decision_rows, individual_cols = _pairs_to_arrays(decision_individuals)
+        self.decision_cases = np.asarray(decision_cases, dtype=np.int32)
+        self.decision_cases.flags.writeable = False
+        linked = np.flatnonzero(self.decision_cases >= 0)
+
+        self.case_parties = Csr(num_cases, case_rows, party_cols)
+        self.party_cases = Csr(num_nodes, party_cols, case_rows)
+        self.decision_individuals = Csr(num_decisions, decision_rows, individual_cols)
+        self.individual_decisions = Csr(num_nodes, individual_cols, decision_rows)
+        self.case_decisions = Csr(num_cases, self.decision_cases[linked], linked)
+
+    # Membership tables, in the order they are stored in snapshots
+    CSR_TABLES = ('case_parties', 'party_cases', 'decision_individuals', 'individual_decisions', 'case_decisions')
+
+    @classmethod
+    def from_arrays(cls, nodes, decision_cases, tables, name_lookup=None):
+        """
+        Rebuild an index from previously built arrays (e.g. a memory-mapped snapshot).
+        `tables` maps each name in CSR_TABLES to its (indptr, indices) arrays.
+        """
+        index = cls.__new__(cls)
+        _index_nodes(index, nodes, name_lookup)
+        index.decision_cases = decision_cases
+        for name in cls.CSR_TABLES:
+            setattr(index, name, Csr.from_arrays(*tables[name]))
+        return index
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def degree(self, u):
+        return len(self._neighbor_set(u))
+
+    def _neighbor_set(self, u):
+        found = set()
+        # Party: co-parties of each case, and the individuals of that case's decisions
+        for case in self.party_cases.row(u):
+            found.update(self.case_parties.row(case))
+            for decision in self.case_decisions.row(case):
+                found.update(self.decision_individuals.row(decision))
+        # Individual: co-individuals of each decision, and the parties of its case
+        for decision in self.individual_decisions.row(u):
+            found.update(self.decision_individuals.row(decision))
+            case = int(self.decision_cases[decision])
+            if case >= 0:
+                found.update(self.case_parties.row(case))
+        found.discard(u)
+        return found
+
+    def neighbors(self, u):
+        """Return (neighbor ids, edge ids) of node u as Python lists."""
+        neighbors = sorted(self._neighbor_set(u))
+        num_nodes = len(self.nodes)
+        edge_ids = [min(u, v) * num_nodes + max(u, v) for v in neighbors]
+        return neighbors, edge_ids
+
+    def find(self, name):
+        """Return the integer id of the first node with this exact name, or None."""
+        return self.name_to_node.get(name)
+
+    def edge(self, edge_id):
+        """Materialize the edge dict for an edge id."""
+        source, target = divmod(edge_id, len(self.nodes))
+        relationship, support = self.support(edge_id)
+        return edge_dict(source, target, len(support), relationship)
+
+    def weight(self, edge_id):
+        """Number of cases / decisions behind the edge."""
+        return len(self.support(edge_id)[1])
+
+    def support(self, edge_id):
+        """(relationship type, sorted case or decision positions supporting the edge)."""
+        u, v = divmod(edge_id, len(self.nodes))
+        u_decisions = self.individual_decisions.row(u)
+        v_decisions = self.individual_decisions.row(v)
+        if u_decisions and v_decisions:
+            return 'individual-individual', sorted(set(u_decisions) & set(v_decisions))
+        if not u_decisions and not v_decisions:
+            return 'party-party', sorted(set(self.party_cases.row(u)) & set(self.party_cases.row(v)))
+        decisions, party = (u_decisions, v) if u_decisions else (v_decisions, u)
+        cases = set(self.party_cases.row(party))
+        return 'individual-party', sorted({d for d in decisions if int(self.decision_cases[d]) in cases})
+
+    def edge_arrays(self):
+        """
+        (source, target, weight) of every pairwise edge with source < target, derived from the
+        memberships in one vectorized pass. For whole-graph work (centrality, history, deltas).
+        """
+        source, target, weight, _, _ = co_occurrence_edges(
+            len(self.nodes), self.case_parties.rows(), self.case_parties.indices,
+            self.decision_individuals.rows(), self.decision_individuals.indices, self.decision_cases,
+            self.case_parties)
+        distinct = source != target  # A member listed twice is not its own neighbor here
+        return source[distinct], target[distinct], weight[distinct]
+
+    def iter_edges(self):
+        """Materialize every pairwise edge, once each. Only needed for full-graph exports."""
+        for u in range(len(self.nodes)):
+            for v in sorted(self._neighbor_set(u)):
+                if u < v:
+                    yield self.edge(u * len(self.nodes) + v)
+
+    def subgraph(self, node_ids, edge_ids):
+        """Assemble a {'nodes', 'edges'} dict in graph order from integer node and edge ids."""
+        return {
+            'nodes': [self.nodes[i] for i in sorted(node_ids)],
+            'edges': [self.edge(e) for e in sorted(edge_ids)],
+        }
+
+def _pairs_to_arrays(pairs):
+    if not pairs:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    array = np.asarray(pairs, dtype=np.int32)
+    return array[:, 0], array[:, 1]
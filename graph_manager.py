@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+from dataset_store import DEFAULT_DATASET_PATH
+from graph_snapshot import DEFAULT_SNAPSHOT_DIR, load_or_build_graph, read_meta, snapshot_is_current
+
+class GraphManager:
+    """
+    Holds the graph a server answers from and replaces it without downtime.
+
+    reload() loads (or rebuilds, if the dataset changed) the snapshot on a background
+    thread and, once the new graph is ready, swaps it in with a single reference
+    assignment. Requests read manager.graph once and keep using that object, so
+    in-flight requests finish on the version they started with.
+
+    prepare(graph) runs on every new graph before it is swapped in (e.g. to attach a
+    name index), and the on_swap callbacks run right after (e.g. to reset caches).
+    """
+
+    def __init__(self, dataset_path=DEFAULT_DATASET_PATH, snapshot_dir=DEFAULT_SNAPSHOT_DIR, mode='pairwise',
+                 prepare=None):
+        self.dataset_path = dataset_path
+        self.snapshot_dir = snapshot_dir
+        self.mode = mode
+        self.prepare = prepare
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.reload_thread = None
+        self.watch_thread = None
+        self.watch_pid = None
+        self.reloads = 0
+        self.last_error = None
+        self.graph = self._load()
+        self.loaded_at = time.time()
+
+    def _load(self):
+        graph = load_or_build_graph(self.dataset_path, snapshot_dir=self.snapshot_dir, mode=self.mode)
+        if self.prepare is not None:
+            self.prepare(graph)
+        return graph
+
+    @property
+    def version(self):
+        return self.graph.get('version')
+
+    def on_swap(self, callback):
+        """Call callback(new graph) after every swap."""
+        self.listeners.append(callback)
+
+    def needs_reload(self):
+        """True if the dataset changed since the snapshot, or another process wrote a newer snapshot."""
+        if not snapshot_is_current([self.dataset_path], self.snapshot_dir, self.mode):
+            return True
+        return (read_meta(self.snapshot_dir) or {}).get('graph_version') != self.version
+
+    def reload(self, wait=False):
+        """
+        Start a background reload unless one is already running; with wait, block until it
+        is done. Returns True if this call started the reload.
+        """
+        with self.lock:
+            started = self.reload_thread is None or not self.reload_thread.is_alive()
+            if started:
+                self.reload_thread = threading.Thread(target=self._reload, daemon=True)
+                self.reload_thread.start()
+            thread = self.reload_thread
+        if wait:
+            thread.join()
+        return started
+
+    def _reload(self):
+        try:
+            graph = self._load()
+        except Exception as e:  # Keep serving the current graph
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Graph reload failed, still serving version {self.version}: {self.last_error}")
+            return
+        self.last_error = None
+        if graph.get('version') == self.version:
+            return  # Snapshot unchanged, keep the graph and its caches
+        self.graph = graph
+        self.loaded_at = time.time()
+        self.reloads += 1
+        print(f"Swapped in graph version {self.version}")
+        for callback in self.listeners:
+            callback(graph)
+
+    def watch(self, interval):
+        """
+        Poll every `interval` seconds and reload when needs_reload() says so. Safe to call
+        repeatedly; threads don't survive fork, so a forked worker calling it starts its own.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    stale = self.needs_reload()
+                except OSError as e:  # Dataset briefly missing, e.g. while being replaced
+                    print(f"Graph watcher: {e}")
+                    continue
+                if stale:
+                    self.reload(wait=True)
+
+        with self.lock:
+            if self.watch_pid != os.getpid():
+                self.watch_pid = os.getpid()
+                self.watch_thread = threading.Thread(target=run, daemon=True)
+                self.watch_thread.start()
+
+    def status(self):
+        return {
+            'version': self.version,
+            'num_nodes': len(self.graph['nodes']),
+            'loaded_at': self.loaded_at,
+            'reloading': self.reload_thread is not None and self.reload_thread.is_alive(),
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
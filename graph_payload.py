@@ -0,0 +1,206 @@
+import base64
+import gzip
+import hashlib
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the (slower) standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+from draw_graph import graph_edges
+from graph_snapshot import graph_delta
+from query_cache import is_older
+
+def dumps_compact(obj):
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def accepted_encodings(header):
+    """Content codings a client accepts, from its Accept-Encoding header (q=0 excluded)."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class FullGraphPayload:
+    """
+    The full graph serialized once: compact JSON, plus gzip and (if available) brotli
+    encodings of it. Each encoding is its own representation with its own strong ETag,
+    derived from the content plus a suffix for the coding ("<hash>-gz", "<hash>-br").
+    """
+
+    ETAG_SUFFIXES = {None: '', 'gzip': '-gz', 'br': '-br'}
+
+    def __init__(self, graph):
+        self.version = graph.get('version')
+        self.body = dumps_compact({'version': self.version, 'nodes': list(graph['nodes']), 'edges': graph_edges(graph)})
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # Built on the first request after a swap, which every request for the new graph
+        # waits on: mid-range levels take about a second on a 50 MB graph where brotli's
+        # maximum takes minutes
+        self.encoded = {'gzip': gzip.compress(self.body, compresslevel=6)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body, quality=5)
+        self.etags = {coding: f'"{digest}{self.ETAG_SUFFIXES[coding]}"' for coding in [None, *self.encoded]}
+
+    def select(self, accept_encoding):
+        """(content coding or None, bytes, ETag) to send for this Accept-Encoding header."""
+        accepted = accepted_encodings(accept_encoding)
+        for coding in ('br', 'gzip'):
+            if coding in self.encoded and (coding in accepted or '*' in accepted):
+                return coding, self.encoded[coding], self.etags[coding]
+        return None, self.body, self.etags[None]
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names the ETag of any encoding of this payload."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or not tags.isdisjoint(self.etags.values())
+
+_PAYLOAD = None  # (graph, FullGraphPayload or None until first requested)
+_DELTAS = None  # (graph, {since: serialized delta})
+_PAYLOAD_LOCK = threading.Lock()
+
+def bind_payloads(graph):
+    """
+    Drop the payloads of the previous graph once graph replaces it, so they (and the graph
+    they reference) can be freed right away rather than on the next request.
+    """
+    global _PAYLOAD, _DELTAS
+    with _PAYLOAD_LOCK:
+        if _PAYLOAD is None or _PAYLOAD[0] is not graph:
+            _PAYLOAD = (graph, None)
+        if _DELTAS is None or _DELTAS[0] is not graph:
+            _DELTAS = (graph, {})
+
+def get_full_graph_payload(graph):
+    """
+    The FullGraphPayload for graph, built on first request and rebuilt when the graph is
+    replaced. Requests still running on an older graph get an uncached payload, built
+    outside the lock so they don't hold up requests on the current graph.
+    """
+    global _PAYLOAD
+    payload = _PAYLOAD
+    if payload is not None and payload[0] is graph and payload[1] is not None:
+        return payload[1]
+    with _PAYLOAD_LOCK:
+        payload = _PAYLOAD
+        stale = payload is not None and payload[0] is not graph and is_older(graph, payload[0])
+        if not stale and (payload is None or payload[0] is not graph or payload[1] is None):
+            payload = _PAYLOAD = (graph, FullGraphPayload(graph))
+    if stale:
+        return FullGraphPayload(graph)
+    return payload[1]
+
+def get_graph_delta_payload(graph, since, snapshot_dir):
+    """
+    graph_delta(graph, since) as compact JSON, computed once per graph and `since`; None if
+    that version is no longer in the history. Like the full payload, deltas of an older
+    graph (requests still running on a replaced graph) are not cached.
+    """
+    global _DELTAS
+    deltas = _DELTAS
+    if deltas is not None and deltas[0] is graph and since in deltas[1]:
+        return deltas[1][since]
+    delta = graph_delta(graph, since, snapshot_dir)
+    if delta is None:
+        return None
+    body = dumps_compact(delta)
+    with _PAYLOAD_LOCK:
+        deltas = _DELTAS
+        if deltas is None or deltas[0] is not graph:
+            if deltas is not None and is_older(graph, deltas[0]):
+                return body
+            deltas = _DELTAS = (graph, {})
+        deltas[1][since] = body
+    return body
+
+def ndjson_lines(records):
+    """Encode records as newline-delimited JSON, one line (bytes) per record."""
+    for record in records:
+        yield dumps_compact(record) + b'\n'
+
+def subgraph_records(subgraph, max_nodes=None):
+    """
+    Node, edge and meta records (as yielded by draw_graph.iter_union_subgraph) for an
+    already computed subgraph, keeping at most max_nodes nodes and the edges between them.
+    """
+    nodes = (subgraph or {}).get('nodes', [])
+    edges = (subgraph or {}).get('edges', [])
+    kept = nodes if max_nodes is None else nodes[:max_nodes]
+    kept_ids = {node['id'] for node in kept}
+    num_edges = 0
+    for node in kept:
+        yield {'type': 'node', 'node': node}
+    for edge in edges:
+        if edge['source'] in kept_ids and edge['target'] in kept_ids:
+            num_edges += 1
+            yield {'type': 'edge', 'edge': edge}
+    meta = {'type': 'meta', 'num_nodes': len(kept), 'num_edges': num_edges, 'truncated': len(kept) < len(nodes)}
+    for key, value in (subgraph or {}).items():
+        if key not in ('nodes', 'edges'):
+            meta[key] = value
+    yield meta
+
+def collect_records(records):
+    """Assemble node / edge / meta records back into one subgraph dict."""
+    subgraph = {'nodes': [], 'edges': []}
+    for record in records:
+        if record['type'] == 'node':
+            subgraph['nodes'].append(record['node'])
+        elif record['type'] == 'edge':
+            subgraph['edges'].append(record['edge'])
+        else:
+            subgraph.update({key: value for key, value in record.items() if key != 'type'})
+    return subgraph
+
+def encode_cursor(version, offset):
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode('ascii')).decode('ascii')
+
+def decode_cursor(cursor):
+    """(graph version, node offset) from a cursor; raises ValueError if it is malformed."""
+    if not isinstance(cursor, str):
+        raise ValueError(f"Malformed cursor: {cursor}")
+    try:
+        version, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split(':')
+        version, offset = (None if version == 'None' else int(version)), int(offset)
+    except ValueError as e:  # Also covers UnicodeError and binascii.Error
+        raise ValueError(f"Malformed cursor: {cursor}") from e
+    if offset < 0:
+        raise ValueError(f"Malformed cursor: {cursor}")
+    return version, offset
+
+def page_subgraph(subgraph, offset, page_size, version):
+    """
+    One page of a subgraph: nodes[offset:offset + page_size], and the edges whose later
+    endpoint is on this page, so every edge arrives exactly once and after both its nodes.
+    Includes next_cursor while more nodes remain, and whether a node budget cut the subgraph short.
+    """
+    nodes = (subgraph or {}).get('nodes', [])
+    edges = (subgraph or {}).get('edges', [])
+    position = {node['id']: i for i, node in enumerate(nodes)}
+    end = min(offset + page_size, len(nodes))
+    page_edges = [edge for edge in edges
+                  if offset <= max(position.get(edge['source'], -1), position.get(edge['target'], -1)) < end
+                  and edge['source'] in position and edge['target'] in position]
+    return {
+        'nodes': nodes[offset:end],
+        'edges': page_edges,
+        'total_nodes': len(nodes),
+        'truncated': bool((subgraph or {}).get('truncated', False)),
+        'next_cursor': encode_cursor(version, end) if end < len(nodes) else None,
+    }
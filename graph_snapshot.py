@@ -0,0 +1,352 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+import numpy as np
+
+from dataset_store import DEFAULT_DATASET_PATH
+from draw_graph import generate_relationship_graph_from_store, edge_arrays, edge_weights, get_centrality
+from graph_attributes import GraphAttributes
+from graph_index import GraphIndex, BipartiteGraphIndex, Csr, StringTable, NodeTable, NameLookup
+
+# Bump whenever the on-disk layout changes; older snapshots are then rebuilt
+SNAPSHOT_VERSION = 7
+
+DEFAULT_SNAPSHOT_DIR = 'graph_snapshot'
+
+# Number of past graph versions whose node / edge keys are kept for graph_delta()
+HISTORY_VERSIONS = 10
+
+def file_fingerprint(path, with_hash=True):
+    """Return the size, mtime and (optionally) sha256 of a file."""
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def _sources_unchanged(recorded):
+    """Check source files against the fingerprints recorded in a snapshot."""
+    for path, expected in recorded.items():
+        if not os.path.exists(path):
+            return False
+        current = file_fingerprint(path, with_hash=False)
+        if current['size'] != expected['size']:
+            return False
+        # Same size and mtime: trust it. Otherwise fall back to comparing content hashes.
+        if current['mtime_ns'] != expected['mtime_ns'] and file_fingerprint(path)['sha256'] != expected['sha256']:
+            return False
+    return True
+
+def node_keys(nodes):
+    """
+    A 64-bit key per node derived from its name and type. Node ids are positions and shift
+    between builds, so keys are what identifies the same node across graph versions.
+    """
+    keys = np.empty(len(nodes), dtype=np.uint64)
+    for i, node in enumerate(nodes):
+        digest = hashlib.blake2b(f"{node['data']['type']}\x00{node['data']['name']}".encode('utf-8'), digest_size=8)
+        keys[i] = int.from_bytes(digest.digest(), 'little')
+    return keys
+
+def edge_keys(keys, source, target):
+    """Order-independent 64-bit key per edge, from the keys of its two nodes."""
+    a = keys[source]
+    b = keys[target]
+    low = np.minimum(a, b)
+    high = np.maximum(a, b)
+    with np.errstate(over='ignore'):
+        return low * np.uint64(0x9E3779B97F4A7C15) ^ high
+
+def _history_dir(snapshot_dir):
+    return f"{snapshot_dir}.history"
+
+def _write_history(snapshot_dir, graph_version, keys, graph):
+    """Record this version's node and edge keys and edge weights, keeping only the last HISTORY_VERSIONS."""
+    history_dir = _history_dir(snapshot_dir)
+    os.makedirs(history_dir, exist_ok=True)
+    source, target = edge_arrays(graph)
+    current, first = np.unique(edge_keys(keys, source, target), return_index=True)
+    np.savez(os.path.join(history_dir, f"{graph_version}.npz"),
+             node_keys=keys, edge_keys=current, edge_weights=edge_weights(graph)[first])
+    for name in os.listdir(history_dir):
+        version = name.split('.')[0]
+        if version.isdigit() and int(version) <= graph_version - HISTORY_VERSIONS:
+            os.remove(os.path.join(history_dir, name))
+
+def graph_delta(graph, since, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """
+    What changed between graph version `since` and the current graph, or None if that
+    version is no longer in the history (the client should then fetch the full graph).
+
+    Returns nodes added since and edges added or reweighted since (with current ids),
+    'remapped' {old id: new id} for nodes kept under a different id, and 'removed_nodes' (old ids).
+    """
+    path = os.path.join(_history_dir(snapshot_dir), f"{since}.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as history:
+        old_nodes = history['node_keys']
+        old_edges = history['edge_keys']
+        old_weights = history['edge_weights'] if 'edge_weights' in history.files else None
+
+    keys = graph.get('node_keys')
+    if keys is None:
+        keys = node_keys(graph['nodes'])
+    position = {key: i for i, key in enumerate(keys.tolist())}
+    remapped = {}
+    removed = []
+    for old_id, key in enumerate(old_nodes.tolist()):
+        new_id = position.get(key)
+        if new_id is None:
+            removed.append(str(old_id))
+        elif new_id != old_id:
+            remapped[str(old_id)] = str(new_id)
+
+    added_nodes = np.flatnonzero(~np.isin(keys, old_nodes))
+    source, target = edge_arrays(graph)
+    current = graph.get('edge_keys')
+    if current is None:
+        current = graph['edge_keys'] = edge_keys(keys, source, target)
+    found = np.minimum(np.searchsorted(old_edges, current), max(len(old_edges) - 1, 0))
+    changed = old_edges[found] != current if len(old_edges) else np.ones(len(current), dtype=bool)
+    if old_weights is not None and len(old_edges):
+        changed |= old_weights[found] != edge_weights(graph)
+    added_edges = np.flatnonzero(changed)
+    index = graph['index']
+    if graph['edges'] is None:
+        # Bipartite edge ids encode their endpoints
+        edge_ids = source[added_edges] * len(graph['nodes']) + target[added_edges]
+    else:
+        edge_ids = added_edges
+    return {
+        'version': graph.get('version'),
+        'since': since,
+        'nodes': [graph['nodes'][i] for i in added_nodes.tolist()],
+        'edges': [index.edge(edge_id) for edge_id in edge_ids.tolist()],
+        'remapped': remapped,
+        'removed_nodes': removed,
+    }
+
+def _save(snapshot_dir, name, array):
+    np.save(os.path.join(snapshot_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+def _load(snapshot_dir, name):
+    return np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode='r')
+
+def _save_strings(snapshot_dir, name, strings):
+    """String table: all strings as one UTF-8 blob (name.bin) plus offsets (name_offsets.npy)."""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    with open(os.path.join(snapshot_dir, f"{name}.bin"), 'wb') as f:
+        f.write(b''.join(encoded))
+    _save(snapshot_dir, f"{name}_offsets", offsets)
+
+def _load_strings(snapshot_dir, name):
+    """The string table saved by _save_strings, memory-mapped and decoded on access."""
+    offsets = _load(snapshot_dir, f"{name}_offsets")
+    with open(os.path.join(snapshot_dir, f"{name}.bin"), 'rb') as f:
+        if offsets[-1]:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            blob = b''  # mmap refuses empty files
+    return StringTable(blob, offsets)
+
+def write_snapshot(graph, source_files, snapshot_dir=DEFAULT_SNAPSHOT_DIR, mode='pairwise'):
+    """
+    Write the graph and its index to snapshot_dir as .npy arrays plus a string table.
+
+    Node ids must be their positions (as produced by generate_relationship_graph).
+    The snapshot is written to a temporary directory, renamed to snapshot_dir.v<version>
+    and published by switching the snapshot_dir symlink to it, so readers always see a
+    complete snapshot. meta.json records the layout version and the fingerprints of source_files.
+    Every write also bumps graph_version and records its node / edge keys in the
+    history used by graph_delta.
+    """
+    index = graph['index']
+    previous = read_meta(snapshot_dir) or {}
+    graph_version = previous.get('graph_version', 0) + 1
+    tmp_dir = f"{snapshot_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    names = [node['data']['name'] for node in graph['nodes']]
+    _save_strings(tmp_dir, 'name', names)
+    name_hashes, name_order = NameLookup.build(names)
+    _save(tmp_dir, 'name_hashes', name_hashes)
+    _save(tmp_dir, 'name_order', name_order)
+    # Ids of the cases / decisions that edge support positions refer to
+    _save_strings(tmp_dir, 'case_ids', [str(case_id) for case_id in graph['case_ids']])
+    _save_strings(tmp_dir, 'decision_ids', [str(decision_id) for decision_id in graph['decision_ids']])
+
+    # Node types are few, so store a code per node and the distinct values in meta.json
+    types = {}
+    codes = np.array([types.setdefault(node['data']['type'], len(types)) for node in graph['nodes']], dtype=np.uint16)
+    _save(tmp_dir, 'type_codes', codes)
+
+    keys = node_keys(graph['nodes'])
+    _save(tmp_dir, 'node_keys', keys)
+
+    degree, pagerank = get_centrality(graph)
+    _save(tmp_dir, 'degree', degree)
+    _save(tmp_dir, 'pagerank', pagerank)
+    _write_history(snapshot_dir, graph_version, keys, graph)
+
+    if mode == 'pairwise':
+        for name in ('edge_source', 'edge_target', 'indptr', 'indices', 'edge_ids', 'edge_weight', 'edge_type'):
+            _save(tmp_dir, name, getattr(index, name))
+        _save(tmp_dir, 'edge_support_indptr', index.edge_support.indptr)
+        _save(tmp_dir, 'edge_support_indices', index.edge_support.indices)
+    else:
+        _save(tmp_dir, 'decision_cases', index.decision_cases)
+        for name in BipartiteGraphIndex.CSR_TABLES:
+            csr = getattr(index, name)
+            _save(tmp_dir, f"{name}_indptr", csr.indptr)
+            _save(tmp_dir, f"{name}_indices", csr.indices)
+    attribute_values = graph['attributes'].save(tmp_dir, _save)
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'graph_version': graph_version,
+        'mode': mode,
+        'created': time.time(),
+        'num_nodes': len(graph['nodes']),
+        'types': list(types),
+        'attributes': attribute_values,
+        'sources': {path: file_fingerprint(path) for path in source_files},
+    }
+    # meta.json goes last: a snapshot without it is never considered valid
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+    version_dir = f"{snapshot_dir}.v{graph_version}"
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.rename(tmp_dir, version_dir)
+    _switch_snapshot(snapshot_dir, version_dir)
+    _drop_old_versions(snapshot_dir, graph_version)
+    graph['version'] = graph_version
+    graph['node_keys'] = keys
+
+def _switch_snapshot(snapshot_dir, version_dir):
+    """Point snapshot_dir, a symlink, at version_dir with one atomic rename."""
+    link = f"{snapshot_dir}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version_dir), link)
+    if os.path.isdir(snapshot_dir) and not os.path.islink(snapshot_dir):
+        shutil.rmtree(snapshot_dir)  # Plain directory written before snapshots were versioned
+    os.replace(link, snapshot_dir)
+
+def _drop_old_versions(snapshot_dir, graph_version):
+    """
+    Remove version directories older than the previous one. The previous version stays
+    (double buffering), so a process that resolved the link just before the switch can
+    finish loading it; processes that already loaded it keep their mappings either way.
+    """
+    parent = os.path.dirname(snapshot_dir) or '.'
+    pattern = re.compile(re.escape(os.path.basename(snapshot_dir)) + r'\.v(\d+)')
+    for name in os.listdir(parent):
+        match = pattern.fullmatch(name)
+        if match and int(match.group(1)) < graph_version - 1:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+def read_meta(snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """Return the snapshot's meta.json contents, or None if there is no complete snapshot."""
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def snapshot_is_current(source_files, snapshot_dir=DEFAULT_SNAPSHOT_DIR, mode='pairwise'):
+    """True if a snapshot exists for this layout version and mode and its sources are unchanged."""
+    meta = read_meta(snapshot_dir)
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION or meta.get('mode') != mode:
+        return False
+    if set(meta['sources']) != set(source_files):
+        return False
+    return _sources_unchanged(meta['sources'])
+
+def load_snapshot(snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """
+    Load a snapshot written by write_snapshot. Arrays and string tables are memory-mapped
+    read-only and node dicts are created on access (NodeTable), so loading is nearly free
+    and the pages are shared by every process that loads the same snapshot: server workers
+    don't each hold a copy of the graph, and no refcounts are written into those pages.
+    """
+    # Resolve the link once, so a concurrent write_snapshot can't switch versions mid-load
+    snapshot_dir = os.path.realpath(snapshot_dir)
+    meta = read_meta(snapshot_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No graph snapshot in {snapshot_dir}")
+    if meta['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {meta['version']} != {SNAPSHOT_VERSION}")
+
+    names = _load_strings(snapshot_dir, 'name')
+    nodes = NodeTable(names, _load(snapshot_dir, 'type_codes'), meta['types'])
+    name_lookup = NameLookup(names, _load(snapshot_dir, 'name_hashes'), _load(snapshot_dir, 'name_order'))
+
+    if meta['mode'] == 'pairwise':
+        arrays = {name: _load(snapshot_dir, name)
+                  for name in ('edge_source', 'edge_target', 'indptr', 'indices', 'edge_ids', 'edge_weight', 'edge_type')}
+        support = Csr.from_arrays(_load(snapshot_dir, 'edge_support_indptr'), _load(snapshot_dir, 'edge_support_indices'))
+        index = GraphIndex.from_arrays(nodes, edge_support=support, name_lookup=name_lookup, **arrays)
+        graph = {'nodes': nodes, 'edges': index.edges, 'index': index}
+    else:
+        tables = {
+            name: (_load(snapshot_dir, f"{name}_indptr"), _load(snapshot_dir, f"{name}_indices"))
+            for name in BipartiteGraphIndex.CSR_TABLES
+        }
+        index = BipartiteGraphIndex.from_arrays(nodes, _load(snapshot_dir, 'decision_cases'), tables, name_lookup)
+        graph = {'nodes': nodes, 'edges': None, 'index': index}
+
+    graph['case_ids'] = _load_strings(snapshot_dir, 'case_ids')
+    graph['decision_ids'] = _load_strings(snapshot_dir, 'decision_ids')
+    graph['attributes'] = GraphAttributes.load(snapshot_dir, _load, meta['attributes'])
+    graph['version'] = meta['graph_version']
+    for name in ('node_keys', 'degree', 'pagerank'):
+        graph[name] = _load(snapshot_dir, name)
+    return graph
+
+def load_or_build_graph(dataset_path=DEFAULT_DATASET_PATH, snapshot_dir=DEFAULT_SNAPSHOT_DIR, mode='pairwise'):
+    """
+    Load the graph from its snapshot, first building it from the dataset store and
+    writing a fresh snapshot if it is missing or stale.
+    """
+    source_files = [dataset_path]
+    if not snapshot_is_current(source_files, snapshot_dir, mode):
+        # One process rebuilds; the others wait for it and then load its snapshot
+        with open(f"{snapshot_dir}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not snapshot_is_current(source_files, snapshot_dir, mode):
+                print(f"Graph snapshot in {snapshot_dir} missing or stale, rebuilding...")
+                graph = generate_relationship_graph_from_store(dataset_path, mode=mode)
+                write_snapshot(graph, source_files, snapshot_dir, mode)
+                # Served from the snapshot below rather than the built objects, so that
+                # processes share its pages
+                del graph
+
+    start_time = time.time()
+    graph = load_snapshot(snapshot_dir)
+    print(f"Loaded graph snapshot from {snapshot_dir} in {time.time() - start_time:.2f} seconds")
+    return graph
+
+if __name__ == '__main__':
+    # Build step: python graph_snapshot.py [pairwise|bipartite] [dataset path]
+    build_mode = sys.argv[1] if len(sys.argv) > 1 else 'pairwise'
+    dataset = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DATASET_PATH
+    start_time = time.time()
+    built = generate_relationship_graph_from_store(dataset, mode=build_mode)
+    write_snapshot(built, [dataset], DEFAULT_SNAPSHOT_DIR, build_mode)
+    print(f"Wrote {build_mode} snapshot of {len(built['nodes'])} nodes to {DEFAULT_SNAPSHOT_DIR} "
+          f"in {time.time() - start_time:.2f} seconds")
@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+# Import app.py, and map the graph snapshot, once in the master process; workers fork
+# from it and share those pages instead of each loading their own copy
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# /admin/reload_graph only reaches the worker that serves it; with several workers the
+# others pick up the new snapshot through their watcher, so enable it unless configured
+if workers > 1:
+    os.environ.setdefault('GRAPH_WATCH_INTERVAL', '5')
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+import requests
+
+# Seconds a cached response is served without asking the API again, per resource type.
+# Case listings change as new cases are added; individual records rarely do.
+DEFAULT_TTLS = {
+    "cases": 6 * 3600,
+    "decisions": 30 * 86400,
+    "individuals": 30 * 86400,
+    "parties": 30 * 86400,
+}
+DEFAULT_TTL = 86400
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a URL has no cached response."""
+
+def resource_type(url):
+    """The API resource a URL belongs to, e.g. 'cases' or 'decisions'."""
+    path = urlparse(url).path.rstrip('/').split('/')
+    if len(path) >= 2 and path[-2] in DEFAULT_TTLS:
+        return path[-2]  # .../decisions/{id}
+    return path[-1]  # .../cases?page=...
+
+class ResponseCache:
+    """
+    On-disk cache of JSON API responses in a single SQLite file.
+
+    Entries are keyed by the sha256 of the URL and store the zlib-compressed body together
+    with its ETag / Last-Modified validators. Fresh entries (younger than the TTL of their
+    resource type) are served without any request. Stale entries are revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged resource costs a 304 instead of a
+    full download. If the API answers 429 or a 5xx meanwhile, the stale entry is served;
+    other errors raise requests.HTTPError. In offline mode only the cache is consulted
+    (useful for replaying a crawl in CI), and a missing entry raises CacheMiss.
+    """
+
+    def __init__(self, path='http_cache.sqlite', ttls=None, offline=False):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.stats = {"fresh": 0, "revalidated": 0, "fetched": 0, "stale": 0, "offline": 0}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                body BLOB NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def lookup(self, url):
+        """Return the cached entry for url as a dict, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified, fetched_at, body FROM responses WHERE key = ?", (self.key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, fetched_at, body = row
+        return {"etag": etag, "last_modified": last_modified, "fetched_at": fetched_at,
+                "body": zlib.decompress(body)}
+
+    def is_fresh(self, url, entry):
+        return time.time() - entry["fetched_at"] < self.ttls.get(resource_type(url), DEFAULT_TTL)
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Validators to send when revalidating a stale entry."""
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, body, etag=None, last_modified=None):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, url, etag, last_modified, fetched_at, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(url), url, etag, last_modified, time.time(), zlib.compress(body))
+            )
+            self.db.commit()
+
+    def touch(self, url):
+        """Mark an entry as freshly validated (after a 304)."""
+        with self.lock:
+            self.db.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), self.key(url)))
+            self.db.commit()
+
+    def cached_json(self, url, entry):
+        """
+        The body of entry (what lookup(url) returned) if it can be used without a request
+        (fresh, or offline), else None. Raises CacheMiss in offline mode when nothing is cached.
+        """
+        if entry is not None and self.is_fresh(url, entry):
+            self.stats["fresh"] += 1
+            return json.loads(entry["body"])
+        if self.offline:
+            if entry is None:
+                raise CacheMiss(url)
+            self.stats["offline"] += 1
+            return json.loads(entry["body"])
+        return None
+
+    def get_json(self, url, headers=None, session=None, timeout=None):
+        """Blocking GET through the cache, returning the parsed JSON body. timeout is passed to requests."""
+        entry = self.lookup(url)
+        cached = self.cached_json(url, entry)
+        if cached is not None:
+            return cached
+
+        request_headers = {**(headers or {}), **self.conditional_headers(entry)}
+        response = (session or requests).get(url, headers=request_headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            self.touch(url)
+            return json.loads(entry["body"])
+        if response.status_code == 200:
+            self.stats["fetched"] += 1
+            self.store(url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return response.json()
+        if entry is not None and (response.status_code == 429 or response.status_code >= 500):
+            self.stats["stale"] += 1
+            return json.loads(entry["body"])
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache():
+    """
+    The process-wide cache, configured from the environment:
+      JUSMUNDI_CACHE    path of the cache file (default http_cache.sqlite); empty disables caching
+      JUSMUNDI_OFFLINE  set to 1 to serve only from the cache
+    Returns None when caching is disabled.
+    """
+    global _CACHE
+    path = os.environ.get("JUSMUNDI_CACHE", "http_cache.sqlite")
+    if not path:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache(path, offline=os.environ.get("JUSMUNDI_OFFLINE") == "1")
+    return _CACHE
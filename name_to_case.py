@@ -1,61 +1,105 @@
-import json
-
-def load_data():
-    """Load data from JSON files."""
-    with open("cases.json", "r") as f:
-        cases = json.load(f)
-    with open("decisions.json", "r") as f:
-        decisions = json.load(f)
-    with open("individuals.json", "r") as f:
-        individuals = json.load(f)
-    with open("parties.json", "r") as f:
-        parties = json.load(f)
-    return cases, decisions, individuals, parties
+import threading
+
+from dataset_store import DatasetStore, DEFAULT_DATASET_PATH
+
+def load_data(dataset_path=DEFAULT_DATASET_PATH):
+    """Load the records from the dataset store (without decision text)."""
+    with DatasetStore(dataset_path) as store:
+        return store.load_all()
+
+class CaseLookup:
+    """
+    In-memory name -> cases index, built once from the dataset.
+
+    Keeps name -> individual ids / person-type party ids, individual -> decisions,
+    decision -> case and party -> cases, so a lookup is a few dict reads instead
+    of a full dataset load and a linear scan.
+    """
+
+    def __init__(self, cases, decisions, individuals, parties):
+        self.case_titles = {case_id: case.get("title") for case_id, case in cases.items()}
+        self.decision_case = {decision_id: decision.get("case_id") for decision_id, decision in decisions.items()}
+
+        self.individuals_by_name = {}
+        self.individual_decisions = {}
+        for individual_id, individual in individuals.items():
+            self.individuals_by_name.setdefault(individual.get("name"), []).append(individual_id)
+            decision_ids = individual.get("decision_ids") or [individual.get("decision_id")]
+            self.individual_decisions[individual_id] = [d for d in decision_ids if d is not None]
+
+        self.parties_by_name = {}
+        self.party_cases = {}
+        for party_id, party in parties.items():
+            if (party.get("type") or "").lower() != "person":
+                continue  # Only people are looked up by name, as before
+            self.parties_by_name.setdefault(party.get("name"), []).append(party_id)
+            case_ids = party.get("case_ids") or [party.get("case_id")]
+            self.party_cases[party_id] = [c for c in case_ids if c is not None]
+
+    @classmethod
+    def from_store(cls, dataset_path=DEFAULT_DATASET_PATH):
+        return cls(*load_data(dataset_path))
+
+    def case_ids(self, name):
+        """Ids of every case the individual or person-type party with this name appears in, in dataset order."""
+        case_ids = []
+        for individual_id in self.individuals_by_name.get(name, []):
+            for decision_id in self.individual_decisions[individual_id]:
+                case_ids.append(self.decision_case.get(decision_id))
+        for party_id in self.parties_by_name.get(name, []):
+            case_ids.extend(self.party_cases[party_id])
+        # Drop unknown and repeated cases, keeping the first occurrence
+        return [case_id for case_id in dict.fromkeys(case_ids) if case_id in self.case_titles]
+
+    def find_cases(self, name):
+        """Every case for a name as {"case_id", "title"} dicts; empty if the name is unknown."""
+        return [{"case_id": case_id, "title": self.case_titles[case_id]} for case_id in self.case_ids(name)]
+
+    def find_cases_many(self, names):
+        """find_cases for each name: {name: [cases]}."""
+        return {name: self.find_cases(name) for name in names}
+
+# Shared lookup used by get_case_name, built on first use
+_CASE_LOOKUP = None
+_CASE_LOOKUP_LOCK = threading.Lock()
+
+def get_case_lookup(dataset_path=DEFAULT_DATASET_PATH):
+    """Return the process-wide CaseLookup, building it from the dataset store on first use."""
+    global _CASE_LOOKUP
+    if _CASE_LOOKUP is None:
+        with _CASE_LOOKUP_LOCK:
+            if _CASE_LOOKUP is None:
+                _CASE_LOOKUP = CaseLookup.from_store(dataset_path)
+    return _CASE_LOOKUP
+
+def set_case_lookup(lookup):
+    """Replace the process-wide CaseLookup (e.g. after the dataset was updated)."""
+    global _CASE_LOOKUP
+    _CASE_LOOKUP = lookup
 
 def get_case_name(name: str) -> str:
     """
     Given the name of an individual or a party (of type person), return the case name.
-    
-    The function first checks the individuals list by matching the name.
-    If found, it retrieves the decision associated with that individual, then looks up the corresponding case.
-    If not found, it searches the parties (filtering for type "Person") for the name.
-    
+
+    Individuals are matched first, then person-type parties. When the name appears in
+    several cases the first one is returned; use get_case_names or CaseLookup.find_cases
+    for all of them.
+
     Parameters:
         name (str): The name of the individual or person-type party.
-    
+
     Returns:
         str: The title of the case if found, or an error message.
     """
-    # Load our datasets from JSON files
-    cases, decisions, individuals, parties = load_data()
-
-    # First, try to find the name in individuals.json
-    for ind in individuals.values():
-        if ind.get("name") == name:
-            decision_id = ind.get("decision_id")
-            decision = decisions.get(decision_id)
-            if decision:
-                case_id = decision.get("case_id")
-                case = cases.get(case_id)
-                if case:
-                    return case.get("title", "Case title not found")
-                else:
-                    return "Case not found for the given decision."
-            else:
-                return "Decision not found for the individual."
-
-    # Next, try to find the name in parties.json with type 'Person'
-    for party in parties.values():
-        if party.get("name") == name and party.get("type", "").lower() == "person":
-            case_id = party.get("case_id")
-            case = cases.get(case_id)
-            if case:
-                return case.get("title", "Case title not found")
-            else:
-                return "Case not found for the party."
-
-    # If no match is found, return an appropriate message.
-    return "Name not found in individuals or person-type parties."
+    cases = get_case_lookup().find_cases(name)
+    if not cases:
+        return "Name not found in individuals or person-type parties."
+    return cases[0]["title"] or "Case title not found"
+
+def get_case_names(names):
+    """Batch variant: {name: [case titles]} for many names in one pass over the shared index."""
+    return {name: [case["title"] for case in cases]
+            for name, cases in get_case_lookup().find_cases_many(names).items()}
 
 # Example usage:
 if __name__ == "__main__":
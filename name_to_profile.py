@@ -1,10 +1,21 @@
 from gemini_llm import search, generate
-from name_to_case import get_case_name
+from name_to_case import get_case_lookup
+from profile_store import ProfileStore, DEFAULT_PROFILE_PATH, profile_prompt
 
-def get_profile_from_name(name: str) -> str:
-    case_name = get_case_name(name)
-    case_info = search(f"Get me the general information about the case named {case_name}, including the involved parties and their profiles.")
+def get_profile_from_name(name: str, profile_path=DEFAULT_PROFILE_PATH) -> str:
+    # Precomputed by `python profile_store.py`; only fall back to a live search when missing
+    with ProfileStore(profile_path) as store:
+        profiles = store.get_by_name(name)
+    if profiles:
+        return profiles[0]
+
+    cases = get_case_lookup().find_cases(name)
+    if not cases:
+        print(f"No cases found for {name}")
+        return None
+    case_info = search(profile_prompt(name, [case["title"] for case in cases]))
     print(f"Case Info: {case_info}")  # For debugging, to see the case information
-    return None
-    
-print(get_profile_from_name("Sophia Jaeger"))  # Example usage, replace with actual name to test
\ No newline at end of file
+    return case_info
+
+if __name__ == "__main__":
+    print(get_profile_from_name("Sophia Jaeger"))  # Example usage, replace with actual name to test
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from dataset_store import DatasetStore, DEFAULT_DATASET_PATH
+from gemini_llm import search_many, MAX_CONCURRENCY
+
+DEFAULT_PROFILE_PATH = 'profiles.sqlite'
+BATCH_SIZE = 50  # Profiles generated and committed together; a crash loses at most one batch
+
+def profile_prompt(name, case_titles):
+    """The grounded-search prompt for an entity appearing in the given cases."""
+    case_name = "; ".join(case_titles)
+    return (f"Get me the general information about the case named {case_name}, "
+            f"including the involved parties and their profiles, with a focus on {name}.")
+
+def input_hash(inputs):
+    """Content hash of everything a profile is generated from."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ProfileStore:
+    """
+    Precomputed entity profiles in a SQLite file, keyed by (entity type, entity id).
+
+    Each profile is stored with the hash of the inputs it was generated from (the
+    entity's name and its cases), so a rebuild only regenerates entities whose inputs
+    changed since.
+    """
+
+    def __init__(self, path=DEFAULT_PROFILE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                entity_type TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                name TEXT,
+                input_hash TEXT NOT NULL,
+                profile TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (entity_type, entity_id)
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS profiles_name ON profiles (name)")
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def hashes(self):
+        """(entity type, entity id) -> input hash of every stored profile."""
+        with self.lock:
+            rows = self.db.execute("SELECT entity_type, entity_id, input_hash FROM profiles").fetchall()
+        return {(entity_type, entity_id): digest for entity_type, entity_id, digest in rows}
+
+    def put_many(self, rows):
+        """Store [(entity type, entity id, name, input hash, profile), ...] in one transaction."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO profiles (entity_type, entity_id, name, input_hash, profile, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(*row, now) for row in rows]
+            )
+
+    def get(self, entity_type, entity_id):
+        with self.lock:
+            row = self.db.execute("SELECT profile FROM profiles WHERE entity_type = ? AND entity_id = ?",
+                                  (entity_type, entity_id)).fetchone()
+        return row[0] if row else None
+
+    def get_by_name(self, name):
+        """Profiles of every entity with this exact name, individuals first."""
+        with self.lock:
+            rows = self.db.execute("SELECT profile FROM profiles WHERE name = ? ORDER BY entity_type, rowid",
+                                   (name,)).fetchall()
+        return [row[0] for row in rows]
+
+def entity_inputs(dataset):
+    """
+    Yield (entity type, entity id, name, inputs) for every individual and party in the
+    dataset, where inputs are the name and the cases (id, title, date, outcome) it appears in.
+    """
+    cases, decisions, individuals, parties = dataset.load_all()
+
+    def case_info(case_ids):
+        return [[case_id, cases[case_id].get("title"), cases[case_id].get("commencement_date"),
+                 cases[case_id].get("outcome")] for case_id in dict.fromkeys(case_ids) if case_id in cases]
+
+    for individual_id, individual in individuals.items():
+        case_ids = [decisions[d].get("case_id") for d in individual.get("decision_ids", []) if d in decisions]
+        yield "individual", individual_id, individual.get("name"), {"name": individual.get("name"),
+                                                                   "cases": case_info(case_ids)}
+    for party_id, party in parties.items():
+        yield "party", party_id, party.get("name"), {"name": party.get("name"),
+                                                     "cases": case_info(party.get("case_ids", []))}
+
+def build_profiles(dataset_path=DEFAULT_DATASET_PATH, profile_path=DEFAULT_PROFILE_PATH,
+                   batch_size=BATCH_SIZE, max_concurrency=MAX_CONCURRENCY, limit=None):
+    """
+    Generate a profile for every entity whose inputs changed since its stored profile
+    (or that has none). Batches are committed as they finish, so an interrupted run
+    resumes where it stopped; entities whose generation failed are retried next run.
+    """
+    with DatasetStore(dataset_path) as dataset:
+        entities = list(entity_inputs(dataset))
+
+    with ProfileStore(profile_path) as store:
+        stored = store.hashes()
+        todo = []
+        for entity_type, entity_id, name, inputs in entities:
+            if not name or not inputs["cases"]:
+                continue  # Nothing to ground a profile on
+            digest = input_hash(inputs)
+            if stored.get((entity_type, entity_id)) != digest:
+                todo.append((entity_type, entity_id, name, digest, inputs))
+        if limit is not None:
+            todo = todo[:limit]
+        print(f"{len(todo)} of {len(entities)} profiles to (re)generate")
+
+        generated = failed = 0
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            prompts = [profile_prompt(name, [case[1] for case in inputs["cases"]])
+                       for _, _, name, _, inputs in batch]
+            profiles = search_many(prompts, max_concurrency=max_concurrency)
+            rows = [(entity_type, entity_id, name, digest, profile)
+                    for (entity_type, entity_id, name, digest, _), profile in zip(batch, profiles)
+                    if profile is not None]
+            store.put_many(rows)
+            generated += len(rows)
+            failed += len(batch) - len(rows)
+            print(f"Profiles: {generated} generated, {failed} failed, {len(todo) - start - len(batch)} left")
+    return generated, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute entity profiles")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH, help="Dataset store to read entities from")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE_PATH, help="Profile store to write to")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Profiles committed per batch")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="LLM requests in flight")
+    parser.add_argument("--limit", type=int, default=None, help="Generate at most this many profiles")
+    args = parser.parse_args()
+    build_profiles(args.dataset, args.profiles, args.batch_size, args.concurrency, args.limit)
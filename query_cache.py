@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+def is_older(graph, other):
+    """True if both graphs have versions and graph's is lower."""
+    version, other_version = graph.get('version'), other.get('version')
+    return version is not None and other_version is not None and version < other_version
+
+class QueryCache:
+    """
+    LRU cache with a TTL for serialized query responses.
+
+    Entries belong to one graph: the first lookup made with a different graph object
+    (e.g. after the snapshot was reloaded) empties the cache, so a response is never
+    served from a graph other than the one it was computed on. Lookups for a graph with
+    an older version than the current one (requests still running on a replaced graph)
+    bypass the cache instead of emptying it.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.graph = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_graph(self, graph):
+        """Switch to graph if it is a new one. False if it is older than the current graph."""
+        if graph is self.graph:
+            return True
+        if self.graph is not None and is_older(graph, self.graph):
+            return False
+        if self.graph is not None:
+            self.stats["invalidations"] += 1
+        self.entries.clear()
+        self.graph = graph
+        return True
+
+    def bind(self, graph):
+        """Switch to graph now (e.g. right after it was swapped in) rather than on the next lookup."""
+        with self.lock:
+            self._check_graph(graph)
+
+    def get(self, graph, key):
+        """The cached value for key, or None."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key) if self._check_graph(graph) else None
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, graph, key, value):
+        with self.lock:
+            if not self._check_graph(graph):
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_or_compute(self, graph, key, compute):
+        """Cached value for key, calling compute() and caching its result on a miss."""
+        value = self.get(graph, key)
+        if value is None:
+            value = compute()
+            self.put(graph, key, value)
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.stats["invalidations"] += 1
+
+    def info(self):
+        with self.lock:
+            return {**self.stats, "entries": len(self.entries), "max_entries": self.max_entries, "ttl": self.ttl}
@@ -0,0 +1,104 @@
+import importlib
+import json
+import os
+
+import pytest
+
+from dataset_store import DatasetStore
+from graph_payload import encode_cursor
+from test_graph_index import random_records
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """The Flask app serving a small dataset from a temporary directory."""
+    directory = tmp_path_factory.mktemp('app')
+    dataset_path = str(directory / 'dataset.sqlite')
+    with DatasetStore(dataset_path) as store:
+        store.write(*random_records(0))
+    environ = {'DATASET_PATH': dataset_path, 'GRAPH_SNAPSHOT_DIR': str(directory / 'snapshot'),
+               'GRAPH_WATCH_INTERVAL': '0', 'PAGE_MAX_NODES': '40'}
+    saved = {name: os.environ.get(name) for name in environ}
+    os.environ.update(environ)
+    try:
+        module = importlib.import_module('app')
+        yield module, dataset_path
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def post(client, endpoint, body):
+    response = client.post(endpoint, json=body)
+    return response.status_code, json.loads(response.data) if response.data else None
+
+NAMES = ['Individual 0', 'Individual 53', 'Party 3']
+
+def test_pages_walk_to_the_end_within_the_default_budget(server):
+    app, _ = server
+    client = app.app.test_client()
+    status, page = post(client, '/queries_to_graph', {'query': NAMES, 'page_size': 15})
+    assert status == 200 and page['total_nodes'] <= 40
+    nodes = list(page['nodes'])
+    while page['next_cursor']:
+        status, page = post(client, '/queries_to_graph', {'query': NAMES, 'page_size': 15,
+                                                           'cursor': page['next_cursor']})
+        assert status == 200
+        nodes += page['nodes']
+    assert len(nodes) == len({node['id'] for node in nodes}) == page['total_nodes']
+
+@pytest.mark.parametrize('body', [
+    {'max_nodes': 0}, {'max_nodes': 'ten'}, {'fanout': []}, {'fanout': [2, -1]}, {'page_size': True},
+    {'cursor': '!!'}, {'cursor': 5},
+])
+def test_invalid_budgets_and_cursors_are_rejected(server, body):
+    app, _ = server
+    status, response = post(app.app.test_client(), '/queries_to_graph', {'query': NAMES, **body})
+    assert status == 400 and 'error' in response
+
+def test_fanout_is_rejected_without_a_ranked_traversal(server):
+    app, _ = server
+    client = app.app.test_client()
+    status, _ = post(client, '/queries_to_graph', {'query': NAMES, 'fanout': 2})
+    assert status == 200
+    status, response = post(client, '/queries_to_graph_v2', {'query': NAMES, 'fanout': 2})
+    assert status == 400 and 'fanout' in response['error']
+
+def test_invalid_filters_are_rejected(server):
+    app, _ = server
+    response = app.app.test_client().post('/queries_to_graph', json={'query': NAMES, 'filters': {'colour': 'red'}})
+    assert response.status_code == 400
+
+def test_unmatched_name_is_not_found(server):
+    app, _ = server
+    graph = app.GRAPH_MANAGER.graph
+    name_index = graph['name_index']
+    graph['name_index'] = app.NameIndex([])  # Nothing to match against
+    try:
+        status, _ = post(app.app.test_client(), '/query_to_graph', {'query': 'Individual 0'})
+    finally:
+        graph['name_index'] = name_index
+    assert status == 404
+
+def test_reload_invalidates_cached_responses_and_cursors(server):
+    app, dataset_path = server
+    client = app.app.test_client()
+    status, page = post(client, '/queries_to_graph', {'query': NAMES, 'page_size': 5})
+    assert status == 200 and page['next_cursor']
+    post(client, '/query_to_graph', {'query': NAMES[0]})
+    assert app.QUERY_CACHE.info()['entries'] > 0
+    version = app.GRAPH_MANAGER.version
+
+    with DatasetStore(dataset_path) as store:
+        store.write(parties={'new': {'name': 'Party New', 'type': 'company'}})
+    app.GRAPH_MANAGER.reload(wait=True)
+    assert app.GRAPH_MANAGER.version == version + 1
+    assert app.QUERY_CACHE.info()['entries'] == 0
+
+    status, response = post(client, '/queries_to_graph', {'query': NAMES, 'page_size': 5,
+                                                           'cursor': page['next_cursor']})
+    assert status == 409 and 'error' in response
+    status, _ = post(client, '/queries_to_graph', {'query': NAMES, 'page_size': 5,
+                                                   'cursor': encode_cursor(version + 1, 5)})
+    assert status == 200
@@ -0,0 +1,139 @@
+import random
+from collections import deque
+from itertools import combinations
+
+import pytest
+
+from draw_graph import (build_relationship_graph, get_graph_index, get_centrality, find_connecting_paths,
+                        get_connecting_paths_subgraph, get_subgraph_by_name, get_union_subgraph_by_names,
+                        iter_union_subgraph, ranked_multi_source_bfs)
+from graph_payload import collect_records
+from test_graph_index import random_records
+
+def distances(index, source):
+    """Hop distance from source to every reachable node, by plain BFS."""
+    dist = {source: 0}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in index.neighbors(node)[0]:
+            if neighbor not in dist:
+                dist[neighbor] = dist[node] + 1
+                queue.append(neighbor)
+    return dist
+
+def subgraph_distance(edges, source, target):
+    adjacency = {}
+    for edge in edges:
+        adjacency.setdefault(int(edge['source']), []).append(int(edge['target']))
+        adjacency.setdefault(int(edge['target']), []).append(int(edge['source']))
+    dist = {source: 0}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in adjacency.get(node, []):
+            if neighbor not in dist:
+                dist[neighbor] = dist[node] + 1
+                queue.append(neighbor)
+    return dist.get(target)
+
+def sample_names(graph, seed, count=3):
+    rng = random.Random(seed)
+    return [graph['nodes'][rng.randrange(len(graph['nodes']))]['data']['name'] for _ in range(count)]
+
+def node_ids(subgraph):
+    return {node['id'] for node in (subgraph or {}).get('nodes', [])}
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [1, 2, 3, 4])
+def test_connecting_paths_keep_pair_distances(seed, k):
+    graph = build_relationship_graph(*random_records(seed))
+    index = get_graph_index(graph)
+    targets = random.Random(seed).sample(range(len(graph['nodes'])), 4)
+    nodes, edge_ids = find_connecting_paths(index, targets, k)
+    edges = [index.edge(e) for e in edge_ids]
+    assert set(targets) <= nodes
+    assert {int(edge['source']) for edge in edges} | {int(edge['target']) for edge in edges} <= nodes
+    for source, target in combinations(targets, 2):
+        expected = distances(index, source).get(target)
+        found = subgraph_distance(edges, source, target)
+        if expected is not None and expected <= k:
+            assert found == expected
+        else:
+            assert found is None or found > k
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [2, 3, 4])
+def test_all_paths_covers_every_shortest_path_node(seed, k):
+    graph = build_relationship_graph(*random_records(seed))
+    index = get_graph_index(graph)
+    targets = random.Random(seed).sample(range(len(graph['nodes'])), 4)
+    nodes, _ = find_connecting_paths(index, targets, k, all_paths=True)
+
+    dist = {target: distances(index, target) for target in targets}
+    expected = set(targets)
+    for source, target in combinations(targets, 2):
+        length = dist[source].get(target)
+        if length is None or length > k:
+            continue
+        expected |= {node for node, depth in dist[source].items()
+                     if depth + dist[target].get(node, k + 1) == length}
+    assert nodes == expected
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pairwise_and_bipartite_reach_the_same_nodes(seed):
+    records = random_records(seed)
+    pairwise = build_relationship_graph(*records)
+    bipartite = build_relationship_graph(*records, mode='bipartite')
+    names = sample_names(pairwise, seed)
+
+    for k in (1, 2, 3):
+        assert node_ids(get_subgraph_by_name(pairwise, names[0], k)) == node_ids(get_subgraph_by_name(bipartite, names[0], k))
+        union = get_union_subgraph_by_names(pairwise, names, k)
+        assert node_ids(union) == node_ids(get_union_subgraph_by_names(bipartite, names, k))
+        assert union['reached_from'] == get_union_subgraph_by_names(bipartite, names, k)['reached_from']
+        paths = get_connecting_paths_subgraph(pairwise, names, k + 1, all_paths=True)
+        assert node_ids(paths) == node_ids(get_connecting_paths_subgraph(bipartite, names, k + 1, all_paths=True))
+
+@pytest.mark.parametrize('mode', ['pairwise', 'bipartite'])
+@pytest.mark.parametrize('seed', range(5))
+def test_streaming_union_matches_eager(mode, seed):
+    graph = build_relationship_graph(*random_records(seed), mode=mode)
+    names = sample_names(graph, seed) + ['Nobody']
+    eager = get_union_subgraph_by_names(graph, names, 2)
+    streamed = collect_records(iter_union_subgraph(graph, names, 2))
+    # Streaming yields nodes level by level, the eager subgraph in graph order
+    assert sorted(streamed['nodes'], key=lambda node: int(node['id'])) == eager['nodes']
+    assert sorted(edge['id'] for edge in streamed['edges']) == sorted(edge['id'] for edge in eager['edges'])
+    assert streamed['reached_from'] == eager['reached_from']
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ranked_bfs_respects_node_budget(seed):
+    graph = build_relationship_graph(*random_records(seed))
+    index = get_graph_index(graph)
+    _, pagerank = get_centrality(graph)
+    seeds = random.Random(seed).sample(range(len(graph['nodes'])), 3)
+    full, _, _, _ = ranked_multi_source_bfs(index, seeds, 2, pagerank)
+    for max_nodes in (3, 10, 25):
+        masks, tree_edges, _, truncated = ranked_multi_source_bfs(index, seeds, 2, pagerank, max_nodes=max_nodes)
+        assert len(masks) <= max(max_nodes, len(seeds))
+        assert set(masks) <= set(full)
+        assert truncated == (len(full) > max_nodes)
+        for edge_id in tree_edges:
+            edge = index.edge(edge_id)
+            assert int(edge['source']) in masks and int(edge['target']) in masks
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ranked_bfs_fanout_keeps_highest_ranked_neighbors(seed):
+    graph = build_relationship_graph(*random_records(seed))
+    index = get_graph_index(graph)
+    _, pagerank = get_centrality(graph)
+    hub = max(range(len(graph['nodes'])), key=index.degree)
+    neighbors = set(index.neighbors(hub)[0]) - {hub}  # Pairwise graphs may link a node to itself
+    cap = max(1, len(neighbors) // 2)
+
+    masks, _, pruned, _ = ranked_multi_source_bfs(index, [hub], 1, pagerank, fanout=cap)
+    kept = set(masks) - {hub}
+    assert len(kept) == cap
+    assert min(pagerank[node] for node in kept) >= max(pagerank[node] for node in neighbors - kept)
+    assert pruned.get(index.nodes[hub]['id'], 0) == len(neighbors) - cap
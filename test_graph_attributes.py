@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from draw_graph import build_relationship_graph, filtered_index, get_union_subgraph_by_names
+from graph_attributes import validate_filters, date_number, date_upper_bound
+from test_graph_index import random_records
+
+def dated_records(seed):
+    """random_records with a commencement date, institution and outcome on every case."""
+    cases, decisions, individuals, parties = random_records(seed)
+    rng = random.Random(seed)
+    for case in cases.values():
+        case['commencement_date'] = rng.choice(['2005-06-01', '2010-02-15', '2015-11-30', ''])
+        case['arbitral_institution'] = rng.choice(['ICSID', 'PCA'])
+        case['outcome'] = rng.choice(['Award', 'Settled'])
+    return cases, decisions, individuals, parties
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'role': 'Arbitrator'},
+    {'type': ['person', 'state']},
+    {'institution': 'ICSID', 'date_from': '2010', 'date_to': '2015-06'},
+    {'date_from': '2010-02-15'},
+])
+def test_validate_filters_accepts(filters):
+    validate_filters(filters)
+
+@pytest.mark.parametrize('filters', [
+    {'colour': 'red'},
+    {'role': 3},
+    {'role': ['Arbitrator', None]},
+    {'institution': {'name': 'ICSID'}},
+    {'date_from': 2010},
+    {'date_from': ''},
+    {'date_to': '2010-13'},
+    {'date_to': '2010-02-32'},
+    {'date_from': '10-02-2010'},
+])
+def test_validate_filters_rejects(filters):
+    with pytest.raises(ValueError):
+        validate_filters(filters)
+
+def test_date_bounds_cover_partial_dates():
+    assert date_number('2015-03-01T00:00:00') == 20150301
+    assert date_number('2015-03') == 20150300
+    assert date_number('') == date_number('n/a') == 0
+    assert date_upper_bound('2020') == 20209999
+    assert date_upper_bound('2020-03') == 20200399
+    assert date_upper_bound('2020-03-04') == 20200304
+
+@pytest.mark.parametrize('mode', ['pairwise', 'bipartite'])
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('filters', [
+    {'date_from': '2008', 'date_to': '2012'},
+    {'institution': 'ICSID', 'outcome': 'Settled'},
+    {'type': 'person', 'date_from': '2014'},
+])
+def test_filtered_edges_rest_on_matching_cases(mode, seed, filters):
+    cases, decisions, individuals, parties = records = dated_records(seed)
+    graph = build_relationship_graph(*records, mode=mode)
+    index = graph['index']
+    filtered = filtered_index(graph, filters)
+
+    def case_matches(case):
+        date = case['commencement_date'][:4]
+        return (case['arbitral_institution'] == filters.get('institution', case['arbitral_institution'])
+                and case['outcome'] == filters.get('outcome', case['outcome'])
+                and (not filters.get('date_from') or (date and date >= filters['date_from']))
+                and (not filters.get('date_to') or (date and date <= filters['date_to'])))
+
+    allowed_cases = {position for position, case in enumerate(cases.values()) if case_matches(case)}
+    case_positions = {case_id: position for position, case_id in enumerate(cases)}
+    decision_cases = [case_positions.get(decision['case_id']) for decision in decisions.values()]
+    for u in range(len(graph['nodes'])):
+        expected = []
+        for v, edge_id in zip(*index.neighbors(u)):
+            if 'type' in filters and graph['nodes'][v]['data']['type'] != filters['type']:
+                continue
+            relationship, positions = index.support(edge_id)
+            supporting = set(positions) if relationship == 'party-party' else {decision_cases[p] for p in positions}
+            if supporting & allowed_cases:
+                expected.append(v)
+        assert filtered.neighbors(u)[0] == expected
+
+def test_filters_only_prune():
+    graph = build_relationship_graph(*dated_records(0))
+    names = [graph['nodes'][i]['data']['name'] for i in (0, 70)]
+    full = get_union_subgraph_by_names(graph, names, 2)
+    filtered = get_union_subgraph_by_names(graph, names, 2, filters={'date_from': '2010'})
+    assert {node['id'] for node in filtered['nodes']} <= {node['id'] for node in full['nodes']}
+    with pytest.raises(ValueError):
+        get_union_subgraph_by_names(graph, names, 2, filters={'colour': 'red'})
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+from draw_graph import build_relationship_graph, graph_edges, edge_arrays, edge_weights
+from graph_index import Csr, group_pairs, join_pairs, aggregate_edges, RELATIONSHIP_TYPES
+
+def random_records(seed, num_individuals=60, num_parties=30, num_cases=40, num_decisions=90):
+    """Crawler-shaped records with repeated members, unknown ids and decisions without a known case."""
+    rng = random.Random(seed)
+    individuals = {str(i): {'name': f"Individual {i}"} for i in range(num_individuals)}
+    parties = {str(i): {'name': f"Party {i}", 'type': 'company'} for i in range(num_parties)}
+    party_ids = list(parties) + ['unknown']
+    individual_ids = list(individuals) + ['unknown']
+    cases = {str(c): {'party_ids': rng.choices(party_ids, k=rng.randint(0, 5))} for c in range(num_cases)}
+    decisions = {
+        str(d): {'case_id': str(rng.randrange(num_cases + 5)),  # Some point at cases that don't exist
+                 'individual_ids': rng.choices(individual_ids, k=rng.randint(0, 5))}
+        for d in range(num_decisions)
+    }
+    return cases, decisions, individuals, parties
+
+def baseline_edges(cases, decisions, individuals, parties):
+    """
+    The nested-loop builder the sort-based one replaced: edges in order of first occurrence,
+    deduplicated through a set of sorted node pairs. Also returns, per edge, the relationship
+    of its first co-occurrence and the set of cases / decisions supporting it.
+    """
+    node_map = {f"individual_{i}": n for n, i in enumerate(individuals)}
+    node_map.update({f"party_{p}": len(individuals) + n for n, p in enumerate(parties)})
+    edges = []
+    edge_set = set()
+    relationship = {}
+    support = {}
+
+    def add_edge(source, target, kind, supported_by):
+        key = tuple(sorted((source, target)))
+        if key not in edge_set:
+            edge_set.add(key)
+            edges.append(key)
+            relationship[key] = kind
+        support.setdefault(key, set()).add(supported_by)
+
+    for case_id, case in cases.items():
+        party_ids = case.get("party_ids", [])
+        for i in range(len(party_ids)):
+            for j in range(i + 1, len(party_ids)):
+                key1, key2 = f"party_{party_ids[i]}", f"party_{party_ids[j]}"
+                if key1 in node_map and key2 in node_map:
+                    add_edge(node_map[key1], node_map[key2], 'party-party', case_id)
+    for decision_id, decision in decisions.items():
+        individual_ids = decision.get("individual_ids", [])
+        for i in range(len(individual_ids)):
+            for j in range(i + 1, len(individual_ids)):
+                key1, key2 = f"individual_{individual_ids[i]}", f"individual_{individual_ids[j]}"
+                if key1 in node_map and key2 in node_map:
+                    add_edge(node_map[key1], node_map[key2], 'individual-individual', decision_id)
+    for decision_id, decision in decisions.items():
+        case_id = decision.get("case_id")
+        if case_id in cases:
+            for individual in decision.get("individual_ids", []):
+                for party in cases[case_id].get("party_ids", []):
+                    key1, key2 = f"individual_{individual}", f"party_{party}"
+                    if key1 in node_map and key2 in node_map:
+                        add_edge(node_map[key1], node_map[key2], 'individual-party', decision_id)
+    return edges, relationship, support
+
+def test_group_pairs_matches_nested_loops():
+    rng = random.Random(0)
+    groups = [rng.randrange(6) for _ in range(40)]
+    members = [rng.randrange(20) for _ in range(40)]
+    expected = []
+    for group in sorted(set(groups)):
+        rows = [member for g, member in zip(groups, members) if g == group]
+        expected += [(rows[i], rows[j], group) for i in range(len(rows)) for j in range(i + 1, len(rows))]
+    first, second, pair_groups = group_pairs(groups, members)
+    assert list(zip(first.tolist(), second.tolist(), pair_groups.tolist())) == expected
+
+def test_join_pairs_matches_nested_loops():
+    csr = Csr(3, [0, 0, 2, 2, 2], [10, 11, 12, 13, 14])
+    groups, members = [2, 1, 0, 2], [5, 6, 7, 8]
+    expected = [(member, other, row) for row, (group, member) in enumerate(zip(groups, members))
+                for other in csr.row(group)]
+    member, other, rows = join_pairs(groups, members, csr)
+    assert list(zip(member.tolist(), other.tolist(), rows.tolist())) == expected
+
+def test_aggregate_edges_counts_distinct_support():
+    # (1, 0) twice via support 7, then via 8; (2, 3) once; first occurrence decides order and type
+    source, target, weight, types, support = aggregate_edges(4, [1, 2, 0, 0], [0, 3, 1, 1], [1, 0, 2, 1], [7, 5, 7, 8])
+    assert source.tolist() == [0, 2] and target.tolist() == [1, 3]
+    assert weight.tolist() == [2, 1] and types.tolist() == [1, 0]
+    assert support.row(0) == [7, 8] and support.row(1) == [5]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pairwise_edges_match_baseline(seed):
+    cases, decisions, individuals, parties = random_records(seed)
+    expected, relationship, support = baseline_edges(cases, decisions, individuals, parties)
+    graph = build_relationship_graph(cases, decisions, individuals, parties)
+    edges = graph_edges(graph)
+    assert [(int(edge['source']), int(edge['target'])) for edge in edges] == expected
+    for edge in edges:
+        key = (int(edge['source']), int(edge['target']))
+        assert edge['data']['weight'] == len(support[key])
+        assert edge['data']['relationship'] == relationship[key]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pairwise_and_bipartite_agree(seed):
+    records = random_records(seed)
+    pairwise = build_relationship_graph(*records)
+    bipartite = build_relationship_graph(*records, mode='bipartite')
+
+    # Bipartite mode doesn't link a node to itself (a member listed twice)
+    expected = {edge['id']: edge for edge in graph_edges(pairwise) if edge['source'] != edge['target']}
+    assert {edge['id']: edge for edge in graph_edges(bipartite)} == expected
+
+    source, target = edge_arrays(bipartite)
+    arrays = set(zip(source.tolist(), target.tolist(), edge_weights(bipartite).tolist()))
+    assert arrays == {(int(edge['source']), int(edge['target']), edge['data']['weight']) for edge in expected.values()}
+
+    index = bipartite['index']
+    num_nodes = len(bipartite['nodes'])
+    for edge in expected.values():
+        relationship, supported_by = index.support(int(edge['source']) * num_nodes + int(edge['target']))
+        assert relationship in RELATIONSHIP_TYPES
+        assert (relationship, len(supported_by)) == (edge['data']['relationship'], edge['data']['weight'])
@@ -0,0 +1,80 @@
+import base64
+import gzip
+import json
+
+import pytest
+
+from draw_graph import build_relationship_graph, get_union_subgraph_by_names
+from graph_payload import (FullGraphPayload, accepted_encodings, encode_cursor, decode_cursor, page_subgraph,
+                           subgraph_records, collect_records)
+from test_graph_index import random_records
+
+def union_subgraph(seed=0):
+    graph = build_relationship_graph(*random_records(seed))
+    names = [graph['nodes'][i]['data']['name'] for i in (0, 61, 75)]
+    return get_union_subgraph_by_names(graph, names, 2)
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(7, 500)) == (7, 500)
+    assert decode_cursor(encode_cursor(None, 0)) == (None, 0)
+
+@pytest.mark.parametrize('cursor', [
+    '!!', 'bm90IGEgY3Vyc29y', 123, None,
+    base64.urlsafe_b64encode(b'7:-1').decode('ascii'),
+    base64.urlsafe_b64encode(b'7:1:2').decode('ascii'),
+    base64.urlsafe_b64encode(b'\xff:1').decode('ascii'),
+])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+@pytest.mark.parametrize('page_size', [1, 7, 50, 10000])
+def test_pages_deliver_every_node_and_edge_once(page_size):
+    subgraph = union_subgraph()
+    nodes, edges, seen = [], [], set()
+    offset = 0
+    while True:
+        page = page_subgraph(subgraph, offset, page_size, 3)
+        assert page['total_nodes'] == len(subgraph['nodes'])
+        nodes += page['nodes']
+        seen |= {node['id'] for node in page['nodes']}
+        for edge in page['edges']:
+            assert edge['source'] in seen and edge['target'] in seen  # Both ends already delivered
+        edges += page['edges']
+        if page['next_cursor'] is None:
+            break
+        version, offset = decode_cursor(page['next_cursor'])
+        assert version == 3
+    assert nodes == subgraph['nodes']
+    assert sorted(edge['id'] for edge in edges) == sorted(edge['id'] for edge in subgraph['edges'])
+
+def test_subgraph_records_truncate_to_max_nodes():
+    subgraph = union_subgraph()
+    limited = collect_records(subgraph_records(subgraph, 10))
+    kept = {node['id'] for node in limited['nodes']}
+    assert len(kept) == 10 and limited['truncated']
+    assert all(edge['source'] in kept and edge['target'] in kept for edge in limited['edges'])
+    assert limited['num_edges'] == len(limited['edges'])
+    assert collect_records(subgraph_records(subgraph))['truncated'] is False
+
+def test_accepted_encodings_skip_q0():
+    assert accepted_encodings('gzip, br;q=0, deflate;q=0.5') == {'gzip', 'deflate'}
+    assert accepted_encodings(None) == set()
+
+def test_full_graph_payload_has_an_etag_per_encoding():
+    graph = build_relationship_graph(*random_records(0))
+    graph['version'] = 4
+    payload = FullGraphPayload(graph)
+    assert json.loads(payload.body)['version'] == 4
+
+    coding, body, etag = payload.select('gzip')
+    assert coding == 'gzip' and gzip.decompress(body) == payload.body
+    identity = payload.select('identity')
+    assert identity[0] is None and identity[1] == payload.body
+    assert len(set(payload.etags.values())) == len(payload.etags)
+    assert etag != identity[2]
+
+    for tag in payload.etags.values():
+        assert payload.matches(tag) and payload.matches(f"W/{tag}") and payload.matches(f'"other", {tag}')
+    assert payload.matches('*')
+    assert not payload.matches('"other"') and not payload.matches(None)
@@ -0,0 +1,55 @@
+import time
+
+from query_cache import QueryCache, is_older
+
+def test_is_older_needs_both_versions():
+    assert is_older({'version': 1}, {'version': 2})
+    assert not is_older({'version': 2}, {'version': 2})
+    assert not is_older({}, {'version': 2})
+
+def test_new_graph_empties_the_cache():
+    cache = QueryCache()
+    old, new = {'version': 1}, {'version': 2}
+    cache.put(old, 'key', 'old value')
+    assert cache.get(old, 'key') == 'old value'
+    assert cache.get(new, 'key') is None
+    assert cache.info()['invalidations'] == 1
+    cache.put(new, 'key', 'new value')
+    assert cache.get(new, 'key') == 'new value'
+
+def test_older_graph_bypasses_the_cache():
+    cache = QueryCache()
+    old, new = {'version': 1}, {'version': 2}
+    cache.put(new, 'key', 'new value')
+    # A request still running on the replaced graph neither reads nor evicts the new entries
+    assert cache.get(old, 'key') is None
+    cache.put(old, 'key', 'old value')
+    assert cache.get(new, 'key') == 'new value'
+    assert cache.get_or_compute(old, 'key', lambda: 'recomputed') == 'recomputed'
+
+def test_bind_switches_graphs_up_front():
+    cache = QueryCache()
+    old, new = {'version': 1}, {'version': 2}
+    cache.put(old, 'key', 'old value')
+    cache.bind(new)
+    assert cache.info()['entries'] == 0
+
+def test_entries_expire_and_are_evicted_lru():
+    graph = {'version': 1}
+    cache = QueryCache(max_entries=2, ttl=0.05)
+    cache.put(graph, 'a', 1)
+    cache.put(graph, 'b', 2)
+    cache.get(graph, 'a')  # 'b' is now the least recently used
+    cache.put(graph, 'c', 3)
+    assert cache.get(graph, 'b') is None and cache.get(graph, 'a') == 1
+    assert cache.info()['evictions'] == 1
+    time.sleep(0.06)
+    assert cache.get(graph, 'a') is None
+
+def test_get_or_compute_computes_once():
+    graph = {'version': 1}
+    cache = QueryCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute(graph, 'key', lambda: calls.append(1) or 'value') == 'value'
+    assert len(calls) == 1